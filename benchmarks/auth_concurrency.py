@@ -0,0 +1,100 @@
+# Login p95 under a concurrent burst, with bcrypt inline on every session's
+# thread (the old behaviour) versus on the bounded auth pool. A probe thread
+# stands in for another user's page rerun and records how long a small
+# fixed piece of Python work takes while the burst is running.
+#
+#   python benchmarks/auth_concurrency.py [--sessions 64] [--workers 2] [--rounds 12]
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import bcrypt
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.auth import AuthBusy, AuthPool  # noqa: E402
+
+PASSWORD = "correct horse battery staple"
+
+
+def percentiles(values):
+    if not values:
+        return {}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99]) * 1000
+    return {"count": len(values), "p50_ms": p50, "p95_ms": p95, "p99_ms": p99}
+
+
+def probe(stop, samples):
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        sum(i * i for i in range(20000))
+        samples.append(time.perf_counter() - t0)
+        time.sleep(0.005)
+
+
+def run(check, sessions, hashed):
+    latencies, busy = [], []
+    lock = threading.Lock()
+    barrier = threading.Barrier(sessions + 1)
+
+    def session():
+        barrier.wait()
+        t0 = time.perf_counter()
+        try:
+            check(hashed, PASSWORD)
+        except AuthBusy:
+            with lock:
+                busy.append(1)
+            return
+        with lock:
+            latencies.append(time.perf_counter() - t0)
+
+    stop, probe_samples = threading.Event(), []
+    prober = threading.Thread(target=probe, args=(stop, probe_samples))
+    threads = [threading.Thread(target=session) for _ in range(sessions)]
+    for thread in threads:
+        thread.start()
+    prober.start()
+    start = time.perf_counter()
+    barrier.wait()
+    for thread in threads:
+        thread.join()
+    total = time.perf_counter() - start
+    stop.set()
+    prober.join()
+
+    return {
+        "seconds": total,
+        "logins_per_s": len(latencies) / total,
+        "rejected_busy": len(busy),
+        "login": percentiles(latencies),
+        "rerun_probe": percentiles(probe_samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--max-pending", type=int, default=128)
+    parser.add_argument("--rounds", type=int, default=12)
+    args = parser.parse_args()
+
+    hashed = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(rounds=args.rounds)).decode()
+    pool = AuthPool(workers=args.workers, max_pending=args.max_pending, rounds=args.rounds, timeout=600)
+
+    results = {
+        "inline": run(lambda h, pw: bcrypt.checkpw(pw.encode(), h.encode()), args.sessions, hashed),
+        "auth_pool": run(pool.check_password, args.sessions, hashed),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
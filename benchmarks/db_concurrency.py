@@ -0,0 +1,123 @@
+# Login/register throughput with many simultaneous sessions, comparing the
+# pooled WAL data layer with the old connect-per-call access pattern.
+#
+#   python benchmarks/db_concurrency.py [--sessions 64] [--rounds 20] [--pool-size 8]
+#
+# Every session registers one user per round and then logs in as a random
+# existing one. Passwords are hashed once up front so the numbers measure
+# the database, not bcrypt (benchmarks/run.py covers hashing).
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+import bcrypt
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.db import MIGRATIONS, QUERIES, Database  # noqa: E402
+
+
+class ConnectPerCall:
+    # What the app did before: a fresh default-journal connection per query
+
+    def __init__(self, path):
+        self.path = path
+        conn = sqlite3.connect(path)
+        for migration in MIGRATIONS:
+            for statement in migration:
+                conn.execute(statement)
+        conn.commit()
+        conn.close()
+
+    def fetch_one(self, query, params=()):
+        conn = sqlite3.connect(self.path, timeout=30.0)
+        try:
+            return conn.execute(QUERIES[query], params).fetchone()
+        finally:
+            conn.close()
+
+    def execute(self, query, params=()):
+        conn = sqlite3.connect(self.path, timeout=30.0)
+        try:
+            conn.execute(QUERIES[query], params)
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def run(db, sessions, rounds, hashed):
+    latencies = {"register": [], "login": []}
+    errors = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(sessions)
+
+    def session(sid):
+        rng = random.Random(sid)
+        local = {"register": [], "login": []}
+        barrier.wait()
+        try:
+            for r in range(rounds):
+                username = f"user{sid}_{r}"
+                t0 = time.perf_counter()
+                db.execute("create_user", (username, hashed, "Bench", f"{username}@example.com", 5.0, "Pune"))
+                local["register"].append(time.perf_counter() - t0)
+
+                other = f"user{rng.randrange(sessions)}_{rng.randrange(r + 1)}"
+                t0 = time.perf_counter()
+                db.fetch_one("get_credentials", (other,))
+                local["login"].append(time.perf_counter() - t0)
+        except Exception as e:
+            errors.append(f"{type(e).__name__}: {e}")
+        with lock:
+            for key, values in local.items():
+                latencies[key].extend(values)
+
+    threads = [threading.Thread(target=session, args=(sid,)) for sid in range(sessions)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    total = time.perf_counter() - start
+
+    result = {"seconds": total, "ops_per_s": sum(len(v) for v in latencies.values()) / total, "errors": len(errors)}
+    for key, values in latencies.items():
+        if values:
+            p50, p95, p99 = np.percentile(values, [50, 95, 99]) * 1000
+            result[key] = {"count": len(values), "p50_ms": p50, "p95_ms": p95, "p99_ms": p99}
+    if errors:
+        result["first_error"] = errors[0]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=64)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--pool-size", type=int, default=8)
+    args = parser.parse_args()
+
+    hashed = bcrypt.hashpw(b"correct horse battery staple", bcrypt.gensalt(rounds=4)).decode()
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        results["connect_per_call"] = run(ConnectPerCall(os.path.join(tmp, "legacy.db")), args.sessions, args.rounds, hashed)
+        db = Database(os.path.join(tmp, "pooled.db"), pool_size=args.pool_size)
+        try:
+            results["pooled_wal"] = run(db, args.sessions, args.rounds, hashed)
+        finally:
+            db.close()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# Field-scan throughput for one large photo: tiles per second, end-to-end
+# seconds and peak RSS for several batch sizes.
+#
+#   python benchmarks/field_scan.py [--width 4000 --height 3000] [--batch-sizes 16,64,128] [--model cnn]
+#
+# --model stand-in (default) measures the tiling and batching overhead with
+# a trivial model; --model cnn uses an untrained copy of the disease CNN's
+# architecture (needs TensorFlow), which gives realistic CPU numbers
+# without the real weights; --model real uses the installed model.
+
+import argparse
+import io
+import json
+import os
+import resource
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def install_model(kind):
+    from utils import disease_detector, model_registry
+    from benchmarks.stand_ins import install_stand_ins
+
+    if kind == "real":
+        return install_stand_ins(force=False)["disease"]
+    install_stand_ins(force=True)
+    if kind == "cnn":
+        import tensorflow as tf
+        sys.path.insert(0, os.path.join(ROOT, "scripts"))
+        from train_disease_model import build_model
+
+        model = build_model(tf, len(disease_detector.get_class_dict()))
+        model_registry.set_model(disease_detector.MODEL_NAME, model)
+    return kind
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    parser.add_argument("--overlap", type=float, default=0.25)
+    parser.add_argument("--batch-sizes", default="16,64,128")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--model", choices=["stand-in", "cnn", "real"], default="stand-in")
+    args = parser.parse_args()
+
+    os.environ["AGRO_OFFLINE"] = "1"
+    from benchmarks.preprocess import make_jpeg
+    from utils.field_scan import overlay, scan
+
+    model = install_model(args.model)
+    photo = make_jpeg(args.width, args.height)
+    # Builds the model's inference graph outside the measurement
+    scan(io.BytesIO(photo), args.overlap, 16)
+
+    results = []
+    for batch_size in (int(b) for b in args.batch_sizes.split(",")):
+        samples = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = scan(io.BytesIO(photo), args.overlap, batch_size)
+            samples.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        overlay(result)
+        overlay_seconds = time.perf_counter() - start
+        best = min(samples)
+        results.append({
+            "batch_size": batch_size,
+            "tiles": result["tiles"],
+            "grid": [result["rows"], result["cols"]],
+            "best_seconds": best,
+            "tiles_per_s": result["tiles"] / best,
+            "overlay_seconds": overlay_seconds,
+        })
+        print(f"batch {batch_size:4d}: {result['tiles']} tiles in {best:.2f}s "
+              f"({result['tiles'] / best:.0f} tiles/s), overlay {overlay_seconds * 1000:.0f} ms")
+
+    print(json.dumps({
+        "image": [args.width, args.height],
+        "overlap": args.overlap,
+        "model": model,
+        "cpus": os.cpu_count(),
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
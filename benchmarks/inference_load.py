@@ -0,0 +1,145 @@
+# Inference server throughput as the worker count grows: starts
+# utils.inference_server on a Unix socket with each --workers count, drives
+# it from --clients processes for --seconds per endpoint, and reports
+# requests/sec and latency percentiles.
+#
+#   python benchmarks/inference_load.py [--workers 1 2 4] [--clients 8] [--seconds 10]
+#
+# --model stand-in (the default when the real artifacts are missing) serves
+# the small benchmark models, so the script also runs offline.
+
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.stand_ins import install_stand_ins, load_yield_rows, make_leaf_jpeg  # noqa: E402
+from utils import inference_server  # noqa: E402
+from utils.inference_client import InferenceClient  # noqa: E402
+
+ENDPOINTS = ("yield", "disease")
+
+
+def percentiles(samples, scale):
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99]) * scale
+    return {"p50": p50, "p95": p95, "p99": p99}
+
+
+def start_server(path, workers, max_concurrency, model):
+    # The server runs in a forked child so each worker count starts clean
+    sock = inference_server.listen(unix_path=path)
+    pid = os.fork()
+    if pid == 0:
+        try:
+            install_stand_ins(force=model == "stand-in")
+            inference_server.serve(sock, workers, max_concurrency)
+        finally:
+            os._exit(0)
+    sock.close()
+    return pid
+
+
+def wait_ready(url, workers, timeout=120):
+    # Until every worker has answered /health; each accept goes to one of them
+    client = InferenceClient(url, pool_size=0)
+    deadline = time.monotonic() + timeout
+    seen = set()
+    while len(seen) < workers and time.monotonic() < deadline:
+        try:
+            seen.add(client.health()["pid"])
+        except OSError:
+            time.sleep(0.2)
+    client.close()
+    if len(seen) < workers:
+        raise RuntimeError(f"Only {len(seen)} of {workers} workers answered within {timeout}s")
+
+
+def drive(url, endpoint, seconds, seed):
+    # One client process: back-to-back requests on a pooled connection
+    client = InferenceClient(url, pool_size=1)
+    rng = np.random.default_rng(seed)
+    if endpoint == "yield":
+        rows = load_yield_rows(2000, seed=seed)
+        # Random areas, so the server's result cache rarely answers
+        rows["Area"] = rng.uniform(0.5, 5000, len(rows))
+        args = rows[["Crop", "Season", "State", "Area", "Annual_Rainfall", "Fertilizer", "Pesticide"]].values.tolist()
+        call = lambda i: client.predict_yield(*args[i % len(args)])  # noqa: E731
+    else:
+        images = [make_leaf_jpeg(rng, 640, 480) for _ in range(8)]
+        call = lambda i: client.request("POST", "/v1/disease", images[i % len(images)], "application/octet-stream")  # noqa: E731
+
+    latencies, rejected = [], 0
+    deadline = time.perf_counter() + seconds
+    i = 0
+    while time.perf_counter() < deadline:
+        t0 = time.perf_counter()
+        try:
+            call(i)
+            latencies.append(time.perf_counter() - t0)
+        except Exception as e:
+            if getattr(e, "status", None) != 503:
+                raise
+            rejected += 1
+        i += 1
+    client.close()
+    return latencies, rejected
+
+
+def run(url, endpoint, clients, seconds):
+    # Client processes are forked before anything heavy is imported here
+    with multiprocessing.get_context("fork").Pool(clients) as pool:
+        results = pool.starmap(drive, [(url, endpoint, seconds, seed) for seed in range(clients)])
+    latencies = np.concatenate([r[0] for r in results])
+    return {
+        "requests": len(latencies),
+        "rejected": sum(r[1] for r in results),
+        "requests_per_s": len(latencies) / seconds,
+        "latency_ms": percentiles(latencies, 1000),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--warmup", type=float, default=10)
+    parser.add_argument("--max-concurrency", type=int, default=inference_server.DEFAULT_MAX_CONCURRENCY)
+    parser.add_argument("--endpoint", choices=ENDPOINTS, nargs="+", default=list(ENDPOINTS))
+    parser.add_argument("--model", choices=("real", "stand-in"), default="real",
+                        help="stand-ins are used anyway when the real artifacts are missing")
+    args = parser.parse_args()
+
+    report = {"cpus": os.cpu_count(), "clients": args.clients, "runs": []}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "inference.sock")
+        url = f"unix://{path}"
+        for workers in args.workers:
+            pid = start_server(path, workers, args.max_concurrency, args.model)
+            try:
+                wait_ready(url, workers)
+                for endpoint in args.endpoint:
+                    # Untimed pass while workers finish loading the disease model
+                    run(url, endpoint, args.clients, args.warmup)
+                    result = run(url, endpoint, args.clients, args.seconds)
+                    print(f"{workers} workers, {endpoint}: {result['requests_per_s']:,.0f} req/s, "
+                          f"p95 {result['latency_ms']['p95']:.1f} ms, {result['rejected']} rejected")
+                    report["runs"].append({"workers": workers, "endpoint": endpoint, **result})
+            finally:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
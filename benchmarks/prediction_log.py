@@ -0,0 +1,103 @@
+# Prediction history at scale: the cost record() adds to a prediction,
+# batched write throughput, and home-dashboard query latency once the
+# predictions table holds millions of rows.
+#
+#   python benchmarks/prediction_log.py [--rows 1000000] [--users 1000]
+#
+# Rows are spread over --users users, with one heavy user owning 5% of them.
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.db import Database  # noqa: E402
+from utils.prediction_log import PredictionLog  # noqa: E402
+
+KINDS = ("yield", "disease", "field_scan", "yield_batch")
+
+
+def percentiles(samples, scale):
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99]) * scale
+    return {"p50": p50, "p95": p95, "p99": p99}
+
+
+def fill(log, rows, users, rng):
+    # Records every row through the buffer the way the app does and returns
+    # the per-call record() latencies
+    inputs = {"crop": "Rice", "season": "Kharif", "state": "Punjab", "area": 1.0}
+    latencies = np.empty(rows)
+    for i in range(rows):
+        username = "heavy" if rng.random() < 0.05 else f"user{rng.randrange(users)}"
+        kind = KINDS[i % len(KINDS)]
+        t0 = time.perf_counter()
+        log.record(username, kind, inputs, "3.21 t/ha", 3.21, (1, 2), 12.5)
+        latencies[i] = time.perf_counter() - t0
+        if log.pending() >= log.batch_size:
+            log.flush()
+    log.flush()
+    return latencies
+
+
+def time_queries(log, username, repeat):
+    recent, summary = [], []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        log.recent(username, 10)
+        recent.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        log.summary(username)
+        summary.append(time.perf_counter() - t0)
+    return {"recent_ms": percentiles(recent, 1000), "summary_ms": percentiles(summary, 1000)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "predictions.db"))
+        # Flushed inline here so the write rate is measured exactly
+        log = PredictionLog(batch_size=args.batch_size, max_buffer=args.batch_size * 2)
+        log.db = db
+
+        start = time.perf_counter()
+        latencies = fill(log, args.rows, args.users, rng)
+        seconds = time.perf_counter() - start
+
+        record_us = percentiles(latencies, 1e6)
+        print(f"record(): p50 {record_us['p50']:.2f} us, p99 {record_us['p99']:.2f} us")
+        print(f"wrote {args.rows:,} rows in {seconds:.1f}s ({args.rows / seconds:,.0f} rows/s, "
+              f"{log.stats['flushes']} transactions)")
+
+        queries = {"heavy_user": time_queries(log, "heavy", args.repeat),
+                   "typical_user": time_queries(log, "user0", args.repeat)}
+        for name, result in queries.items():
+            print(f"{name}: recent p95 {result['recent_ms']['p95']:.2f} ms, "
+                  f"summary p95 {result['summary_ms']['p95']:.2f} ms")
+        db.close()
+
+    print(json.dumps({
+        "rows": args.rows,
+        "users": args.users,
+        "record_us": record_us,
+        "rows_per_s": args.rows / seconds,
+        "queries": queries,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# Decode + preprocess time and peak memory for a large phone photo, comparing
+# the original full-resolution float64 path with the current pipeline.
+# Each mode runs in its own process so peak RSS is attributable.
+#
+#   python benchmarks/preprocess.py [--width 4000 --height 3000 --repeat 10]
+
+import argparse
+import io
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def make_jpeg(width, height):
+    # Smooth gradients plus noise compress like a real photo
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:height, 0:width]
+    image = np.stack([x * 255 // width, y * 255 // height, (x + y) * 255 // (width + height)], axis=-1)
+    image = (image + rng.integers(0, 40, image.shape)).clip(0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(image).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def legacy_preprocess(data):
+    image = Image.open(io.BytesIO(data))
+    image = image.resize((224, 224))
+    img_array = np.array(image) / 255.0
+    return np.expand_dims(img_array, axis=0)
+
+
+def current_preprocess(data, out):
+    from utils.disease_detector import preprocess_image
+    return preprocess_image(io.BytesIO(data), out)
+
+
+def run_mode(mode, path, repeat):
+    with open(path, "rb") as f:
+        data = f.read()
+    if mode == "current":
+        import utils.disease_detector  # keep import cost out of the timings
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    out = np.empty((224, 224, 3), dtype=np.float32)
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = legacy_preprocess(data) if mode == "legacy" else current_preprocess(data, out)
+        timings.append(time.perf_counter() - start)
+
+    return {
+        "mode": mode,
+        "input_mb": len(data) / 1e6,
+        "median_ms": statistics.median(timings) * 1000,
+        "output_dtype": str(result.dtype),
+        "output_kb": result.nbytes / 1024,
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_increase_mb": (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--mode", choices=["legacy", "current"], help=argparse.SUPPRESS)
+    parser.add_argument("--input", help=argparse.SUPPRESS)
+    parser.add_argument("--make", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.make:
+        with open(args.make, "wb") as f:
+            f.write(make_jpeg(args.width, args.height))
+        return
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.input, args.repeat)))
+        return
+
+    results = []
+    with tempfile.NamedTemporaryFile(suffix=".jpg") as f:
+        # Generated in a child too: ru_maxrss survives fork+exec, so the
+        # parent has to stay small for the per-mode numbers to mean anything
+        subprocess.run([sys.executable, os.path.abspath(__file__), "--make", f.name,
+                        "--width", str(args.width), "--height", str(args.height)], check=True)
+        for mode in ("legacy", "current"):
+            command = [sys.executable, os.path.abspath(__file__), "--mode", mode,
+                       "--input", f.name, "--repeat", str(args.repeat)]
+            output = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, check=True).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+
+    legacy, current = results
+    print(json.dumps({
+        "legacy": legacy,
+        "current": current,
+        "speedup": legacy["median_ms"] / current["median_ms"],
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
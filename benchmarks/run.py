@@ -0,0 +1,290 @@
+# Headless benchmarks for the prediction and auth hot paths.
+#
+#   python benchmarks/run.py                    # run everything, compare to baseline
+#   python benchmarks/run.py predict_yield      # run selected cases
+#   python benchmarks/run.py --save-baseline    # record the current numbers as baseline
+#   python benchmarks/run.py --stand-in         # force stand-in models
+#
+# Each case runs in its own process so peak RSS belongs to that case only.
+# Results go to benchmarks/results/; the run fails if any case's p95 is
+# worse than the baseline by more than --threshold.
+
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.join(ROOT, "benchmarks")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+
+CASES = {}
+
+
+def case(iterations):
+    # A case's setup returns (fn, inputs, items_per_call)
+    def register(setup):
+        CASES[setup.__name__] = (setup, iterations)
+        return setup
+    return register
+
+
+def _checked(fn):
+    # The prediction functions report failures as return values, not exceptions
+    def call(*args):
+        result = fn(*args)
+        if isinstance(result, str) or (isinstance(result, tuple) and result[0] == "Model Load Error"):
+            raise RuntimeError(f"{fn.__name__} failed: {result}")
+        return result
+    return call
+
+
+@case(iterations=500)
+def predict_yield(args):
+    from utils import yield_predictor
+    from benchmarks.stand_ins import load_yield_rows
+
+    # Measure the model, not the result cache
+    yield_predictor.cache.configure(maxsize=0)
+    rows = load_yield_rows(1000)[["Crop", "Season", "State", "Area", "Annual_Rainfall", "Fertilizer", "Pesticide"]]
+    inputs = list(rows.itertuples(index=False, name=None))
+    predict = _checked(yield_predictor.predict_yield)
+    return (lambda row: predict(*row)), inputs, 1
+
+
+@case(iterations=10)
+def predict_yield_batch(args):
+    from utils import yield_predictor
+    from benchmarks.stand_ins import load_yield_rows
+
+    batch = load_yield_rows(10000)
+    return _checked(yield_predictor.predict_yield_batch), [batch], len(batch)
+
+
+@case(iterations=100)
+def preprocess_image(args):
+    from utils.disease_detector import preprocess_image as preprocess
+    from benchmarks.stand_ins import make_leaf_jpeg
+
+    rng = np.random.default_rng(0)
+    images = [make_leaf_jpeg(rng) for _ in range(10)]
+    out = np.empty((224, 224, 3), dtype=np.float32)
+    return (lambda data: preprocess(io.BytesIO(data), out)), images, 1
+
+
+@case(iterations=100)
+def predict_disease(args):
+    from utils.disease_detector import predict_disease, result_cache
+
+    # Measure the model, not the result cache
+    result_cache.configure(max_bytes=0)
+    predict = _checked(predict_disease)
+    from benchmarks.stand_ins import make_leaf_jpeg
+
+    rng = np.random.default_rng(0)
+    images = [make_leaf_jpeg(rng) for _ in range(10)]
+    return (lambda data: predict(io.BytesIO(data))), images, 1
+
+
+@case(iterations=1000)
+def disease_cache_lookup(args):
+    # Hashing cost of a repeat upload plus a near-duplicate scan over a
+    # cache that holds 1000 other photos
+    from utils.image_cache import ImageResultCache, lookup
+    from benchmarks.stand_ins import make_leaf_jpeg
+
+    rng = np.random.default_rng(0)
+    cache = ImageResultCache(hamming_threshold=4)
+    for i in range(1000):
+        cache.set(f"other{i}", int(rng.integers(0, 2**63)), ("Tomato___healthy", 99.0))
+    images = [make_leaf_jpeg(rng) for _ in range(10)]
+    for data in images[:5]:
+        _, key, phash = lookup(cache, io.BytesIO(data))
+        cache.set(key, phash, ("Tomato___healthy", 99.0))
+    return (lambda data: lookup(cache, io.BytesIO(data))), images, 1
+
+
+@case(iterations=1000)
+def history_query(args):
+    from utils.crop_history import HistoryStore
+
+    store = HistoryStore.load()
+    filters = [
+        {"crops": ["Rice"], "years": (2000, 2015)},
+        {"states": ["Punjab", "Assam"], "seasons": ["Kharif"]},
+        {"crops": ["Wheat", "Maize"], "states": ["Punjab"]},
+    ]
+    return (lambda f: store.query(by=("Crop_Year", "State"), **f)), filters, 1
+
+
+@case(iterations=2000)
+def find_analogs(args):
+    from utils import yield_analogs
+    from benchmarks.stand_ins import load_yield_rows
+
+    yield_analogs.get_index()
+    rows = load_yield_rows(1000)[["Crop", "Season", "State", "Area", "Annual_Rainfall", "Fertilizer", "Pesticide"]]
+    inputs = list(rows.itertuples(index=False, name=None))
+    return (lambda row: yield_analogs.find_analogs(*row)), inputs, 1
+
+
+@case(iterations=50)
+def optimize_inputs(args):
+    # 100 x 100 fertilizer x pesticide grid plus refinement per call
+    from utils.input_optimizer import optimize
+    from benchmarks.stand_ins import load_yield_rows
+
+    rows = load_yield_rows(20)
+    inputs = [
+        (r.Crop, r.Season, r.State, r.Area, r.Annual_Rainfall, (0.0, 3 * r.Fertilizer), (0.0, 3 * r.Pesticide), r.Yield)
+        for r in rows.itertuples(index=False)
+    ]
+    return (lambda row: optimize(*row, fertilizer_price=25.0, pesticide_price=600.0)), inputs, 1
+
+
+def _app():
+    import streamlit_app
+    streamlit_app.Config.DB_NAME = os.path.join(tempfile.mkdtemp(), "bench.db")
+    return streamlit_app
+
+
+@case(iterations=10)
+def hash_password(args):
+    app = _app()
+    return app.hash_password, ["correct horse battery staple"], 1
+
+
+@case(iterations=10)
+def check_password(args):
+    app = _app()
+    hashed = app.hash_password("correct horse battery staple")
+    return (lambda pw: app.check_password(hashed, pw)), ["correct horse battery staple"], 1
+
+
+@case(iterations=2000)
+def db_lookup(args):
+    app = _app()
+    db = app.get_db()
+    db.execute("create_user", ("bench", app.hash_password("pw"), "Bench", "bench@example.com", 5.0, "Pune"))
+    return (lambda username: db.fetch_one("get_credentials", (username,))), ["bench", "missing"], 1
+
+
+def run_case(name, stand_in, scale):
+    sys.path.insert(0, ROOT)
+    from benchmarks.stand_ins import install_stand_ins
+
+    modes = install_stand_ins(force=stand_in)
+    setup, iterations = CASES[name]
+    fn, inputs, items_per_call = setup(None)
+    iterations = max(1, int(iterations * scale))
+
+    # Warm-up call outside the measurement
+    fn(inputs[0])
+
+    latencies = np.empty(iterations)
+    start = time.perf_counter()
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        fn(inputs[i % len(inputs)])
+        latencies[i] = time.perf_counter() - t0
+    total = time.perf_counter() - start
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    return {
+        "case": name,
+        "models": modes,
+        "iterations": iterations,
+        "p50_ms": p50,
+        "p95_ms": p95,
+        "p99_ms": p99,
+        "mean_ms": latencies.mean() * 1000,
+        "throughput_per_s": iterations * items_per_call / total,
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base or "p95_ms" not in result:
+            continue
+        change = result["p95_ms"] / base["p95_ms"] - 1
+        result["p95_vs_baseline"] = change
+        if change > threshold:
+            regressions.append(f"{name}: p95 {base['p95_ms']:.2f} -> {result['p95_ms']:.2f} ms ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("cases", nargs="*", help=f"cases to run (default: all of {', '.join(CASES)})")
+    parser.add_argument("--stand-in", action="store_true", help="use stand-in models even if real ones exist")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every case's iteration count")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed p95 regression vs baseline")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # Never download anything while benchmarking
+    os.environ["AGRO_OFFLINE"] = "1"
+
+    if args.case:
+        print(json.dumps(run_case(args.case, args.stand_in, args.scale)))
+        return
+
+    unknown = set(args.cases) - set(CASES)
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(sorted(unknown))}")
+
+    results = {}
+    for name in args.cases or CASES:
+        command = [sys.executable, os.path.abspath(__file__), "--case", name, "--scale", str(args.scale)]
+        if args.stand_in:
+            command.append("--stand-in")
+        proc = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+        if proc.returncode != 0:
+            results[name] = {"case": name, "error": proc.stderr.strip().splitlines()[-1]}
+        else:
+            results[name] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+        r = results[name]
+        if "error" in r:
+            print(f"{name:22s} ERROR {r['error']}")
+        else:
+            print(f"{name:22s} p50 {r['p50_ms']:9.3f} ms  p95 {r['p95_ms']:9.3f} ms  p99 {r['p99_ms']:9.3f} ms  "
+                  f"{r['throughput_per_s']:10.1f}/s  rss {r['peak_rss_mb']:7.1f} MB")
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)["results"], args.threshold)
+
+    report = {"timestamp": datetime.now().isoformat(timespec="seconds"), "python": sys.version.split()[0], "results": results}
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    for path in (os.path.join(RESULTS_DIR, f"bench-{datetime.now():%Y%m%d-%H%M%S}.json"), os.path.join(RESULTS_DIR, "latest.json")):
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# Measures how long a fresh interpreter takes to import the app modules and
+# how long the models take to become ready afterwards.
+#
+#   python benchmarks/startup_time.py [--repeat 5] [--with-models]
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = """
+import time
+start = time.perf_counter()
+import {modules}
+print(time.perf_counter() - start)
+"""
+
+MODELS_SNIPPET = """
+import time
+from utils import model_registry
+import utils.disease_detector, utils.yield_predictor
+start = time.perf_counter()
+model_registry.start_background_warmup().join()
+print(time.perf_counter() - start)
+"""
+
+
+def run_snippet(code):
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def measure(code, repeat):
+    samples = [run_snippet(code) for _ in range(repeat)]
+    return {"median_ms": statistics.median(samples) * 1000, "min_ms": min(samples) * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--with-models", action="store_true", help="also time background model warm-up")
+    args = parser.parse_args()
+
+    results = {
+        "import_utils": measure(IMPORT_SNIPPET.format(modules="utils.disease_detector, utils.yield_predictor"), args.repeat),
+    }
+    try:
+        results["import_streamlit_app"] = measure(IMPORT_SNIPPET.format(modules="streamlit_app"), args.repeat)
+    except RuntimeError as e:
+        results["import_streamlit_app"] = {"error": str(e)}
+    if args.with_models:
+        try:
+            results["models_ready"] = measure(MODELS_SNIPPET, 1)
+        except RuntimeError as e:
+            results["models_ready"] = {"error": str(e)}
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
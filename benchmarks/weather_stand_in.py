@@ -0,0 +1,84 @@
+# Local stand-in for the OpenWeatherMap current-weather endpoint, so the
+# weather layer can be exercised offline.
+#
+#   python benchmarks/weather_stand_in.py [--port 8765] [--latency-ms 150]
+#   AGRO_WEATHER_PROVIDER=openweathermap AGRO_WEATHER_URL=http://127.0.0.1:8765 streamlit run streamlit_app.py
+#
+# Values are derived from the location name, so repeated requests agree.
+# Locations containing "nowhere" return 404, like an unknown city.
+
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+DESCRIPTIONS = ("clear sky", "few clouds", "scattered clouds", "light rain", "moderate rain")
+
+
+def fake_weather(location):
+    seed = int(hashlib.sha256(location.casefold().encode()).hexdigest()[:8], 16)
+    return {
+        "name": location.title(),
+        "sys": {"country": "IN"},
+        "main": {"temp": 15 + seed % 200 / 10, "humidity": 40 + seed % 51},
+        "wind": {"speed": 1 + seed % 90 / 10},
+        "weather": [{"description": DESCRIPTIONS[seed % len(DESCRIPTIONS)]}],
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so the client's connection pool is exercised
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        location = parse_qs(url.query).get("q", [""])[0]
+        self.server.requests += 1
+        self.server.peers.add(self.client_address)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if url.path != "/data/2.5/weather" or not location or "nowhere" in location.lower():
+            status, body = 404, {"cod": "404", "message": "city not found"}
+        else:
+            status, body = 200, fake_weather(location)
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def start(port=0, latency_ms=0, host="127.0.0.1"):
+    # Returns the running server; its base URL is f"http://{host}:{server.server_port}"
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.latency = latency_ms / 1000
+    server.requests = 0
+    # Client (host, port) pairs seen, one per connection the client opened
+    server.peers = set()
+    threading.Thread(target=server.serve_forever, name="weather-stand-in", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=150)
+    args = parser.parse_args()
+
+    server = start(args.port, args.latency_ms)
+    print(f"Weather stand-in on http://127.0.0.1:{server.server_port} ({args.latency_ms:.0f} ms latency)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
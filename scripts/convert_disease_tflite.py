@@ -0,0 +1,131 @@
+# Converts notebooks/plant_disease_model.h5 to TFLite and compares the result
+# against the Keras model: top-1 agreement, per-image latency and peak RSS.
+# Each engine is measured in its own process so memory numbers are not mixed.
+#
+#   python scripts/convert_disease_tflite.py --quantization float16 --images data/sample_leaves
+
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.disease_detector import MODEL_PATH, TFLITE_PATH
+from utils.tflite_engine import QUANTIZATIONS, convert
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def load_images(directory, limit):
+    from PIL import Image
+    from utils.disease_detector import preprocess_image
+
+    if directory is None:
+        # No labelled data: random images still give latency and memory numbers
+        rng = np.random.default_rng(0)
+        return rng.random((limit, 224, 224, 3), dtype=np.float32)
+
+    paths = []
+    for dirpath, _, filenames in os.walk(directory):
+        paths.extend(os.path.join(dirpath, f) for f in sorted(filenames) if f.lower().endswith(IMAGE_EXTENSIONS))
+    paths = sorted(paths)[:limit]
+    if not paths:
+        raise SystemExit(f"No images found under {directory}")
+    return np.concatenate([preprocess_image(Image.open(p)) for p in paths]).astype(np.float32)
+
+
+def measure(engine, images_dir, limit):
+    # Runs in the child process started by run_measurement, which sets
+    # AGRO_DISEASE_ENGINE before utils.disease_detector is first imported
+    from utils.disease_detector import DISEASE_ENGINE, load_disease_model
+    from utils.tflite_engine import TFLiteEngine
+
+    if DISEASE_ENGINE != engine:
+        raise SystemExit(f"Asked to measure {engine} but the detector is configured for {DISEASE_ENGINE}")
+    images = load_images(images_dir, limit)
+    model = load_disease_model()
+    if isinstance(model, TFLiteEngine) != (engine == "tflite"):
+        raise SystemExit(f"Asked to measure {engine} but loaded {type(model).__name__}")
+
+    latencies = []
+    predictions = []
+    for image in images:
+        start = time.perf_counter()
+        output = model.predict(image[np.newaxis], verbose=0)
+        latencies.append(time.perf_counter() - start)
+        predictions.append(int(np.argmax(output[0])))
+
+    return {
+        "engine": engine,
+        "predictions": predictions,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def run_measurement(engine, args):
+    command = [sys.executable, os.path.abspath(__file__), "--measure", engine, "--limit", str(args.limit)]
+    if args.images:
+        command += ["--images", args.images]
+    # The engine is read when utils.disease_detector is imported, which this
+    # script already did, so it has to be set in the child's environment
+    env = {**os.environ, "AGRO_DISEASE_ENGINE": engine}
+    result = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--out", default=TFLITE_PATH)
+    parser.add_argument("--quantization", choices=QUANTIZATIONS, default="float16")
+    parser.add_argument("--images", help="directory of leaf images for calibration and agreement")
+    parser.add_argument("--limit", type=int, default=200)
+    parser.add_argument("--report", default=os.path.join("benchmarks", "results", "disease_tflite_report.json"))
+    parser.add_argument("--measure", choices=["keras", "tflite"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.images, args.limit)))
+        return
+
+    representative = None
+    if args.quantization == "int8":
+        if not args.images:
+            raise SystemExit("--images is required for int8 calibration")
+        representative = [load_images(args.images, min(args.limit, 100))]
+    convert(args.model, args.out, args.quantization, representative)
+
+    keras = run_measurement("keras", args)
+    tflite = run_measurement("tflite", args)
+    agreement = np.mean(np.array(keras.pop("predictions")) == np.array(tflite.pop("predictions")))
+
+    report = {
+        "quantization": args.quantization,
+        "images": args.images or "synthetic",
+        "h5_mb": os.path.getsize(args.model) / 1e6,
+        "tflite_mb": os.path.getsize(args.out) / 1e6,
+        "top1_agreement": float(agreement),
+        "keras": keras,
+        "tflite": tflite,
+        "speedup": keras["p50_ms"] / tflite["p50_ms"],
+        "memory_ratio": keras["peak_rss_mb"] / tflite["peak_rss_mb"],
+    }
+    os.makedirs(os.path.dirname(args.report), exist_ok=True)
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# Flattens notebooks/yield_model.pkl into the array-backed ForestEngine format
+# and checks the exported engine reproduces sklearn's predictions.
+#
+#   python scripts/export_yield_forest.py [--model notebooks/yield_model.pkl] [--out notebooks/yield_forest]
+
+import argparse
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.forest_engine import ForestEngine, flatten_forest, save_forest, artifact_size
+from utils.yield_predictor import MODEL_PATH, FOREST_PATH, FEATURE_COLUMNS, encode_features
+
+
+def check_parity(forest, engine, X, tolerance):
+    expected = forest.predict(pd.DataFrame(X, columns=FEATURE_COLUMNS))
+    actual = engine.predict(X)
+    max_diff = float(np.max(np.abs(expected - actual)))
+    return max_diff, max_diff <= tolerance
+
+
+def time_single_row(fn, row, repeat=200):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(row)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--out", default=FOREST_PATH)
+    parser.add_argument("--data", default=os.path.join("data", "crop_yield.csv"))
+    parser.add_argument("--tolerance", type=float, default=1e-9)
+    args = parser.parse_args()
+
+    forest = joblib.load(args.model)
+    arrays, meta = flatten_forest(forest)
+    save_forest(arrays, meta, args.out)
+    engine = ForestEngine.load(args.out)
+
+    # Parity on real rows plus random rows that exercise unseen value ranges
+    X = encode_features(pd.read_csv(args.data)).dropna().to_numpy()
+    rng = np.random.default_rng(0)
+    X = np.vstack([X, rng.uniform(X.min(axis=0), X.max(axis=0), size=(2000, X.shape[1]))])
+    max_diff, ok = check_parity(forest, engine, X, args.tolerance)
+
+    row = X[0]
+    frame = pd.DataFrame([row], columns=FEATURE_COLUMNS)
+    print(f"Trees: {meta['n_trees']}  nodes: {meta['n_nodes']}  max depth: {meta['max_depth']}")
+    print(f"Pickle size: {os.path.getsize(args.model) / 1e6:.1f} MB  engine size: {artifact_size(args.out) / 1e6:.1f} MB")
+    print(f"Single-row latency: sklearn {time_single_row(forest.predict, frame, 20):.0f} us, "
+          f"engine {time_single_row(engine.predict_one, tuple(row)):.0f} us")
+    print(f"Parity on {len(X)} rows: max abs diff {max_diff:.3g} ({'OK' if ok else 'FAILED'})")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+# Trains the leaf-disease CNN from a directory of class subfolders with a
+# tf.data input pipeline, replacing notebooks/train_disease_model.ipynb.
+#
+#   python scripts/train_disease_model.py --data data/train [--epochs 10] [--out notebooks]
+#   python scripts/train_disease_model.py --data data/train --input-only   # time the input pipeline alone
+#
+# JPEGs are decoded and resized in parallel (num_parallel_calls), the
+# resized uint8 tensors are cached on disk after the first epoch, and
+# batches are prefetched while the model trains. The train/validation split
+# hashes each file's relative path, so it does not change between runs or
+# machines. --num-shards/--shard-index give each worker a disjoint slice.
+# Per-epoch images/sec is printed and written to the training report.
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.artifacts import ARTIFACT_DIR
+
+IMAGE_SIZE = (224, 224)
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def list_images(data_dir, val_percent):
+    # Classes are the sorted subfolder names, the same indices
+    # flow_from_directory assigned, so disease_classes.json keeps its meaning
+    classes = sorted(e.name for e in os.scandir(data_dir) if e.is_dir())
+    splits = {"train": ([], []), "val": ([], [])}
+    for label, name in enumerate(classes):
+        for dirpath, _, filenames in os.walk(os.path.join(data_dir, name)):
+            for filename in sorted(filenames):
+                if not filename.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                path = os.path.join(dirpath, filename)
+                relative = os.path.relpath(path, data_dir).replace(os.sep, "/")
+                bucket = int(hashlib.md5(relative.encode()).hexdigest()[:8], 16) % 100
+                paths, labels = splits["val" if bucket < val_percent else "train"]
+                paths.append(path)
+                labels.append(label)
+    return classes, splits
+
+
+def cache_key(paths, num_shards, shard_index):
+    # A new file list or image size must not reuse an old cache
+    digest = hashlib.sha256(f"{IMAGE_SIZE}|{num_shards}|{shard_index}".encode())
+    for path in paths:
+        digest.update(path.encode())
+        digest.update(str(os.path.getmtime(path)).encode())
+    return digest.hexdigest()[:16]
+
+
+def make_dataset(tf, paths, labels, n_classes, args, training):
+    autotune = tf.data.AUTOTUNE
+    ds = tf.data.Dataset.from_tensor_slices((paths, labels))
+    # Shard the file list, before any decoding, so workers never read each other's images
+    ds = ds.shard(args.num_shards, args.shard_index)
+
+    def decode(path, label):
+        image = tf.io.decode_image(tf.io.read_file(path), channels=3, expand_animations=False)
+        image = tf.image.resize(image, IMAGE_SIZE, method="bilinear", antialias=True)
+        # Cached as uint8: a quarter of the disk and read bandwidth of float32
+        return tf.cast(tf.clip_by_value(tf.round(image), 0, 255), tf.uint8), label
+
+    ds = ds.map(decode, num_parallel_calls=autotune)
+    if args.cache_dir:
+        os.makedirs(args.cache_dir, exist_ok=True)
+        name = f"{'train' if training else 'val'}-{cache_key(paths, args.num_shards, args.shard_index)}"
+        ds = ds.cache(os.path.join(args.cache_dir, name))
+    else:
+        ds = ds.cache()
+    if training:
+        ds = ds.shuffle(args.shuffle_buffer, seed=args.seed, reshuffle_each_iteration=True)
+
+    def finish(image, label):
+        # Same scaling as utils.disease_detector.preprocess_image
+        return tf.cast(image, tf.float32) * (1 / 255), tf.one_hot(label, n_classes)
+
+    ds = ds.batch(args.batch_size).map(finish, num_parallel_calls=autotune).prefetch(autotune)
+    options = tf.data.Options()
+    options.deterministic = not args.nondeterministic
+    return ds.with_options(options)
+
+
+def build_model(tf, n_classes):
+    # The architecture the notebook trained
+    layers = tf.keras.layers
+    model = tf.keras.Sequential([
+        layers.Conv2D(32, (3, 3), activation="relu", input_shape=(*IMAGE_SIZE, 3)),
+        layers.MaxPooling2D(),
+        layers.Conv2D(64, (3, 3), activation="relu"),
+        layers.MaxPooling2D(),
+        layers.Flatten(),
+        layers.Dense(128, activation="relu"),
+        layers.Dropout(0.3),
+        layers.Dense(n_classes, activation="softmax"),
+    ])
+    model.compile(optimizer="adam", loss="categorical_crossentropy", metrics=["accuracy"])
+    return model
+
+
+def throughput_callback(tf, n_images, epochs_log):
+    class Throughput(tf.keras.callbacks.Callback):
+        def on_epoch_begin(self, epoch, logs=None):
+            self.start = time.perf_counter()
+
+        def on_epoch_end(self, epoch, logs=None):
+            seconds = time.perf_counter() - self.start
+            entry = {"epoch": epoch + 1, "seconds": seconds, "images_per_s": n_images / seconds,
+                     **{k: float(v) for k, v in (logs or {}).items()}}
+            epochs_log.append(entry)
+            print(f"epoch {epoch + 1}: {seconds:.1f}s  {entry['images_per_s']:.0f} images/s")
+
+    return Throughput()
+
+
+def time_input_pipeline(ds, n_images, epochs):
+    # Iterates the dataset without a model: the ceiling the input side allows
+    results = []
+    for epoch in range(epochs):
+        start = time.perf_counter()
+        for _ in ds:
+            pass
+        seconds = time.perf_counter() - start
+        results.append({"epoch": epoch + 1, "seconds": seconds, "images_per_s": n_images / seconds})
+        print(f"input epoch {epoch + 1}: {seconds:.1f}s  {n_images / seconds:.0f} images/s")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default=os.path.join("data", "train"), help="one subfolder of images per class")
+    parser.add_argument("--out", default=ARTIFACT_DIR)
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--val-percent", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--shuffle-buffer", type=int, default=10000)
+    parser.add_argument("--cache-dir", default=os.path.join("data", ".tfcache"),
+                        help="on-disk cache of resized images; empty string caches in memory")
+    parser.add_argument("--num-shards", type=int, default=1)
+    parser.add_argument("--shard-index", type=int, default=0)
+    parser.add_argument("--nondeterministic", action="store_true", help="let tf.data reorder elements for speed")
+    parser.add_argument("--input-only", action="store_true", help="only time the input pipeline")
+    args = parser.parse_args()
+
+    classes, splits = list_images(args.data, args.val_percent)
+    train_paths, train_labels = splits["train"]
+    val_paths, val_labels = splits["val"]
+    if not classes or not train_paths:
+        parser.error(f"No images found in class subfolders of {args.data}")
+
+    import tensorflow as tf
+
+    tf.keras.utils.set_random_seed(args.seed)
+    n_train = len(range(args.shard_index, len(train_paths), args.num_shards))
+    train_ds = make_dataset(tf, train_paths, train_labels, len(classes), args, training=True)
+    val_ds = make_dataset(tf, val_paths, val_labels, len(classes), args, training=False) if val_paths else None
+    print(f"{len(classes)} classes, {len(train_paths)} train / {len(val_paths)} val images, "
+          f"shard {args.shard_index + 1}/{args.num_shards} ({n_train} train images)")
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "tensorflow": tf.__version__,
+        "classes": len(classes),
+        "train_images": n_train,
+        "val_images": len(val_paths),
+        "batch_size": args.batch_size,
+        "seed": args.seed,
+        "shard": [args.shard_index, args.num_shards],
+    }
+    if args.input_only:
+        report["input_epochs"] = time_input_pipeline(train_ds, n_train, args.epochs)
+        print(json.dumps(report, indent=2))
+        return
+
+    epochs_log = []
+    model = build_model(tf, len(classes))
+    start = time.perf_counter()
+    model.fit(train_ds, validation_data=val_ds, epochs=args.epochs,
+              callbacks=[throughput_callback(tf, n_train, epochs_log)], verbose=2)
+    report["train_seconds"] = time.perf_counter() - start
+    report["epochs"] = epochs_log
+
+    os.makedirs(args.out, exist_ok=True)
+    model_path = os.path.join(args.out, "plant_disease_model.h5")
+    model.save(model_path)
+    with open(os.path.join(args.out, "disease_classes.json"), "w") as f:
+        json.dump({str(i): name for i, name in enumerate(classes)}, f)
+    report["model_bytes"] = os.path.getsize(model_path)
+    with open(os.path.join(args.out, "disease_training_report.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Model: {model_path} ({report['model_bytes'] / 1e6:.1f} MB)  train {report['train_seconds']:.0f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+# Trains the yield random forest headless, replacing notebooks/train_yield_model.ipynb.
+#
+#   python scripts/train_yield_model.py [--data data/crop_yield.csv] [--out notebooks]
+#   python scripts/train_yield_model.py --search-jobs 8 --export-forest
+#
+# The CSV is read in chunks and encoded incrementally. Candidate
+# hyperparameters are fitted in parallel worker processes, then the best is
+# refitted on all training rows with every core. The model, its category
+# encoders and a JSON report (timings, accuracy, sizes) are written to --out.
+# Every random choice is seeded, so the same data and arguments give the
+# same model.
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.artifacts import ARTIFACT_DIR
+from utils.forest_engine import artifact_size, flatten_forest, save_forest
+from utils.yield_predictor import FEATURE_COLUMNS, NUMERIC_COLUMNS
+
+CATEGORICAL_COLUMNS = ("Crop", "Season", "State")
+TARGET = "Yield"
+PARAM_GRID = {
+    "n_estimators": [100, 200],
+    "max_depth": [None, 24],
+    "min_samples_leaf": [1, 2],
+    "max_features": [1.0, 0.6],
+}
+
+
+def read_encoded(path, chunk_size):
+    # Categories get provisional ids in first-seen order while streaming;
+    # they are renumbered in sorted order at the end, which matches the codes
+    # pandas' astype("category") gave the notebook-trained model
+    vocab = {column: {} for column in CATEGORICAL_COLUMNS}
+    categorical = {column: [] for column in CATEGORICAL_COLUMNS}
+    numeric, target = [], []
+    digest = hashlib.sha256()
+    rows = 0
+    for chunk in pd.read_csv(path, chunksize=chunk_size):
+        digest.update(pd.util.hash_pandas_object(chunk, index=False).to_numpy().tobytes())
+        values = chunk[NUMERIC_COLUMNS + [TARGET]].apply(pd.to_numeric, errors="coerce")
+        keep = values.notna().all(axis=1).to_numpy()
+        for column in CATEGORICAL_COLUMNS:
+            labels = chunk[column].astype(str).str.strip().to_numpy()[keep]
+            ids = vocab[column]
+            categorical[column].append(np.fromiter((ids.setdefault(v, len(ids)) for v in labels), dtype=np.int32, count=len(labels)))
+        numeric.append(values[NUMERIC_COLUMNS].to_numpy(dtype=np.float64)[keep])
+        target.append(values[TARGET].to_numpy(dtype=np.float64)[keep])
+        rows += len(chunk)
+
+    encoders = {}
+    columns = []
+    for column in CATEGORICAL_COLUMNS:
+        labels = sorted(vocab[column])
+        encoders[column] = {label: i for i, label in enumerate(labels)}
+        remap = np.empty(len(vocab[column]), dtype=np.int32)
+        for label, provisional in vocab[column].items():
+            remap[provisional] = encoders[column][label]
+        columns.append(remap[np.concatenate(categorical[column])])
+    X = np.column_stack(columns + [np.concatenate(numeric)])
+    y = np.concatenate(target)
+    return X, y, encoders, {"rows_read": rows, "rows_used": len(y), "sha256": digest.hexdigest()}
+
+
+def split(n, test_size, seed):
+    order = np.random.default_rng(seed).permutation(n)
+    n_test = int(round(n * test_size))
+    return order[n_test:], order[:n_test]
+
+
+def score(y_true, y_pred):
+    return {
+        "r2": float(r2_score(y_true, y_pred)),
+        "mae": float(mean_absolute_error(y_true, y_pred)),
+        "rmse": float(np.sqrt(mean_squared_error(y_true, y_pred))),
+    }
+
+
+def evaluate_candidate(params, X_fit, y_fit, X_val, y_val, seed):
+    # Runs in a worker process; one core per candidate
+    start = time.perf_counter()
+    model = RandomForestRegressor(random_state=seed, n_jobs=1, **params)
+    model.fit(pd.DataFrame(X_fit, columns=FEATURE_COLUMNS), y_fit)
+    result = score(y_val, model.predict(pd.DataFrame(X_val, columns=FEATURE_COLUMNS)))
+    result["fit_seconds"] = time.perf_counter() - start
+    return params, result
+
+
+def search(X, y, grid, jobs, seed, max_rows):
+    # Candidates are compared on a fixed validation split of the training
+    # rows, subsampled to max_rows so the search stays cheap on large data
+    idx = np.random.default_rng(seed + 1).permutation(len(y))[:max_rows]
+    fit, val = split(len(idx), 0.2, seed + 2)
+    fit, val = idx[fit], idx[val]
+    candidates = [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(evaluate_candidate, params, X[fit], y[fit], X[val], y[val], seed) for params in candidates]
+        results = [future.result() for future in futures]
+    # Best R2; ties go to the smaller model, then to the params themselves so
+    # the same data always picks the same model (fit times vary run to run)
+    results.sort(key=lambda r: (-round(r[1]["r2"], 6), r[0]["n_estimators"], json.dumps(r[0], sort_keys=True)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default=os.path.join("data", "crop_yield.csv"))
+    parser.add_argument("--out", default=ARTIFACT_DIR)
+    parser.add_argument("--chunk-size", type=int, default=100000)
+    parser.add_argument("--test-size", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--search-jobs", type=int, default=os.cpu_count(), help="worker processes for the search")
+    parser.add_argument("--search-rows", type=int, default=200000, help="max rows used to compare candidates")
+    parser.add_argument("--no-search", action="store_true", help="train the notebook's settings (100 trees)")
+    parser.add_argument("--export-forest", action="store_true", help="also write the array engine to <out>/yield_forest")
+    args = parser.parse_args()
+
+    timings = {}
+    start = time.perf_counter()
+    X, y, encoders, data_info = read_encoded(args.data, args.chunk_size)
+    timings["load_seconds"] = time.perf_counter() - start
+    train, test = split(len(y), args.test_size, args.seed)
+
+    search_results = []
+    params = {"n_estimators": 100}
+    if not args.no_search:
+        start = time.perf_counter()
+        search_results = search(X[train], y[train], PARAM_GRID, args.search_jobs, args.seed, args.search_rows)
+        timings["search_seconds"] = time.perf_counter() - start
+        params = search_results[0][0]
+        for candidate, result in search_results:
+            print(f"  {candidate}  r2 {result['r2']:.4f}  mae {result['mae']:.3f}  {result['fit_seconds']:.1f}s")
+
+    start = time.perf_counter()
+    model = RandomForestRegressor(random_state=args.seed, n_jobs=-1, **params)
+    model.fit(pd.DataFrame(X[train], columns=FEATURE_COLUMNS), y[train])
+    timings["fit_seconds"] = time.perf_counter() - start
+    # Predictions must not depend on the training machine's core count
+    model.set_params(n_jobs=None)
+
+    start = time.perf_counter()
+    test_scores = score(y[test], model.predict(pd.DataFrame(X[test], columns=FEATURE_COLUMNS)))
+    timings["predict_test_seconds"] = time.perf_counter() - start
+
+    os.makedirs(args.out, exist_ok=True)
+    model_path = os.path.join(args.out, "yield_model.pkl")
+    encoders_path = os.path.join(args.out, "yield_encoders.json")
+    joblib.dump(model, model_path + ".tmp")
+    os.replace(model_path + ".tmp", model_path)
+    with open(encoders_path + ".tmp", "w") as f:
+        json.dump({"features": FEATURE_COLUMNS, "categories": encoders}, f, indent=2)
+    os.replace(encoders_path + ".tmp", encoders_path)
+    sizes = {"model_bytes": os.path.getsize(model_path)}
+
+    if args.export_forest:
+        forest_path = os.path.join(args.out, "yield_forest")
+        arrays, meta = flatten_forest(model)
+        save_forest(arrays, meta, forest_path)
+        sizes["forest_bytes"] = artifact_size(forest_path)
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "sklearn": sklearn.__version__,
+        "data": {**data_info, "path": args.data, "train_rows": len(train), "test_rows": len(test)},
+        "params": params,
+        "seed": args.seed,
+        "test": test_scores,
+        "timings": timings,
+        "sizes": sizes,
+        "categories": {column: len(values) for column, values in encoders.items()},
+        "search": [{"params": p, **r} for p, r in search_results],
+    }
+    with open(os.path.join(args.out, "yield_training_report.json"), "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"Rows: {data_info['rows_used']} used of {data_info['rows_read']}  params: {params}")
+    print(f"Test R2 {test_scores['r2']:.4f}  MAE {test_scores['mae']:.3f}  RMSE {test_scores['rmse']:.3f}")
+    print("Timings: " + "  ".join(f"{k.replace('_seconds', '')} {v:.1f}s" for k, v in timings.items()))
+    print(f"Model: {model_path} ({sizes['model_bytes'] / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
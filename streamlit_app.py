@@ -1,8 +1,6 @@
 import streamlit as st
-from PIL import Image
 import os
 import sqlite3
-import bcrypt
 import pandas as pd
 import numpy as np
 import json
@@ -12,23 +10,76 @@ from datetime import datetime, timedelta
 from email_validator import validate_email, EmailNotValidError
 import plotly.express as px
 import plotly.graph_objects as go
-import random
 import logging
+import pickle
 
 # Import your custom modules
-from utils.disease_detector import predict_disease
-from utils.yield_predictor import predict_yield, crop_map, season_map, state_map
+from utils.disease_detector import predict_disease, get_class_dict, artifact_fingerprint as disease_version, configure_batching, configure_result_cache, result_cache as disease_cache, scheduler as disease_scheduler
+from utils.model_registry import model_status, start_background_warmup, warmup_state
+from utils import metrics
+from utils import inference_client
+from utils.db import Database
+from utils import auth
+from utils.crop_history import HistoryStore, METRICS as HISTORY_METRICS
+from utils.yield_analogs import find_analogs
+from utils.input_optimizer import optimize as optimize_inputs
+from utils import field_scan
+from utils import disease_eval
+from utils import weather
+from utils import prediction_log
+from utils.jobs import JobQueue
+from utils.job_tasks import TASKS as JOB_TASKS
+from utils.yield_predictor import predict_yield, artifact_fingerprint as yield_version, load_encoders as load_yield_encoders, FEATURE_COLUMNS, configure_cache as configure_yield_cache, cache as yield_cache
 
 # Configuration
 class Config:
     DB_NAME = "agroai.db"
+    DB_POOL_SIZE = int(os.environ.get("AGRO_DB_POOL_SIZE", "8"))
     MAX_UPLOAD_SIZE_MB = 5
+    MAX_BATCH_UPLOAD_MB = 50
+    MAX_FIELD_UPLOAD_MB = 25
+    FIELD_SCAN_BATCH_SIZE = 64
     DEFAULT_FARM_SIZE = 5.0
     ASSET_DIR = "assets"
-    TEST_IMAGES_DIR = "test_images"
+    # Labelled images for Model Diagnostics: one subfolder per class
+    EVAL_IMAGES_DIR = os.environ.get("AGRO_EVAL_DIR", os.path.join("data", "eval"))
+    EVAL_BATCH_SIZE = 32
+    DISEASE_BATCH_SIZE = 16
+    DISEASE_BATCH_WAIT_MS = 10
+    DISEASE_CACHE_MAX_MB = float(os.environ.get("AGRO_DISEASE_CACHE_MB", "4"))
+    # Max differing bits of the 64-bit perceptual hash for a near-duplicate
+    # photo to reuse a result; unset matches byte-identical uploads only
+    DISEASE_CACHE_HAMMING = int(os.environ["AGRO_DISEASE_CACHE_HAMMING"]) if os.environ.get("AGRO_DISEASE_CACHE_HAMMING") else None
+    YIELD_CACHE_SIZE = 4096
+    YIELD_CACHE_TTL_SECONDS = 6 * 3600
+    YIELD_CACHE_PRECISION = 2
+    YIELD_ANALOGS = 5
+    PLANNER_GRID_STEPS = 100
+    FERTILIZER_PRICE_PER_KG = 25.0  # ₹
+    PESTICIDE_PRICE_PER_KG = 600.0  # ₹
+    # Usernames that see the metrics admin view. Anyone can register any free
+    # username, so there is no default admin.
+    ADMIN_USERS = set(filter(None, (u.strip() for u in os.environ.get("AGRO_ADMIN_USERS", "").split(","))))
+    METRICS_PORT = int(os.environ.get("AGRO_METRICS_PORT", "0"))  # 0 disables the endpoint
+    METRICS_DUMP_PATH = os.environ.get("AGRO_METRICS_DUMP", "metrics.prom")
+    AUTH_WORKERS = int(os.environ.get("AGRO_AUTH_WORKERS", "2"))
+    AUTH_MAX_PENDING = int(os.environ.get("AGRO_AUTH_MAX_PENDING", "32"))
+    BCRYPT_ROUNDS = int(os.environ.get("AGRO_BCRYPT_ROUNDS", "12"))
+    LOGIN_MAX_FAILURES = 5
+    LOGIN_LOCKOUT_SECONDS = 300
+    DEFAULT_LOCATION = "Pune"
+    WEATHER_FRESH_SECONDS = 600
+    WEATHER_STALE_SECONDS = 6 * 3600
+    WEATHER_WAIT_SECONDS = 5  # only the explicit "Fetch Weather" button waits
+    PREDICTION_LOG_FLUSH_SECONDS = 1.0
+    PREDICTION_LOG_MAX_BUFFER = 10000
+    RECENT_ACTIVITY_ROWS = 10
+    JOB_WORKERS = int(os.environ.get("AGRO_JOB_WORKERS", "0")) or os.cpu_count() or 1
+    JOB_POLL_SECONDS = 2
+    JOB_LIST_ROWS = 5
+    MAX_SCREEN_IMAGES = 200
 
 os.makedirs(Config.ASSET_DIR, exist_ok=True)
-os.makedirs(Config.TEST_IMAGES_DIR, exist_ok=True)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -175,27 +226,37 @@ def t(key):
     return translations.get(lang, translations["en"]).get(key, key)
 
 # Database helpers
-def init_db():
-    conn = sqlite3.connect(Config.DB_NAME)
-    c = conn.cursor()
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        username TEXT PRIMARY KEY,
-        password TEXT,
-        name TEXT,
-        email TEXT UNIQUE,
-        farm_size REAL DEFAULT ?,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    """, (Config.DEFAULT_FARM_SIZE,))
-    conn.commit()
-    conn.close()
+# One connection pool per process; the schema is migrated once when it is built
+@st.cache_resource(show_spinner=False)
+@metrics.timed("db.init")
+def get_db():
+    return Database(Config.DB_NAME, pool_size=Config.DB_POOL_SIZE)
 
+# bcrypt runs on the shared auth pool, never on the script thread's own CPU budget
 def hash_password(password):
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+    return auth.hash_password(password)
 
 def check_password(hashed, password):
-    return bcrypt.checkpw(password.encode(), hashed.encode())
+    return auth.check_password(hashed, password)
+
+def client_ip():
+    # st.context is only available on newer Streamlit versions
+    context = getattr(st, "context", None)
+    ip = getattr(context, "ip_address", None)
+    if ip:
+        return ip
+    headers = getattr(context, "headers", None) or {}
+    forwarded = headers.get("X-Forwarded-For", "")
+    return forwarded.split(",")[0].strip() or None
+
+def restore_session():
+    # A signed token proves this session already passed bcrypt; checking it
+    # is one HMAC, so reruns never re-hash
+    if st.session_state.get("logged_in") and auth.signer.verify(st.session_state.get("auth_token")) != st.session_state.get("username"):
+        for key in ("logged_in", "username", "name", "auth_token"):
+            st.session_state.pop(key, None)
+        st.session_state.logged_in = False
+        st.session_state.username = None
 
 def validate_email_address(email):
     try:
@@ -203,94 +264,248 @@ def validate_email_address(email):
     except EmailNotValidError:
         return None
 
-# Weather API call with caching
-@st.cache_data(ttl=3600)
-def get_weather(location):
-    # Mock weather data for demo
-    return {
-        "temp": round(random.uniform(15, 35), 1),
-        "humidity": random.randint(40, 90),
-        "wind_speed": round(random.uniform(1.0, 10.0), 1),
-        "description": random.choice(["Clear Sky", "Partly Cloudy", "Cloudy", "Light Rain"]),
-        "city": location,
-        "country": "IN"
-    }
+# Weather comes from utils.weather's shared stale-while-revalidate cache;
+# reads return immediately and refreshes happen in the background
+def get_weather(location, wait=0.0):
+    return weather.get_weather(location, wait)
 
-# Create some test images for diagnostics
-def create_test_images():
-    # Create a healthy leaf image (mostly green)
-    healthy_img = np.zeros((100, 100, 3), dtype=np.uint8)
-    healthy_img[:, :, 1] = 200  # Green channel
-    healthy_img[:, :, 0] = 100  # Red channel
-    healthy_img[:, :, 2] = 100  # Blue channel
-    
-    # Add some texture
-    for i in range(10):
-        x, y = random.randint(0, 99), random.randint(0, 99)
-        healthy_img[x:x+20, y:y+20, 1] = 230  # Brighter green patches
-    
-    healthy_pil = Image.fromarray(healthy_img)
-    healthy_path = os.path.join(Config.TEST_IMAGES_DIR, "healthy_leaf.jpg")
-    healthy_pil.save(healthy_path)
-    
-    # Create a diseased leaf image (more color variation)
-    diseased_img = np.zeros((100, 100, 3), dtype=np.uint8)
-    diseased_img[:, :, 1] = 150  # Less green
-    
-    # Add disease spots (brown/yellow patches)
-    for i in range(15):
-        x, y = random.randint(0, 99), random.randint(0, 99)
-        size = random.randint(5, 15)
-        
-        # Brown/yellow spots
-        diseased_img[x:x+size, y:y+size, 0] = 180  # Red
-        diseased_img[x:x+size, y:y+size, 1] = 150  # Green
-        diseased_img[x:x+size, y:y+size, 2] = 100  # Blue
+# Predictions are appended to an in-memory buffer and written to SQLite in
+# batches by a background thread, so recording never slows a prediction
+@st.cache_resource(show_spinner=False)
+def start_prediction_log():
+    prediction_log.configure(get_db(), flush_interval=Config.PREDICTION_LOG_FLUSH_SECONDS,
+                             max_buffer=Config.PREDICTION_LOG_MAX_BUFFER)
+    return prediction_log.log
+
+def record_prediction(kind, inputs, output, value, version, started):
+    prediction_log.record(st.session_state.get("username"), kind, inputs, output, value, version,
+                          (time.perf_counter() - started) * 1000)
+
+# Slow analyses run as jobs on a process pool; their state, progress and
+# results live in SQLite, so they survive reruns, navigation and restarts
+@st.cache_resource(show_spinner=False)
+def get_jobs():
+    jobs = JobQueue(get_db(), JOB_TASKS, workers=Config.JOB_WORKERS)
+    jobs.recover()
+    return jobs
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def load_job_result(job_id):
+    return get_jobs().result(job_id)
+
+@st.fragment(run_every=Config.JOB_POLL_SECONDS)
+def render_jobs(kind, render_result):
+    jobs = [j for j in get_jobs().jobs(st.session_state.get("username"), 20) if j["kind"] == kind][:Config.JOB_LIST_ROWS]
+    if not jobs:
+        return
+    st.subheader("Jobs")
+    for job in jobs:
+        with st.container(border=True):
+            when = datetime.fromtimestamp(job["created_at"]).strftime("%Y-%m-%d %H:%M:%S")
+            if job["state"] in ("queued", "running"):
+                status = job["message"] or ("Waiting for a worker" if job["state"] == "queued" else "Starting")
+                st.progress(job["progress"], text=f"{when} · {status}...")
+                if st.button("Cancel", key=f"cancel_{job['id']}"):
+                    get_jobs().cancel(job["id"])
+            elif job["state"] == "done":
+                st.caption(f"{when} · finished in {job['finished_at'] - job['started_at']:.1f}s")
+                render_result(job, load_job_result(job["id"]))
+            elif job["state"] == "failed":
+                st.error(f"{when} · failed: {job['error']}")
+            else:
+                st.caption(f"{when} · cancelled")
+
+@st.cache_resource(show_spinner=False)
+def start_weather():
+    weather.configure(fresh_ttl=Config.WEATHER_FRESH_SECONDS, stale_ttl=Config.WEATHER_STALE_SECONDS)
+    locations = [row[0] for row in get_db().fetch_all("user_locations")]
+    return weather.prefetch(locations + [Config.DEFAULT_LOCATION])
+
+@st.cache_resource(show_spinner=False)
+def configure_auth():
+    auth.pool.configure(workers=Config.AUTH_WORKERS, max_pending=Config.AUTH_MAX_PENDING, rounds=Config.BCRYPT_ROUNDS)
+    auth.throttle.configure(max_failures=Config.LOGIN_MAX_FAILURES, window_seconds=Config.LOGIN_LOCKOUT_SECONDS)
+    return auth.pool
+
+# Cleaned, columnar copy of data/crop_yield.csv shared by every session
+@st.cache_resource(show_spinner="Loading crop history...")
+def load_crop_history():
+    return HistoryStore.load()
+
+# Load and warm models once per process in a background thread; every
+# session shares them and no page waits for them to render
+@st.cache_resource(show_spinner=False)
+def warm_up_models():
+    configure_batching(Config.DISEASE_BATCH_SIZE, Config.DISEASE_BATCH_WAIT_MS)
+    configure_yield_cache(Config.YIELD_CACHE_SIZE, Config.YIELD_CACHE_TTL_SECONDS, Config.YIELD_CACHE_PRECISION)
+    configure_result_cache(int(Config.DISEASE_CACHE_MAX_MB * 1024 * 1024), Config.DISEASE_CACHE_HAMMING, get_db())
+    if Config.METRICS_PORT and metrics.enabled():
+        try:
+            metrics.start_http_server(Config.METRICS_PORT)
+        except OSError as e:
+            logger.error(f"Metrics endpoint not started: {e}")
+    if inference_client.client is not None:
+        # Predictions go to the inference server, which holds the models
+        return None
+    return start_background_warmup()
+
+def render_model_registry_status():
+    st.subheader("Loaded Models")
+    status = model_status()
+    if inference_client.client is not None:
+        try:
+            health = inference_client.client.health()
+        except Exception as e:
+            st.error(f"Inference server {inference_client.client.url} is not reachable: {e}")
+            return
+        st.caption(f"Served by the inference server at {inference_client.client.url} (worker {health['pid']})")
+        status = health["models"]
+    if not status:
+        st.info("No models registered.")
+        return
+    rows = []
+    for name, info in status.items():
+        rows.append({
+            "Model": name,
+            "Loaded": "✅" if info["loaded"] else ("⏳" if info["loading"] else "❌"),
+            "Warm": "✅" if info["warm"] else "❌",
+            "Load time (s)": round(info["load_seconds"], 2) if info["load_seconds"] is not None else None,
+            "Warm-up time (s)": round(info["warmup_seconds"], 2) if info["warmup_seconds"] is not None else None,
+            "Loaded at": datetime.fromtimestamp(info["loaded_at"]).strftime("%Y-%m-%d %H:%M:%S") if info["loaded_at"] else None,
+            "Error": info["error"],
+        })
+    st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
+    
+    stats = disease_scheduler.stats
+    avg_batch = stats["requests"] / stats["batches"] if stats["batches"] else 0
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Disease requests", stats["requests"])
+    col2.metric("Avg batch size", f"{avg_batch:.1f}")
+    col3.metric("Largest batch", stats["largest_batch"])
     
-    diseased_pil = Image.fromarray(diseased_img)
-    diseased_path = os.path.join(Config.TEST_IMAGES_DIR, "diseased_leaf.jpg")
-    diseased_pil.save(diseased_path)
+    stats = yield_cache.stats()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Yield cache hits", stats["hits"])
+    col2.metric("Yield cache misses", stats["misses"])
+    col3.metric("Hit rate", f"{stats['hit_rate'] * 100:.1f}%")
+    col4.metric("Entries", f"{stats['size']}/{stats['maxsize']}")
     
-    return healthy_path, diseased_path
+    stats = disease_cache.stats()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Disease cache hits", stats["hits"])
+    col2.metric("Near-duplicate hits", stats["near_hits"])
+    col3.metric("Hit rate", f"{stats['hit_rate'] * 100:.1f}%")
+    col4.metric("Cache size", f"{stats['bytes'] / 1024:.0f}/{stats['max_bytes'] / 1024:.0f} KiB")
+
+def render_metrics_admin():
+    st.subheader("Performance Metrics (admin)")
+    if not metrics.enabled():
+        st.info("Metrics are disabled. Set AGRO_METRICS=1 to collect them.")
+        return
+    
+    snap = metrics.snapshot()
+    if snap["stages"]:
+        rows = [{"Stage": name, **{k: round(v, 3) if isinstance(v, float) else v for k, v in values.items()}}
+                for name, values in snap["stages"].items()]
+        st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
+    else:
+        st.info("No timings recorded yet.")
+    if snap["counters"]:
+        st.dataframe(pd.DataFrame(sorted(snap["counters"].items()), columns=["Counter", "Value"]),
+                     hide_index=True, use_container_width=True)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("Write Prometheus dump"):
+            path = metrics.dump_prometheus(Config.METRICS_DUMP_PATH)
+            st.success(f"Written to {path}")
+    with col2:
+        st.download_button("Download metrics", data=metrics.prometheus_text(),
+                           file_name="metrics.prom", mime="text/plain")
+    if Config.METRICS_PORT:
+        st.caption(f"Prometheus endpoint: http://127.0.0.1:{Config.METRICS_PORT}/metrics")
+
+# Labelled images found under a directory, listed again at most once a
+# minute; the fingerprint keys cached evaluations
+@st.cache_data(ttl=60, show_spinner=False)
+def list_eval_images(directory, model_version):
+    paths, labels, unknown = disease_eval.list_labelled_images(directory, get_class_dict())
+    return len(paths), len(set(labels)), unknown, disease_eval.dataset_fingerprint(paths)
+
+def render_disease_evaluation():
+    st.subheader("Disease model evaluation")
+    directory = st.text_input("Labelled image directory", Config.EVAL_IMAGES_DIR,
+                              help="One subfolder per class, named as in disease_classes.json")
+    if not os.path.isdir(directory):
+        st.info(f"Put labelled leaf photos in {directory}/<class name>/ to measure the model's accuracy and speed.")
+        return
+    version = disease_eval.model_version()
+    try:
+        n_images, n_classes, unknown, dataset = list_eval_images(directory, version)
+    except Exception as e:
+        st.error(f"Could not read {directory}: {e}")
+        return
+    if unknown:
+        st.warning(f"Skipping folders that match no class: {', '.join(unknown)}")
+    if not n_images:
+        st.info("No images in class subfolders yet.")
+        return
+    st.caption(f"{n_images:,} images in {n_classes} classes · model {version}")
+
+    params = {"directory": os.path.abspath(directory), "batch_size": Config.EVAL_BATCH_SIZE,
+              "dataset": dataset, "model_version": version}
+    cached = get_jobs().find_done("disease_evaluation", params)
+    if cached:
+        when = datetime.fromtimestamp(cached["finished_at"]).strftime("%Y-%m-%d %H:%M:%S")
+        st.caption(f"Result from {when} for this model and these images")
+        render_evaluation_result(cached, load_job_result(cached["id"]), "cached")
+    if st.button("Re-run evaluation" if cached else "Run evaluation"):
+        get_jobs().submit(st.session_state.get("username"), "disease_evaluation", params)
+    render_jobs("disease_evaluation", render_evaluation_result)
+
+def render_evaluation_result(job, report, key="job"):
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Accuracy", f"{report['accuracy']:.1%}" if report["accuracy"] is not None else "-")
+    col2.metric("Images/sec", f"{report['images_per_s']:,.1f}" if report["images_per_s"] else "-")
+    col3.metric(f"p95 latency (batch of {report['batch_size']})",
+                f"{report['latency_ms']['p95']:,.0f} ms" if report["latency_ms"] else "-")
+    col4.metric("Images", f"{report['images']:,}")
+    if report["unreadable"]:
+        st.caption(f"{report['unreadable']} unreadable images skipped")
+
+    # Only classes that were in the directory or were predicted
+    confusion = np.asarray(report["confusion"])
+    shown = np.flatnonzero(confusion.sum(axis=0) + confusion.sum(axis=1))
+    names = [report["classes"][i] for i in shown]
+    recall = pd.DataFrame({
+        "Class": names,
+        "Images": np.asarray(report["support"])[shown],
+        "Recall": np.asarray(report["recall"])[shown],
+    })
+    st.dataframe(recall[recall["Images"] > 0], hide_index=True, use_container_width=True,
+                 column_config={"Recall": st.column_config.ProgressColumn(format="%.2f", min_value=0, max_value=1)})
+    fig = px.imshow(confusion[np.ix_(shown, shown)], x=names, y=names, text_auto=True, color_continuous_scale="Greens",
+                    labels={"x": "Predicted", "y": "Actual", "color": "Images"}, title="Confusion matrix")
+    # The same job can show both as the cached result and in the job list
+    st.plotly_chart(fig, use_container_width=True, key=f"{key}_confusion_{job['id']}")
 
 # Diagnostic page to check if model is working
 def render_model_diagnostic():
     st.header("Model Status Check")
     
-    # Create test images if they don't exist
-    if not os.path.exists(Config.TEST_IMAGES_DIR):
-        os.makedirs(Config.TEST_IMAGES_DIR)
+    render_model_registry_status()
     
-    healthy_path, diseased_path = create_test_images()
+    render_disease_evaluation()
     
-    st.subheader("Disease Detection Model Test")
+    st.subheader("Full check")
+    st.caption("Loads every model and runs a yield prediction in a background worker.")
+    if st.button("Run full check"):
+        get_jobs().submit(st.session_state.get("username"), "model_diagnostics", {})
+    render_jobs("model_diagnostics", render_diagnostics_result)
     
-    # Test with sample images
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        st.image(healthy_path, caption="Healthy leaf sample", use_column_width=True)
-        if st.button("Test with healthy leaf"):
-            with st.spinner("Analyzing..."):
-                img = Image.open(healthy_path)
-                label, confidence = predict_disease(img)
-                st.success(f"Prediction: {label} ({confidence:.2f}% confidence)")
-                if "healthy" in label.lower():
-                    st.success("✅ Correctly identified healthy leaf!")
-                else:
-                    st.warning("⚠️ Misclassified healthy leaf as diseased")
-    
-    with col2:
-        st.image(diseased_path, caption="Diseased leaf sample", use_column_width=True)
-        if st.button("Test with diseased leaf"):
-            with st.spinner("Analyzing..."):
-                img = Image.open(diseased_path)
-                label, confidence = predict_disease(img)
-                st.success(f"Prediction: {label} ({confidence:.2f}% confidence)")
-                if "healthy" not in label.lower():
-                    st.success("✅ Correctly identified diseased leaf!")
-                else:
-                    st.warning("⚠️ Misclassified diseased leaf as healthy")
+    if st.session_state.get("username") in Config.ADMIN_USERS:
+        st.divider()
+        render_metrics_admin()
     
     st.divider()
     st.subheader("Troubleshooting Tips")
@@ -304,25 +519,45 @@ def render_model_diagnostic():
     4. **Image Format**: Use JPG or PNG images for best results
     """)
 
+def render_diagnostics_result(job, rows):
+    st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
+
 def render_login():
     with st.form("login_form"):
         username = st.text_input(t("username"))
         password = st.text_input(t("password"), type="password")
         submit = st.form_submit_button(t("login"))
         if submit:
-            conn = sqlite3.connect(Config.DB_NAME)
-            c = conn.cursor()
-            c.execute("SELECT password, name FROM users WHERE username=?", (username,))
-            row = c.fetchone()
-            if row and check_password(row[0], password):
+            ip = client_ip()
+            ip_key = f"ip:{ip}" if ip else None
+            user_key = f"user:{username}"
+            wait = auth.throttle.retry_after(user_key, ip_key)
+            if wait:
+                metrics.increment("auth.login_throttled")
+                st.error(f"Too many failed attempts. Try again in {int(wait) + 1} seconds.")
+                return
+            with metrics.timer("auth.db_lookup"):
+                row = get_db().fetch_one("get_credentials", (username,))
+            try:
+                valid = bool(row) and check_password(row[0], password)
+            except auth.AuthBusy:
+                metrics.increment("auth.login_busy")
+                st.warning("The server is busy verifying other logins. Please try again in a moment.")
+                return
+            if valid:
+                metrics.increment("auth.login_success")
+                auth.throttle.success(user_key)
                 st.success(f"{t('welcome')} {row[1]}!")
                 st.session_state['logged_in'] = True
                 st.session_state['username'] = username
                 st.session_state['name'] = row[1]
+                st.session_state['location'] = row[2] or Config.DEFAULT_LOCATION
+                st.session_state['auth_token'] = auth.signer.issue(username)
                 st.rerun()
             else:
+                metrics.increment("auth.login_failure")
+                auth.throttle.failure(user_key, ip_key)
                 st.error(t("invalid_credentials"))
-            conn.close()
 
 def render_register():
     with st.form("register_form"):
@@ -332,6 +567,7 @@ def render_register():
         password = st.text_input(t("password"), type="password")
         confirm_password = st.text_input(t("confirm_password"), type="password")
         farm_size = st.number_input("Farm Size (acres)", min_value=0.1, value=Config.DEFAULT_FARM_SIZE, step=0.1)
+        location = st.text_input("Location (city)", value=Config.DEFAULT_LOCATION)
         submit = st.form_submit_button(t("register"))
         if submit:
             if password != confirm_password:
@@ -339,35 +575,146 @@ def render_register():
             elif not validate_email_address(email):
                 st.error(t("invalid_email"))
             else:
-                hashed_pw = hash_password(password)
-                conn = sqlite3.connect(Config.DB_NAME)
-                c = conn.cursor()
                 try:
-                    c.execute("INSERT INTO users (username, password, name, email, farm_size) VALUES (?, ?, ?, ?, ?)",
-                              (username, hashed_pw, name, email, farm_size))
-                    conn.commit()
+                    hashed_pw = hash_password(password)
+                except auth.AuthBusy:
+                    st.warning("The server is busy. Please try registering again in a moment.")
+                    return
+                try:
+                    with metrics.timer("auth.db_insert"):
+                        get_db().execute("create_user", (username, hashed_pw, name, email, farm_size, location.strip()))
+                    weather.service.refresh(location)
                     st.success(t("registration_success"))
                     time.sleep(1)
                     st.session_state['current_page'] = 'Login'
                     st.rerun()
                 except sqlite3.IntegrityError:
                     st.error("Username or email already exists.")
-                finally:
-                    conn.close()
 
 def render_crop_yield():
     st.header(t("crop_yield"))
     
+    mode = st.radio("Mode", ["Single prediction", "Input planner", "Batch upload"], horizontal=True)
+    if mode == "Batch upload":
+        render_batch_yield()
+    elif mode == "Input planner":
+        render_input_planner()
+    else:
+        render_single_yield()
+
+def render_batch_yield():
+    st.write(f"Upload a CSV with the columns: {', '.join(FEATURE_COLUMNS)}")
+    uploaded_file = st.file_uploader("Upload CSV", type=["csv"])
+    
+    if uploaded_file is not None:
+        if uploaded_file.size > Config.MAX_BATCH_UPLOAD_MB * 1024 * 1024:
+            st.error(f"File size exceeds {Config.MAX_BATCH_UPLOAD_MB}MB limit.")
+            return
+        
+        if st.button(t("predict")):
+            get_jobs().submit(st.session_state.get("username"), "yield_batch", {"file": uploaded_file.name},
+                              uploaded_file.getvalue())
+            st.success("Scoring started. You can leave this page; results stay here when it finishes.")
+    
+    render_jobs("yield_batch", render_yield_batch_result)
+
+def render_yield_batch_result(job, results):
+    if results is None or results.empty:
+        st.info("No rows were scored.")
+        return
+    skipped = int(results["Predicted_Yield"].isna().sum())
+    if skipped:
+        st.warning(f"{skipped:,} rows had missing or non-numeric inputs and were not scored.")
+    st.dataframe(results.head(100), use_container_width=True)
+    st.download_button(
+        "Download results",
+        data=results.to_csv(index=False).encode(),
+        file_name="yield_predictions.csv",
+        mime="text/csv",
+        key=f"download_{job['id']}",
+    )
+
+def render_input_planner():
+    st.caption("Scores every fertilizer and pesticide combination on a grid and finds the cheapest plan "
+               "that reaches your target yield.")
+    encoders = load_yield_encoders()
+    col1, col2 = st.columns(2)
+    with col1:
+        crop = st.selectbox(t("select_crop"), options=list(encoders["Crop"].keys()), key="plan_crop")
+        season = st.selectbox(t("select_season"), options=list(encoders["Season"].keys()), key="plan_season")
+        state = st.selectbox(t("select_state"), options=list(encoders["State"].keys()), key="plan_state")
+        area = st.number_input(t("area"), min_value=0.1, value=1.0, step=0.1, key="plan_area")
+        rainfall = st.number_input(t("rainfall"), min_value=0, value=1000, step=10, key="plan_rainfall")
+    
+    # Grid bounds default to three times the historical per-hectare rates
+    store = load_crop_history()
+    history = store.totals(crops=[crop], states=[state])
+    if history is None:
+        history = store.totals(crops=[crop])
+    fertilizer_rate = history["Fertilizer"] / history["Area"] if history is not None and history["Area"] else 150.0
+    pesticide_rate = history["Pesticide"] / history["Area"] if history is not None and history["Area"] else 0.5
+    with col2:
+        target = st.number_input("Target yield (tons/hectare)", min_value=0.0, step=0.1,
+                                 value=round(float(history["Yield"]), 2) if history is not None else 1.0)
+        max_fertilizer = st.number_input("Max fertilizer (kg)", min_value=1.0, value=float(round(3 * fertilizer_rate * area, 1)))
+        max_pesticide = st.number_input("Max pesticide (kg)", min_value=0.01, value=float(round(3 * pesticide_rate * area, 2)))
+        fertilizer_price = st.number_input("Fertilizer price (₹/kg)", min_value=0.0, value=Config.FERTILIZER_PRICE_PER_KG)
+        pesticide_price = st.number_input("Pesticide price (₹/kg)", min_value=0.0, value=Config.PESTICIDE_PRICE_PER_KG)
+    
+    if not st.button("Find plan"):
+        return
+    start = time.perf_counter()
+    result = optimize_inputs(crop, season, state, area, rainfall, (0.0, max_fertilizer), (0.0, max_pesticide),
+                             target, fertilizer_price, pesticide_price, Config.PLANNER_GRID_STEPS)
+    if isinstance(result, str):
+        st.error(result)
+        return
+    plan = result["plan"]
+    record_prediction(
+        "input_plan",
+        {"crop": crop, "season": season, "state": state, "area": area, "rainfall": rainfall, "target": target},
+        f"{plan['fertilizer']:.1f} kg fertilizer, {plan['pesticide']:.2f} kg pesticide" if plan else "Target not reachable",
+        plan["cost"] if plan else None,
+        yield_version(),
+        start,
+    )
+    
+    if plan:
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Fertilizer", f"{plan['fertilizer']:.1f} kg")
+        col2.metric("Pesticide", f"{plan['pesticide']:.2f} kg")
+        col3.metric("Predicted yield", f"{plan['yield']:.2f} t/ha")
+        col4.metric("Input cost", f"₹{plan['cost']:,.0f}")
+    else:
+        best = result["best"]
+        st.warning(f"No plan in this range reaches {target:.2f} t/ha. The highest predicted yield is "
+                   f"{best['yield']:.2f} t/ha with {best['fertilizer']:.1f} kg fertilizer and "
+                   f"{best['pesticide']:.2f} kg pesticide.")
+    
+    fig = go.Figure(go.Heatmap(x=result["fertilizer"], y=result["pesticide"], z=result["yield"],
+                               colorscale="YlGn", colorbar={"title": "t/ha"}))
+    markers = [("Highest yield", result["best"], "star")] + ([("Cheapest plan", plan, "circle")] if plan else [])
+    for name, point, symbol in markers:
+        fig.add_trace(go.Scatter(x=[point["fertilizer"]], y=[point["pesticide"]], mode="markers", name=name,
+                                 marker={"symbol": symbol, "size": 14, "color": "crimson", "line": {"width": 1}}))
+    fig.update_layout(title=f"Predicted yield for {crop} / {season} / {state}", xaxis_title="Fertilizer (kg)",
+                      yaxis_title="Pesticide (kg)", legend={"orientation": "h"})
+    st.plotly_chart(fig, use_container_width=True)
+    st.caption(f"Scored {result['evaluated']:,} plans in {result['seconds'] * 1000:.0f} ms.")
+
+def render_single_yield():
     col1, col2 = st.columns(2)
     
+    # Offer exactly the categories the loaded model was trained on
+    encoders = load_yield_encoders()
     with col1:
-        crop_options = list(crop_map.keys())
+        crop_options = list(encoders["Crop"].keys())
         crop = st.selectbox(t("select_crop"), options=crop_options)
         
-        season_options = list(season_map.keys())
+        season_options = list(encoders["Season"].keys())
         season = st.selectbox(t("select_season"), options=season_options)
         
-        state_options = list(state_map.keys())
+        state_options = list(encoders["State"].keys())
         state = st.selectbox(t("select_state"), options=state_options)
     
     with col2:
@@ -378,7 +725,17 @@ def render_crop_yield():
     
     if st.button(t("predict")):
         with st.spinner("Predicting yield..."):
+            start = time.perf_counter()
             prediction = predict_yield(crop, season, state, area, rainfall, fertilizer, pesticide)
+            record_prediction(
+                "yield",
+                {"crop": crop, "season": season, "state": state, "area": area,
+                 "rainfall": rainfall, "fertilizer": fertilizer, "pesticide": pesticide},
+                prediction if isinstance(prediction, str) else f"{prediction:.2f} t/ha",
+                None if isinstance(prediction, str) else prediction,
+                yield_version(),
+                start,
+            )
             
             if isinstance(prediction, str):
                 st.error(prediction)
@@ -393,22 +750,43 @@ def render_crop_yield():
                 - {t('state')}: {state}
                 - {t('area')}: {area} hectares
                 """)
+                
+                analogs = find_analogs(crop, season, state, area, rainfall, fertilizer, pesticide, k=Config.YIELD_ANALOGS)
+                if analogs:
+                    st.subheader("Similar historical records")
+                    st.dataframe(pd.DataFrame(analogs).rename(columns={"Crop_Year": "Year", "distance": "Distance"}),
+                                 hide_index=True, use_container_width=True)
+                else:
+                    st.caption(f"No historical records for {crop} / {season} / {state}.")
 
 def render_disease_detection():
     st.header(t("disease_detection"))
+    
+    mode = st.radio("Mode", ["Single leaf", "Multiple leaves", "Field scan"], horizontal=True)
+    if mode == "Field scan":
+        render_field_scan()
+        return
+    if mode == "Multiple leaves":
+        render_disease_screen()
+        return
+    
     uploaded_file = st.file_uploader(t("upload_image"), type=["jpg", "jpeg", "png"])
     
     if uploaded_file is not None:
         if uploaded_file.size > Config.MAX_UPLOAD_SIZE_MB * 1024 * 1024:
             st.error(f"File size exceeds {Config.MAX_UPLOAD_SIZE_MB}MB limit.")
         else:
-            img = Image.open(uploaded_file)
-            st.image(img, caption=t("uploaded_image"), use_column_width=True)
+            st.image(uploaded_file, caption=t("uploaded_image"), use_column_width=True)
             
             if st.button(t("analyze")):
                 with st.spinner("Analyzing image..."):
-                    label, confidence = predict_disease(img)
+                    # Pass the undecoded upload so JPEGs can use reduced-size decoding
+                    start = time.perf_counter()
+                    label, confidence = predict_disease(uploaded_file)
+                    record_prediction("disease", {"file": uploaded_file.name, "bytes": uploaded_file.size},
+                                      label, confidence, disease_version(), start)
                     
+                with metrics.timer("render.disease_result"):
                     if "error" in label.lower():
                         st.error(f"Analysis failed: {label}")
                     else:
@@ -418,13 +796,83 @@ def render_disease_detection():
                             st.error(f"⚠️ {label} detected ({confidence:.2f}% confidence)")
                             st.info("**Recommendation**: Consider using appropriate treatment and removing affected leaves.")
 
+def render_disease_screen():
+    uploaded_files = st.file_uploader(t("upload_image"), type=["jpg", "jpeg", "png"], accept_multiple_files=True)
+    if not uploaded_files:
+        render_jobs("disease_screen", render_disease_screen_result)
+        return
+    
+    if len(uploaded_files) > Config.MAX_SCREEN_IMAGES:
+        st.error(f"Upload at most {Config.MAX_SCREEN_IMAGES} images at a time.")
+    elif sum(f.size for f in uploaded_files) > Config.MAX_BATCH_UPLOAD_MB * 1024 * 1024:
+        st.error(f"Total upload size exceeds {Config.MAX_BATCH_UPLOAD_MB}MB limit.")
+    elif st.button(t("analyze")):
+        payload = pickle.dumps([(f.name, f.getvalue()) for f in uploaded_files])
+        get_jobs().submit(st.session_state.get("username"), "disease_screen", {}, payload)
+        st.success(f"Screening {len(uploaded_files)} images in the background.")
+    
+    render_jobs("disease_screen", render_disease_screen_result)
+
+def render_disease_screen_result(job, results):
+    diseased = ~results["Label"].str.lower().str.contains("healthy") & results["Confidence"].notna()
+    st.write(f"{int(diseased.sum())} of {len(results)} leaves show signs of disease.")
+    st.dataframe(results, hide_index=True, use_container_width=True)
+    st.download_button(
+        "Download results",
+        data=results.to_csv(index=False).encode(),
+        file_name="disease_screening.csv",
+        mime="text/csv",
+        key=f"download_{job['id']}",
+    )
+
+def render_field_scan():
+    st.caption("Upload a full-resolution photo of a plot. It is cut into overlapping 224x224 tiles "
+               "and every tile is screened, so individual leaves keep their detail.")
+    uploaded_file = st.file_uploader(t("upload_image"), type=["jpg", "jpeg", "png"], key="field_scan_upload")
+    overlap = st.slider("Tile overlap", 0.0, 0.5, field_scan.DEFAULT_OVERLAP, 0.05)
+    
+    if uploaded_file is None:
+        return
+    if uploaded_file.size > Config.MAX_FIELD_UPLOAD_MB * 1024 * 1024:
+        st.error(f"File size exceeds {Config.MAX_FIELD_UPLOAD_MB}MB limit.")
+        return
+    
+    if st.button(t("analyze")):
+        with st.spinner("Screening tiles..."):
+            start = time.perf_counter()
+            try:
+                result = field_scan.scan(uploaded_file, overlap, Config.FIELD_SCAN_BATCH_SIZE)
+            except ValueError as e:
+                st.error(str(e))
+                return
+            except Exception as e:
+                logger.error(f"Field scan failed: {e}")
+                st.error("Analysis failed: Model Load Error")
+                return
+            record_prediction("field_scan", {"file": uploaded_file.name, "overlap": overlap, "tiles": result["tiles"]},
+                              f"{result['infected_percent']:.1f}% infected", result["infected_percent"],
+                              disease_version(), start)
+        
+        with metrics.timer("render.field_scan_result"):
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Infected tiles", f"{result['infected_percent']:.1f}%")
+            col2.metric("Tiles screened", result["tiles"])
+            col3.metric("Grid", f"{result['rows']} x {result['cols']}")
+            st.image(field_scan.overlay(result), caption="Red: likely diseased, green: likely healthy",
+                     use_column_width=True)
+            counts = field_scan.label_counts(result)
+            st.dataframe(pd.DataFrame(sorted(counts.items(), key=lambda kv: -kv[1]), columns=["Label", "Tiles"]),
+                         hide_index=True, use_container_width=True)
+            if result["infected_percent"] > 0:
+                st.info("**Recommendation**: Inspect the red areas and treat or remove affected plants.")
+
 def render_weather():
     st.header(t("weather_forecast"))
-    location = st.text_input(t("enter_location"), value="Pune")
+    location = st.text_input(t("enter_location"), value=st.session_state.get("location", Config.DEFAULT_LOCATION))
     
     if st.button(t("fetch_weather")):
         with st.spinner("Fetching weather data..."):
-            weather_data = get_weather(location)
+            weather_data = get_weather(location, wait=Config.WEATHER_WAIT_SECONDS)
             if weather_data:
                 col1, col2, col3 = st.columns(3)
                 with col1:
@@ -445,24 +893,105 @@ def render_weather():
             else:
                 st.error("Could not fetch weather data. Please check the location name.")
 
+def render_crop_history():
+    st.header("Crop History Dashboard")
+    store = load_crop_history()
+    
+    with st.expander("Filters", expanded=True):
+        col1, col2, col3 = st.columns(3)
+        crops = col1.multiselect("Crop", store.labels["Crop"])
+        states = col2.multiselect("State", store.labels["State"])
+        seasons = col3.multiselect("Season", store.labels["Season"])
+        years = st.slider("Years", store.years[0], store.years[1], store.years)
+        col1, col2 = st.columns(2)
+        metric = col1.selectbox("Metric", HISTORY_METRICS)
+        split = col2.selectbox("Split trend by", ["None", "Crop", "State", "Season"])
+    
+    filters = {"crops": crops, "states": states, "seasons": seasons,
+               "years": None if tuple(years) == store.years else years}
+    totals = store.totals(**filters)
+    if totals is None:
+        st.info("No records match these filters.")
+        return
+    
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Records", f"{int(totals['Records']):,}")
+    col2.metric("Area (ha)", f"{totals['Area']:,.0f}")
+    col3.metric("Production", f"{totals['Production']:,.0f}")
+    col4.metric("Avg Yield", f"{totals['Yield']:.2f}")
+    
+    by = ("Crop_Year",) if split == "None" else ("Crop_Year", split)
+    trend = store.query(by=by, **filters)
+    if split != "None":
+        # Keep the chart readable: only the largest series by total metric
+        top = trend.groupby(split)[metric].sum().nlargest(10).index
+        trend = trend[trend[split].isin(top)]
+    fig = px.line(trend, x="Crop_Year", y=metric, color=None if split == "None" else split,
+                  markers=True, title=f"{metric} by year")
+    st.plotly_chart(fig, use_container_width=True)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        by_state = store.query(by=("State",), **filters).nlargest(10, metric)
+        st.plotly_chart(px.bar(by_state, x=metric, y="State", orientation="h", title=f"Top states by {metric}"),
+                        use_container_width=True)
+    with col2:
+        by_crop = store.query(by=("Crop",), **filters).nlargest(10, metric)
+        st.plotly_chart(px.bar(by_crop, x=metric, y="Crop", orientation="h", title=f"Top crops by {metric}"),
+                        use_container_width=True)
+
+ACTIVITY_NAMES = {
+    "yield": "Yield prediction",
+    "yield_batch": "Batch yield prediction",
+    "disease": "Disease detection",
+    "field_scan": "Field scan",
+    "input_plan": "Input plan",
+}
+
 def render_home():
     st.header("AgroAI - Smart Farming Assistant")
     
     if 'logged_in' in st.session_state and st.session_state['logged_in']:
         st.write(f"Hello {st.session_state.get('name', 'User')}! Welcome to your farming dashboard.")
         
+        # Served from the predictions indexes on (username, ...), so this
+        # stays fast however many rows the table holds
+        username = st.session_state.get("username")
+        log = start_prediction_log()
+        summary = log.summary(username)
+        week = log.summary(username, since=time.time() - 7 * 24 * 3600)
+        
         # Quick stats
         col1, col2, col3 = st.columns(3)
         with col1:
             st.metric("Farm Size", f"{st.session_state.get('farm_size', Config.DEFAULT_FARM_SIZE)} acres")
         with col2:
-            st.metric("Recommended Crops", "3")
+            st.metric("Predictions", sum(s["count"] for s in summary.values()),
+                      f"{sum(s['count'] for s in week.values())} this week", delta_color="off")
         with col3:
-            st.metric("Weather", "Sunny")
+            # Never waits: shows the cached reading (possibly stale) or a placeholder
+            location = st.session_state.get("location", Config.DEFAULT_LOCATION)
+            weather_data = get_weather(location)
+            if weather_data:
+                st.metric(f"Weather ({weather_data['city']})", f"{weather_data['temp']} °C", weather_data["description"],
+                          delta_color="off")
+            else:
+                st.metric("Weather", "Loading...")
         
         # Recent activities
         st.subheader("Recent Activities")
-        st.info("No recent activities. Start by exploring the features in the sidebar.")
+        recent = log.recent(username, Config.RECENT_ACTIVITY_ROWS)
+        if not recent:
+            st.info("No recent activities. Start by exploring the features in the sidebar.")
+        else:
+            st.dataframe(pd.DataFrame({
+                "When": [datetime.fromtimestamp(r["created_at"]).strftime("%Y-%m-%d %H:%M") for r in recent],
+                "Activity": [ACTIVITY_NAMES.get(r["kind"], r["kind"]) for r in recent],
+                "Result": [r["output"] for r in recent],
+            }), hide_index=True, use_container_width=True)
+            if summary.get("yield", {}).get("avg_value") is not None:
+                st.caption(f"Average predicted yield: {summary['yield']['avg_value']:.2f} t/ha "
+                           f"over {summary['yield']['count']} predictions")
     else:
         st.write("""
         AgroAI helps farmers make data-driven decisions for better crop management.
@@ -489,11 +1018,17 @@ def render_sidebar():
         )
         st.session_state.language = lang
         
+        state = warmup_state() if inference_client.client is None else "ready"
+        if state == "warming":
+            st.caption("⏳ Models warming up...")
+        elif state == "failed":
+            st.caption("⚠️ Some models failed to load. See Model Diagnostics.")
+        
         if 'logged_in' in st.session_state and st.session_state['logged_in']:
             st.write(f"**{t('welcome')}, {st.session_state.get('name', 'User')}**")
             
             # Navigation for logged-in users
-            page_options = ["Home", "Crop Yield", "Disease Detection", "Weather", "Model Diagnostics"]
+            page_options = ["Home", "Crop Yield", "Crop History", "Disease Detection", "Weather", "Model Diagnostics"]
             page = st.radio("Navigate", page_options, index=0)
             
             # Logout button
@@ -519,8 +1054,16 @@ def main():
     if 'current_page' not in st.session_state:
         st.session_state.current_page = "Home"
     
-    # Initialize database
-    init_db()
+    # Open the shared connection pool and auth workers (runs once per process)
+    get_db()
+    configure_auth()
+    start_prediction_log()
+    get_jobs()
+    restore_session()
+    
+    # Load shared models and prefetch users' weather (runs once per process)
+    warm_up_models()
+    start_weather()
     
     # Render sidebar
     render_sidebar()
@@ -528,6 +1071,14 @@ def main():
     # Render main content based on selected page
     current_page = st.session_state.current_page
     
+    with metrics.timer(f"render.page.{current_page}"):
+        render_page(current_page)
+    
+    # Footer
+    st.markdown("---")
+    st.markdown("AgroAI © 2023 | Making farming smarter and more efficient")
+
+def render_page(current_page):
     if current_page == "Home":
         render_home()
     elif current_page == "Login":
@@ -536,16 +1087,14 @@ def main():
         render_register()
     elif current_page == "Crop Yield":
         render_crop_yield()
+    elif current_page == "Crop History":
+        render_crop_history()
     elif current_page == "Disease Detection":
         render_disease_detection()
     elif current_page == "Weather":
         render_weather()
     elif current_page == "Model Diagnostics":
         render_model_diagnostic()
-    
-    # Footer
-    st.markdown("---")
-    st.markdown("AgroAI © 2023 | Making farming smarter and more efficient")
 
 if __name__ == "__main__":
     main()
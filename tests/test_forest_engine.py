@@ -0,0 +1,83 @@
+# ForestEngine must reproduce sklearn's RandomForestRegressor exactly. A
+# small forest is fitted here, so this runs without the real yield model.
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+
+from utils.forest_engine import ForestEngine, SMALL_BATCH_ROWS, flatten_forest, save_forest
+
+TOLERANCE = 1e-9
+
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.default_rng(0)
+    # Categorical-like integer columns and continuous ones, as in the yield features
+    X = np.column_stack([
+        rng.integers(0, 50, 2000),
+        rng.integers(0, 6, 2000),
+        rng.integers(0, 30, 2000),
+        rng.uniform(0, 5000, (2000, 4)),
+    ]).astype(np.float64)
+    y = X[:, 3] * 0.001 + X[:, 5] * 0.01 - X[:, 1] + rng.normal(0, 1, 2000)
+    return X, y
+
+
+@pytest.fixture(scope="module")
+def forest(data):
+    X, y = data
+    return RandomForestRegressor(n_estimators=12, max_depth=10, random_state=0).fit(X, y)
+
+
+@pytest.fixture(scope="module", params=["from_sklearn", "saved"])
+def engine(request, forest, tmp_path_factory):
+    if request.param == "from_sklearn":
+        return ForestEngine.from_sklearn(forest)
+    path = tmp_path_factory.mktemp("forest")
+    save_forest(*flatten_forest(forest), path)
+    return ForestEngine.load(path)
+
+
+def probe_rows(data, forest, n):
+    # Training rows, random rows, and rows sitting exactly on split thresholds
+    X, _ = data
+    rng = np.random.default_rng(1)
+    thresholds = np.concatenate([e.tree_.threshold for e in forest.estimators_])
+    features = np.concatenate([e.tree_.feature for e in forest.estimators_])
+    on_split = X[:len(thresholds)].copy()
+    split = features >= 0
+    on_split[np.arange(split.sum()) % len(on_split), features[split]] = thresholds[split]
+    rows = np.vstack([X, rng.uniform(X.min(axis=0), X.max(axis=0), (1000, X.shape[1])), on_split])
+    return rows[:n]
+
+
+@pytest.mark.parametrize("n", [1, SMALL_BATCH_ROWS - 1, SMALL_BATCH_ROWS + 1, 4000])
+def test_predict_matches_sklearn(data, forest, engine, n):
+    rows = probe_rows(data, forest, n)
+    np.testing.assert_allclose(engine.predict(rows), forest.predict(rows), rtol=0, atol=TOLERANCE)
+
+
+def test_predict_one_matches_sklearn(data, forest, engine):
+    rows = probe_rows(data, forest, 200)
+    expected = forest.predict(rows)
+    actual = np.array([engine.predict_one(tuple(row)) for row in rows])
+    np.testing.assert_allclose(actual, expected, rtol=0, atol=TOLERANCE)
+
+
+def test_predict_grid_matches_sklearn(data, forest, engine):
+    X, _ = data
+    row = X[7]
+    # Include exact split thresholds on both axes
+    thresholds = {f: np.concatenate([e.tree_.threshold[e.tree_.feature == f] for e in forest.estimators_])
+                  for f in (5, 6)}
+    fertilizer = np.unique(np.concatenate([np.linspace(0, 5000, 40), thresholds[5][:20]]))
+    pesticide = np.unique(np.concatenate([np.linspace(0, 5000, 30), thresholds[6][:20]]))
+
+    grid = engine.predict_grid(row, 5, fertilizer, 6, pesticide)
+
+    F, P = np.meshgrid(fertilizer, pesticide)
+    rows = np.repeat(row[np.newaxis], F.size, axis=0)
+    rows[:, 5], rows[:, 6] = F.ravel(), P.ravel()
+    assert grid.shape == (len(pesticide), len(fertilizer))
+    np.testing.assert_allclose(grid, forest.predict(rows).reshape(F.shape), rtol=0, atol=TOLERANCE)
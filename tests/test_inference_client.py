@@ -0,0 +1,70 @@
+# InferenceClient connection reuse against a small scripted HTTP server:
+# a pooled connection the server closed is retried on a new one, and a
+# timeout is never retried.
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from utils.inference_client import InferenceClient
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        if self.path == "/slow":
+            time.sleep(1)
+        data = json.dumps({"path": self.path}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        # /drop answers as keep-alive, then closes the connection anyway,
+        # like a server restarting or timing out an idle connection
+        if self.path == "/drop":
+            self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_client(server, **kwargs):
+    host, port = server.server_address
+    return InferenceClient(f"http://{host}:{port}", pool_size=1, **kwargs)
+
+
+def test_closed_pooled_connection_is_retried(server):
+    client = make_client(server)
+    assert client.request("GET", "/drop") == {"path": "/drop"}
+    time.sleep(0.1)
+    # Goes out on the pooled connection the server has closed
+    assert client.request("GET", "/ok") == {"path": "/ok"}
+    assert server.requests == ["/drop", "/ok"]
+    client.close()
+
+
+def test_timeout_is_not_retried(server):
+    client = make_client(server, timeout=0.3)
+    client.request("GET", "/ok")
+    with pytest.raises(TimeoutError):
+        client.request("GET", "/slow")
+    time.sleep(0.2)
+    assert server.requests == ["/ok", "/slow"]
+    client.close()
@@ -0,0 +1,110 @@
+# Request handling of the inference server routes with a small stand-in
+# yield model, so no real artifact is needed. The routes are called
+# directly, and the handler runs on one in-process ThreadingHTTPServer
+# rather than forked workers.
+
+import json
+import socket
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from benchmarks.stand_ins import stand_in_yield_model
+from utils import inference_client, inference_server, model_registry, yield_predictor
+from utils.inference_client import InferenceClient
+from utils.prediction_log import version_tag
+
+ROW = {"Crop": "Rice", "Season": "Kharif", "State": "Assam", "Area": 120.0,
+       "Annual_Rainfall": 2051.4, "Fertilizer": 11000.0, "Pesticide": 35.0}
+
+
+@pytest.fixture(scope="module", autouse=True)
+def model():
+    model_registry.set_model(yield_predictor.MODEL_NAME, stand_in_yield_model())
+    yield
+    model_registry.unload(yield_predictor.MODEL_NAME)
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), inference_server._Handler)
+    server.daemon_threads = True
+    server.slots = threading.BoundedSemaphore(4)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def post_yield(rows):
+    return inference_server._yield(json.dumps({"rows": rows}).encode())
+
+
+def test_yield_single_row():
+    prediction, = post_yield([ROW])["predictions"]
+    assert isinstance(prediction, float)
+
+
+@pytest.mark.parametrize("value", [None, "n/a", "", float("nan")])
+def test_yield_single_row_bad_value_matches_batch(value):
+    bad = {**ROW, "Fertilizer": value}
+    assert post_yield([bad])["predictions"] == [None]
+    # Inside a larger request the same row is also skipped, not an error
+    assert post_yield([bad, ROW])["predictions"][0] is None
+
+
+def test_yield_missing_column_is_400():
+    row = dict(ROW)
+    del row["Area"]
+    with pytest.raises(inference_server._HTTPError) as e:
+        post_yield([row])
+    assert e.value.status == 400
+
+
+def test_oversized_body_closes_connection(server):
+    with socket.create_connection(server.server_address, timeout=5) as s:
+        # Only the headers are sent; the server must not wait for the body
+        s.sendall(b"POST /v1/yield HTTP/1.1\r\nHost: test\r\n"
+                  b"Content-Length: %d\r\n\r\n" % (inference_server.MAX_BODY_BYTES + 1))
+        response = b""
+        while chunk := s.recv(65536):
+            response += chunk
+    head = response.split(b"\r\n\r\n", 1)[0].decode()
+    assert head.startswith("HTTP/1.1 413")
+    assert "Connection: close" in head
+
+
+def test_yield_info_reports_served_version(server):
+    host, port = server.server_address
+    client = InferenceClient(f"http://{host}:{port}")
+    expected = version_tag(yield_predictor.artifact_fingerprint())
+    assert client.request("GET", "/v1/yield/info") == {"version": expected}
+    assert client.model_version("yield") == expected
+    client.close()
+
+
+class _ServedVersion:
+    # Stands in for the client, reporting whatever version the test sets
+    url = "http://inference.test"
+
+    def __init__(self, version):
+        self.version = version
+
+    def model_version(self, kind):
+        return self.version
+
+
+def test_client_mode_cache_follows_served_version(monkeypatch):
+    served = _ServedVersion("v1")
+    monkeypatch.setattr(inference_client, "client", served)
+    key = yield_predictor._cache_key(*ROW.values())
+    yield_predictor._check_artifact()
+    yield_predictor.cache.set(key, 1.5)
+    # Local artifacts do not matter in client mode, the served version does
+    monkeypatch.setattr(yield_predictor, "artifact_fingerprint", lambda: ("changed",))
+    yield_predictor._check_artifact()
+    assert yield_predictor.cache.get(key) == 1.5
+    served.version = "v2"
+    yield_predictor._check_artifact()
+    assert yield_predictor.cache.get(key) is yield_predictor.MISSING
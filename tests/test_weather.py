@@ -0,0 +1,125 @@
+# WeatherService against benchmarks/weather_stand_in.py, a local server
+# speaking the OpenWeatherMap format, so no API key or network is needed.
+
+import socket
+import time
+
+import pytest
+
+from benchmarks import weather_stand_in
+from utils.weather import OpenWeatherMapProvider, WeatherService
+
+WAIT = 5.0
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = weather_stand_in.start()
+    yield server
+    server.shutdown()
+
+
+def make_service(url, **kwargs):
+    return WeatherService(OpenWeatherMapProvider(api_key="test", base_url=url), **kwargs)
+
+
+@pytest.fixture
+def service(server):
+    server.requests = 0
+    server.peers.clear()
+    services = []
+
+    def create(url=f"http://127.0.0.1:{server.server_port}", **kwargs):
+        services.append(make_service(url, **kwargs))
+        return services[-1]
+
+    yield create
+    for s in services:
+        s.close()
+
+
+def test_miss_then_fresh_hit(server, service):
+    weather = service()
+    # A miss returns nothing straight away and starts a fetch
+    assert weather.get("Pune") is None
+    assert weather.stats["misses"] == 1
+    value = weather.refresh("Pune").result(WAIT)
+    assert value["city"] == "Pune"
+    assert value["temp"] == round(weather_stand_in.fake_weather("Pune")["main"]["temp"], 1)
+
+    assert weather.get("Pune") == value
+    assert weather.stats["fresh"] == 1
+    assert server.requests == 1
+
+
+def test_stale_served_while_revalidating(server, service):
+    weather = service(fresh_ttl=0.05)
+    first = weather.get("Nashik", wait=WAIT)
+    time.sleep(0.1)
+    server.latency = 0.3
+    try:
+        started = time.monotonic()
+        # The stale value comes back without waiting for the slow refresh
+        assert weather.get("Nashik") == first
+        assert time.monotonic() - started < server.latency
+        assert weather.stats["stale"] == 1
+        weather.refresh("Nashik").result(WAIT)
+    finally:
+        server.latency = 0
+    _, age = weather.lookup("Nashik")
+    assert age < 0.05
+    assert server.requests == 2
+
+
+def test_not_found_is_cached(server, service):
+    weather = service()
+    assert weather.get("Nowhere", wait=WAIT) is None
+    assert weather.get("Nowhere") is None
+    assert weather.stats["fresh"] == 1
+    assert weather.stats["errors"] == 0
+    assert server.requests == 1
+
+
+def test_failure_remembered_for_failure_ttl(service):
+    # A port nothing listens on, so every fetch fails to connect
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    weather = service(f"http://127.0.0.1:{port}", failure_ttl=0.2)
+    assert weather.get("Pune", wait=WAIT) is None
+    assert weather.stats["errors"] == 1
+
+    # Within failure_ttl the failure is served from the cache
+    assert weather.get("Pune") is None
+    assert weather.stats["fetches"] == 1
+    time.sleep(0.3)
+    weather.get("Pune")
+    weather.refresh("Pune").result(WAIT)
+    assert weather.stats["fetches"] == 2
+
+
+def test_location_key_is_normalized(server, service):
+    weather = service()
+    value = weather.get("  new   delhi ", wait=WAIT)
+    assert value is not None
+    assert weather.get("New Delhi") == value
+    assert weather.get("NEW DELHI") == value
+    assert weather.stats["fresh"] == 2
+    assert server.requests == 1
+    # Blank locations are never fetched
+    assert weather.get("   ") is None
+    assert server.requests == 1
+
+
+def test_prefetch_uses_pooled_session(server, service):
+    weather = service(max_connections=2)
+    cities = [f"City {i}" for i in range(20)]
+    locations = cities + [c.upper() for c in cities] + ["", None]
+    assert weather.prefetch(locations).result(WAIT) == len(cities)
+    assert server.requests == len(cities)
+    assert all(weather.lookup(c)[0] is not None for c in cities)
+    # Every fetch went through the one session, over at most max_connections
+    assert len(server.peers) <= 2
+    session = weather._session
+    weather.prefetch(["Another city"]).result(WAIT)
+    assert weather._session is session
@@ -0,0 +1,264 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+
+logger = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Where models live locally; AGRO_ARTIFACT_MIRROR points at a local directory
+# or file:// URL holding the same files, so replicas can start with no network
+MANIFEST_PATH = os.environ.get("AGRO_ARTIFACT_MANIFEST", os.path.join(ROOT, "artifacts.json"))
+ARTIFACT_DIR = os.environ.get("AGRO_ARTIFACT_DIR", "notebooks")
+MIRROR = os.environ.get("AGRO_ARTIFACT_MIRROR")
+OFFLINE = os.environ.get("AGRO_OFFLINE", "0") == "1"
+
+CHUNK_SIZE = 1024 * 1024
+
+_manifest = None
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+class ArtifactError(Exception):
+    pass
+
+
+def load_manifest(path=None):
+    global _manifest
+    if path is not None:
+        with open(path) as f:
+            return json.load(f)
+    if _manifest is None:
+        with open(MANIFEST_PATH) as f:
+            _manifest = json.load(f)
+    return _manifest
+
+
+def artifact_path(name):
+    return os.path.join(ARTIFACT_DIR, name)
+
+
+# Pinned artifacts are stored by content under blobs/sha256/<digest>, and
+# the name is a relative symlink to the blob. Changing the pin in the
+# manifest points the name at a different blob, so a stale local copy is
+# never served under the new pin.
+def blob_path(digest):
+    return os.path.join(ARTIFACT_DIR, "blobs", "sha256", digest)
+
+
+def _linked_digest(path):
+    # The digest the name points at, or None for a plain file or no file
+    if not os.path.islink(path):
+        return None
+    target = os.readlink(path)
+    if os.path.dirname(target) != os.path.join("blobs", "sha256"):
+        return None
+    return os.path.basename(target)
+
+
+def _link(name, digest):
+    # Atomically points the name at a blob
+    path = artifact_path(name)
+    tmp = f"{path}.{os.getpid()}.link"
+    os.symlink(os.path.join("blobs", "sha256", digest), tmp)
+    os.replace(tmp, path)
+
+
+def _store_blob(source, digest):
+    # Moves a verified file into the blob store (source is consumed)
+    blob = blob_path(digest)
+    os.makedirs(os.path.dirname(blob), exist_ok=True)
+    with open(source, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(source, blob)
+    return blob
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def verify(path, entry, strict=False):
+    # strict: an entry without a pinned sha256 fails instead of passing unchecked
+    if strict and not entry.get("sha256"):
+        raise ArtifactError(f"{path}: no sha256 pinned in the manifest; run `python -m utils.artifacts pin`")
+    size = os.path.getsize(path)
+    if entry.get("size") is not None and size != entry["size"]:
+        raise ArtifactError(f"{path}: expected {entry['size']} bytes, found {size}")
+    if entry.get("sha256"):
+        actual = sha256_file(path)
+        if actual != entry["sha256"]:
+            raise ArtifactError(f"{path}: sha256 mismatch ({actual})")
+
+
+def _lock_for(name):
+    with _locks_guard:
+        return _locks.setdefault(name, threading.Lock())
+
+
+def _copy_local(source, partial):
+    with open(source, "rb") as src, open(partial, "wb") as dst:
+        shutil.copyfileobj(src, dst, CHUNK_SIZE)
+
+
+def _download_http(url, partial):
+    import requests
+
+    # Resume an interrupted download from where the .part file stopped
+    offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+    with requests.get(url, headers=headers, stream=True, timeout=60) as response:
+        response.raise_for_status()
+        mode = "ab" if offset and response.status_code == 206 else "wb"
+        with open(partial, mode) as f:
+            for block in response.iter_content(CHUNK_SIZE):
+                f.write(block)
+
+
+def _download_gdrive(file_id, partial):
+    import gdown
+    result = gdown.download(f"https://drive.google.com/uc?id={file_id}", partial, quiet=False, resume=True)
+    if result is None:
+        raise ArtifactError(f"Google Drive download failed for {file_id}")
+
+
+def _fetch(name, entry, partial):
+    if MIRROR:
+        mirror = MIRROR
+        if mirror.startswith("file://"):
+            mirror = url2pathname(urlparse(mirror).path)
+        source = os.path.join(mirror, name)
+        if not os.path.exists(source):
+            raise ArtifactError(f"{name} not found in mirror {MIRROR}")
+        _copy_local(source, partial)
+        return
+
+    if OFFLINE:
+        raise ArtifactError(f"{name} is missing and AGRO_OFFLINE=1")
+
+    source = entry["source"]
+    if source.startswith("gdrive:"):
+        _download_gdrive(source.split(":", 1)[1], partial)
+    elif source.startswith("file://"):
+        _copy_local(url2pathname(urlparse(source).path), partial)
+    elif source.startswith(("http://", "https://")):
+        _download_http(source, partial)
+    else:
+        _copy_local(source, partial)
+
+
+def _is_current(name, entry):
+    path = artifact_path(name)
+    digest = entry.get("sha256") if entry else None
+    if not digest:
+        # Unpinned (or unlisted): any local copy is used as is
+        return os.path.exists(path)
+    return _linked_digest(path) == digest and os.path.exists(blob_path(digest))
+
+
+def ensure_artifact(name):
+    path = artifact_path(name)
+    entry = load_manifest().get(name)
+    if _is_current(name, entry):
+        return path
+    if entry is None:
+        raise ArtifactError(f"{name} is not listed in {MANIFEST_PATH}")
+
+    with _lock_for(name):
+        if _is_current(name, entry):
+            return path
+
+        os.makedirs(ARTIFACT_DIR, exist_ok=True)
+        digest = entry.get("sha256")
+        if digest and os.path.exists(blob_path(digest)):
+            # Already fetched under this pin (by this name or another)
+            _link(name, digest)
+            return path
+        if digest and os.path.isfile(path) and not os.path.islink(path) and sha256_file(path) == digest:
+            # A plain copy from before the blob store that matches the pin
+            _store_blob(path, digest)
+            _link(name, digest)
+            return path
+
+        partial = path + ".part"
+        logger.info("Fetching artifact %s", name)
+        _fetch(name, entry, partial)
+
+        try:
+            verify(partial, entry)
+        except ArtifactError:
+            os.remove(partial)
+            raise
+        if not digest:
+            logger.warning("%s has no pinned sha256; run `python -m utils.artifacts pin`", name)
+            # Only a complete, verified file ever appears under the final name
+            with open(partial, "rb") as f:
+                os.fsync(f.fileno())
+            os.replace(partial, path)
+            return path
+
+        _store_blob(partial, digest)
+        _link(name, digest)
+        return path
+
+
+def pin(names=None, manifest_path=None):
+    # Record size and sha256 of the local copies into the manifest, and
+    # move them into the blob store under their digest
+    manifest_path = manifest_path or MANIFEST_PATH
+    manifest = load_manifest(manifest_path)
+    for name in names or manifest:
+        path = artifact_path(name)
+        digest = sha256_file(path)
+        manifest[name]["size"] = os.path.getsize(path)
+        manifest[name]["sha256"] = digest
+        if _linked_digest(path) != digest:
+            if not os.path.exists(blob_path(digest)):
+                if os.path.islink(path):
+                    shutil.copyfile(path, path + ".part")
+                    _store_blob(path + ".part", digest)
+                else:
+                    _store_blob(path, digest)
+            _link(name, digest)
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+    return manifest
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(prog="python -m utils.artifacts")
+    parser.add_argument("command", choices=["fetch", "verify", "pin"])
+    parser.add_argument("names", nargs="*", help="artifact names (default: all in the manifest)")
+    parser.add_argument("--strict", action="store_true", help="verify: fail on artifacts with no pinned sha256")
+    args = parser.parse_args()
+
+    manifest = load_manifest()
+    names = args.names or list(manifest)
+    if args.command == "fetch":
+        for name in names:
+            print(ensure_artifact(name))
+    elif args.command == "verify":
+        for name in names:
+            verify(artifact_path(name), manifest[name], args.strict)
+            print(f"{name}: OK")
+    else:
+        pinned = pin(names)
+        for name in names:
+            print(f"{name}: {pinned[name]['sha256']}")
+
+
+if __name__ == "__main__":
+    main()
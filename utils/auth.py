@@ -0,0 +1,188 @@
+import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import bcrypt
+
+from utils import metrics
+
+DEFAULT_ROUNDS = 12
+
+
+class AuthBusy(Exception):
+    # Raised when the hashing pool's queue is full; the caller should ask the
+    # user to retry instead of piling more work onto the CPU
+    pass
+
+
+class AuthPool:
+    # Runs bcrypt on a small shared pool so a login burst uses at most
+    # `workers` cores. bcrypt releases the GIL, so other sessions' reruns keep
+    # going while hashes are computed. At most `max_pending` calls may be
+    # queued or running; anything beyond that is rejected with AuthBusy.
+
+    def __init__(self, workers=2, max_pending=32, rounds=DEFAULT_ROUNDS, timeout=10.0):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self.timeout = timeout
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+
+    def configure(self, workers=None, max_pending=None, rounds=None, timeout=None):
+        with self._lock:
+            if workers is not None and workers != self.workers:
+                self.workers = max(1, int(workers))
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False)
+                    self._executor = None
+            if max_pending is not None and max_pending != self.max_pending:
+                self.max_pending = max(1, int(max_pending))
+                self._slots = threading.BoundedSemaphore(self.max_pending)
+            if rounds is not None:
+                self.rounds = min(31, max(4, int(rounds)))
+            if timeout is not None:
+                self.timeout = float(timeout)
+
+    def _executor_for_submit(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="auth")
+            return self._executor
+
+    def _run(self, stage, fn, *args):
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            metrics.increment("auth.pool_rejected")
+            raise AuthBusy("Too many logins in progress")
+        try:
+            future = self._executor_for_submit().submit(fn, *args)
+        except Exception:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        try:
+            with metrics.timer(stage):
+                return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            metrics.increment("auth.pool_timeout")
+            raise AuthBusy("Password check timed out") from None
+
+    def hash_password(self, password):
+        rounds = self.rounds
+        return self._run("auth.hash_password",
+                         lambda: bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=rounds)).decode())
+
+    def check_password(self, hashed, password):
+        return self._run("auth.check_password", lambda: bcrypt.checkpw(password.encode(), hashed.encode()))
+
+
+class LoginThrottle:
+    # Counts failed logins per key (username or client IP) in a sliding
+    # window. Once a key reaches `max_failures` it is locked out until its
+    # oldest failure leaves the window, so a flood is rejected before any
+    # bcrypt work is done.
+
+    def __init__(self, max_failures=5, window_seconds=300, max_keys=10000):
+        self.max_failures = max_failures
+        self.window = window_seconds
+        self.max_keys = max_keys
+        self._failures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def configure(self, max_failures=None, window_seconds=None):
+        with self._lock:
+            if max_failures is not None:
+                self.max_failures = max(1, int(max_failures))
+            if window_seconds is not None:
+                self.window = float(window_seconds)
+
+    def _recent(self, key, now):
+        times = self._failures.get(key)
+        if times is None:
+            return None
+        while times and now - times[0] >= self.window:
+            times.pop(0)
+        if not times:
+            del self._failures[key]
+            return None
+        return times
+
+    def retry_after(self, *keys):
+        # Seconds until every key may try again; 0 if none is locked out
+        now = time.monotonic()
+        wait = 0.0
+        with self._lock:
+            for key in filter(None, keys):
+                times = self._recent(key, now)
+                if times and len(times) >= self.max_failures:
+                    wait = max(wait, self.window - (now - times[-self.max_failures]))
+        return wait
+
+    def failure(self, *keys):
+        now = time.monotonic()
+        with self._lock:
+            for key in filter(None, keys):
+                times = self._recent(key, now) or []
+                times.append(now)
+                self._failures[key] = times
+                self._failures.move_to_end(key)
+            while len(self._failures) > self.max_keys:
+                self._failures.popitem(last=False)
+
+    def success(self, *keys):
+        with self._lock:
+            for key in filter(None, keys):
+                self._failures.pop(key, None)
+
+
+class SessionSigner:
+    # HMAC-signed "username|expiry" tokens. Checking one is a single SHA-256,
+    # so a logged-in session never goes back to bcrypt on rerun. Without
+    # AGRO_SESSION_SECRET a random per-process key is used, which only
+    # invalidates tokens on restart.
+
+    def __init__(self, secret=None, ttl_seconds=12 * 3600):
+        self._key = (secret or os.environ.get("AGRO_SESSION_SECRET") or "").encode() or os.urandom(32)
+        self.ttl = ttl_seconds
+
+    def _signature(self, payload):
+        return base64.urlsafe_b64encode(hmac.new(self._key, payload.encode(), hashlib.sha256).digest()).decode()
+
+    def issue(self, username):
+        payload = f"{username}|{int(time.time() + self.ttl)}"
+        return f"{payload}|{self._signature(payload)}"
+
+    def verify(self, token):
+        # Returns the username, or None if the token is forged or expired
+        if not token:
+            return None
+        payload, _, signature = token.rpartition("|")
+        if not hmac.compare_digest(signature, self._signature(payload)):
+            return None
+        username, _, expires = payload.rpartition("|")
+        try:
+            if int(expires) < time.time():
+                return None
+        except ValueError:
+            return None
+        return username
+
+
+pool = AuthPool(rounds=int(os.environ.get("AGRO_BCRYPT_ROUNDS", DEFAULT_ROUNDS)))
+throttle = LoginThrottle()
+signer = SessionSigner()
+
+
+def hash_password(password):
+    return pool.hash_password(password)
+
+
+def check_password(hashed, password):
+    return pool.check_password(hashed, password)
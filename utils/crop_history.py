@@ -0,0 +1,165 @@
+import json
+import logging
+import os
+
+import numpy as np
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CSV_PATH = os.path.join(ROOT, "data", "crop_yield.csv")
+# Cleaned columnar copy of the CSV; rebuilt whenever the CSV changes
+CACHE_PATH = os.environ.get("AGRO_HISTORY_CACHE", os.path.join(ROOT, "data", "crop_yield.npz"))
+FORMAT_VERSION = 1
+
+DIMENSIONS = ("Crop", "Season", "State")
+SUM_COLUMNS = ("Area", "Production", "Fertilizer", "Pesticide")
+MEAN_COLUMNS = ("Annual_Rainfall",)
+# Yield is averaged weighted by area, so a large district counts for more
+# than a small one
+METRICS = ("Yield", "Production", "Area", "Fertilizer", "Pesticide", "Annual_Rainfall", "Records")
+# Aggregates precomputed at build time; any other grouping is computed on
+# the fly from the columns
+AGGREGATES = (
+    ("Crop_Year",),
+    ("Crop_Year", "Crop"),
+    ("Crop_Year", "State"),
+    ("Crop_Year", "Season"),
+    ("State", "Crop"),
+)
+
+
+def source_fingerprint(path):
+    stat = os.stat(path)
+    return [FORMAT_VERSION, stat.st_size, stat.st_mtime_ns]
+
+
+def _group(columns, keys, mask=None):
+    # Sums and weighted means for every metric, grouped by the given code
+    # arrays, using one bincount per metric
+    if mask is not None:
+        keys = [k[mask] for k in keys]
+    else:
+        mask = slice(None)
+    if not keys:
+        group_index = np.zeros(len(columns["Area"][mask]), dtype=np.int64)
+        unique_keys = []
+    else:
+        stacked = np.stack(keys, axis=1)
+        unique_rows, group_index = np.unique(stacked, axis=0, return_inverse=True)
+        group_index = group_index.reshape(-1)
+        unique_keys = [unique_rows[:, i] for i in range(len(keys))]
+    n = int(group_index.max()) + 1 if len(group_index) else 0
+
+    area = columns["Area"][mask]
+    out = {"Records": np.bincount(group_index, minlength=n)}
+    for column in SUM_COLUMNS:
+        out[column] = np.bincount(group_index, weights=columns[column][mask], minlength=n)
+    for column in MEAN_COLUMNS:
+        out[column] = np.bincount(group_index, weights=columns[column][mask], minlength=n) / np.maximum(out["Records"], 1)
+    weighted = np.bincount(group_index, weights=columns["Yield"][mask] * area, minlength=n)
+    out["Yield"] = np.divide(weighted, out["Area"], out=np.zeros(n), where=out["Area"] > 0)
+    return unique_keys, out
+
+
+def build(csv_path=CSV_PATH, cache_path=CACHE_PATH):
+    # pandas is only needed to parse the CSV, never to serve queries
+    import pandas as pd
+
+    with metrics.timer("history.build"):
+        df = pd.read_csv(csv_path)
+        arrays = {}
+        for column in DIMENSIONS:
+            # The source pads categories ("Kharif     ")
+            categorical = pd.Categorical(df[column].astype(str).str.strip())
+            arrays[column] = categorical.codes.astype(np.int16)
+            arrays[f"{column}__labels"] = np.asarray(categorical.categories, dtype=str)
+        arrays["Crop_Year"] = df["Crop_Year"].to_numpy(dtype=np.int16)
+        for column in SUM_COLUMNS + MEAN_COLUMNS + ("Yield",):
+            arrays[column] = pd.to_numeric(df[column], errors="coerce").fillna(0).to_numpy(dtype=np.float64)
+
+        for dims in AGGREGATES:
+            name = "__".join(dims)
+            keys, values = _group(arrays, [arrays[d] for d in dims])
+            for dim, key in zip(dims, keys):
+                arrays[f"agg:{name}:{dim}"] = key
+            for metric, value in values.items():
+                arrays[f"agg:{name}:{metric}"] = value
+        arrays["__meta__"] = np.array(json.dumps({"source": source_fingerprint(csv_path)}))
+
+        tmp = cache_path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, cache_path)
+    logger.info("Built crop history store %s (%d rows)", cache_path, len(df))
+    return cache_path
+
+
+class HistoryStore:
+    # Column arrays of the cleaned CSV plus the precomputed aggregates. Every
+    # query is a boolean mask and a few bincounts over ~20k rows.
+
+    def __init__(self, arrays):
+        self.labels = {d: [str(v) for v in arrays[f"{d}__labels"]] for d in DIMENSIONS}
+        self._codes = {d: {label: i for i, label in enumerate(self.labels[d])} for d in DIMENSIONS}
+        self.columns = {k: arrays[k] for k in arrays if ":" not in k and not k.endswith("__labels") and k != "__meta__"}
+        self.aggregates = {}
+        for dims in AGGREGATES:
+            name = "__".join(dims)
+            self.aggregates[dims] = {k.split(":", 2)[2]: arrays[k] for k in arrays if k.startswith(f"agg:{name}:")}
+        self.years = (int(self.columns["Crop_Year"].min()), int(self.columns["Crop_Year"].max()))
+
+    @classmethod
+    def load(cls, csv_path=CSV_PATH, cache_path=CACHE_PATH):
+        fresh = False
+        if os.path.exists(cache_path):
+            with np.load(cache_path) as data:
+                meta = json.loads(str(data["__meta__"]))
+                if meta.get("source") == source_fingerprint(csv_path):
+                    arrays = {k: data[k] for k in data.files}
+                    fresh = True
+        if not fresh:
+            build(csv_path, cache_path)
+            with np.load(cache_path) as data:
+                arrays = {k: data[k] for k in data.files}
+        return cls(arrays)
+
+    def __len__(self):
+        return len(self.columns["Crop_Year"])
+
+    def _mask(self, crops=None, states=None, seasons=None, years=None):
+        mask = np.ones(len(self), dtype=bool)
+        for dim, selected in (("Crop", crops), ("State", states), ("Season", seasons)):
+            if selected:
+                codes = [self._codes[dim][s] for s in selected if s in self._codes[dim]]
+                mask &= np.isin(self.columns[dim], codes)
+        if years:
+            year = self.columns["Crop_Year"]
+            mask &= (year >= years[0]) & (year <= years[1])
+        return mask
+
+    def _frame(self, dims, keys, values):
+        import pandas as pd
+
+        frame = {}
+        for dim, key in zip(dims, keys):
+            frame[dim] = [self.labels[dim][k] for k in key] if dim in self.labels else key
+        frame.update(values)
+        return pd.DataFrame(frame, columns=list(dims) + list(METRICS))
+
+    def query(self, by=("Crop_Year",), crops=None, states=None, seasons=None, years=None):
+        # Aggregated metrics grouped by `by`; unfiltered groupings that were
+        # precomputed are served straight from the stored arrays
+        by = tuple(by)
+        with metrics.timer("history.query"):
+            if not (crops or states or seasons or years) and by in self.aggregates:
+                agg = self.aggregates[by]
+                return self._frame(by, [agg[d] for d in by], {m: agg[m] for m in METRICS})
+            mask = self._mask(crops, states, seasons, years)
+            keys, values = _group(self.columns, [self.columns[d] for d in by], mask)
+            return self._frame(by, keys, values)
+
+    def totals(self, **filters):
+        return self.query(by=(), **filters).iloc[0] if self._mask(**filters).any() else None
@@ -0,0 +1,220 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from utils import metrics
+
+# Applied to every pooled connection. WAL lets readers run alongside a
+# writer; NORMAL sync is durable across app crashes in WAL mode.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA foreign_keys=ON",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-8000",
+)
+
+# Schema migrations, applied in order; PRAGMA user_version records how many
+# have run. Each entry is a tuple of statements. Only ever append.
+MIGRATIONS = [
+    # 1: users (matches the table the app used to create on every rerun;
+    # default farm size mirrors Config.DEFAULT_FARM_SIZE)
+    (
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            username TEXT PRIMARY KEY,
+            password TEXT,
+            name TEXT,
+            email TEXT UNIQUE,
+            farm_size REAL DEFAULT 5.0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ),
+    # 2: home location, used to prefetch weather for every registered user
+    (
+        "ALTER TABLE users ADD COLUMN location TEXT",
+    ),
+    # 3: disease predictions keyed on image hashes (utils/image_cache.py)
+    (
+        """
+        CREATE TABLE IF NOT EXISTS disease_results (
+            content_hash TEXT PRIMARY KEY,
+            phash INTEGER,
+            label TEXT NOT NULL,
+            confidence REAL NOT NULL,
+            model_version TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_disease_results_version ON disease_results (model_version, created_at)",
+    ),
+    # 4: every prediction a user made (utils/prediction_log.py). The second
+    # index covers the per-kind aggregates, so they never touch the table.
+    (
+        """
+        CREATE TABLE IF NOT EXISTS predictions (
+            id INTEGER PRIMARY KEY,
+            username TEXT,
+            kind TEXT NOT NULL,
+            inputs TEXT,
+            output TEXT,
+            value REAL,
+            model_version TEXT,
+            latency_ms REAL,
+            created_at REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_predictions_user_time ON predictions (username, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_predictions_user_kind ON predictions (username, kind, created_at, value)",
+    ),
+    # 5: background jobs (utils/jobs.py); owner is the app process that
+    # queued the job, so a restarted app can pick up its unfinished work
+    (
+        """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            username TEXT,
+            kind TEXT NOT NULL,
+            params TEXT,
+            payload BLOB,
+            state TEXT NOT NULL,
+            progress REAL NOT NULL DEFAULT 0,
+            message TEXT,
+            result BLOB,
+            error TEXT,
+            owner TEXT,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_jobs_user_time ON jobs (username, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs (state, created_at)",
+    ),
+]
+
+# Named statements; sqlite3 keeps each connection's compiled statements in
+# its statement cache, so reusing the exact text skips re-preparing
+QUERIES = {
+    "get_credentials": "SELECT password, name, location FROM users WHERE username = ?",
+    "get_user": "SELECT username, name, email, farm_size, created_at FROM users WHERE username = ?",
+    "create_user": "INSERT INTO users (username, password, name, email, farm_size, location) VALUES (?, ?, ?, ?, ?, ?)",
+    "put_disease_result": "INSERT OR REPLACE INTO disease_results (content_hash, phash, label, confidence, model_version, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+    "load_disease_results": "SELECT content_hash, phash, label, confidence, created_at FROM disease_results WHERE model_version = ? ORDER BY created_at",
+    "prune_disease_results": "DELETE FROM disease_results WHERE model_version = ? AND created_at < ?",
+    "delete_stale_disease_results": "DELETE FROM disease_results WHERE model_version != ?",
+    "clear_disease_results": "DELETE FROM disease_results",
+    "insert_prediction": "INSERT INTO predictions (username, kind, inputs, output, value, model_version, latency_ms, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+    "recent_predictions": "SELECT kind, output, value, created_at FROM predictions WHERE username = ? ORDER BY created_at DESC LIMIT ?",
+    "prediction_summary": "SELECT kind, COUNT(*), AVG(value), MAX(created_at) FROM predictions WHERE username = ? AND created_at >= ? GROUP BY kind",
+    "insert_job": "INSERT INTO jobs (id, username, kind, params, payload, state, owner, created_at) VALUES (?, ?, ?, ?, ?, 'queued', ?, ?)",
+    "get_job": "SELECT id, username, kind, state, progress, message, error, created_at, started_at, finished_at FROM jobs WHERE id = ?",
+    "load_job": "SELECT username, kind, params, payload FROM jobs WHERE id = ?",
+    "job_result": "SELECT result FROM jobs WHERE id = ? AND state = 'done'",
+    "user_jobs": "SELECT id, username, kind, state, progress, message, error, created_at, started_at, finished_at FROM jobs WHERE username = ? ORDER BY created_at DESC LIMIT ?",
+    "claim_job": "UPDATE jobs SET state = 'running', started_at = ?, progress = 0 WHERE id = ? AND state = 'queued'",
+    "job_progress": "UPDATE jobs SET progress = ?, message = ? WHERE id = ? AND state = 'running'",
+    "finish_job": "UPDATE jobs SET state = 'done', progress = 1, message = ?, result = ?, payload = NULL, finished_at = ? WHERE id = ? AND state = 'running'",
+    "fail_job": "UPDATE jobs SET state = 'failed', error = ?, finished_at = ? WHERE id = ? AND state IN ('queued', 'running')",
+    "cancel_job": "UPDATE jobs SET state = 'cancelled', finished_at = ? WHERE id = ? AND state IN ('queued', 'running')",
+    "latest_done_job": "SELECT id FROM jobs WHERE kind = ? AND params = ? AND state = 'done' ORDER BY finished_at DESC LIMIT 1",
+    "unfinished_jobs": "SELECT id, owner FROM jobs WHERE state IN ('queued', 'running') ORDER BY created_at",
+    "adopt_job": "UPDATE jobs SET state = 'queued', owner = ?, progress = 0, message = NULL, started_at = NULL WHERE id = ? AND owner IS ? AND state IN ('queued', 'running')",
+    "user_locations": "SELECT DISTINCT location FROM users WHERE location IS NOT NULL AND location != ''",
+}
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    # The write lock is taken before reading the version, so concurrent
+    # processes starting up cannot apply the same migration twice
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        version = schema_version(conn)
+        for number in range(version + 1, len(MIGRATIONS) + 1):
+            for statement in MIGRATIONS[number - 1]:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {number}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return schema_version(conn)
+
+
+class Database:
+    # Fixed-size pool of SQLite connections shared by all sessions
+
+    def __init__(self, path, pool_size=8, timeout=30.0):
+        self.path = path
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._pool = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        with self.connection() as conn:
+            self.version = migrate(conn)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False, cached_statements=256)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        conn = None
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                if self._created < self.pool_size:
+                    self._created += 1
+                    conn = self._connect()
+            if conn is None:
+                with metrics.timer("db.pool_wait"):
+                    conn = self._pool.get(timeout=self.timeout)
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._pool.put(conn)
+
+    @contextmanager
+    def transaction(self):
+        with self.connection() as conn:
+            with conn:
+                yield conn
+
+    def fetch_one(self, query, params=()):
+        with self.connection() as conn:
+            return conn.execute(QUERIES.get(query, query), params).fetchone()
+
+    def fetch_all(self, query, params=()):
+        with self.connection() as conn:
+            return conn.execute(QUERIES.get(query, query), params).fetchall()
+
+    def execute(self, query, params=()):
+        with self.transaction() as conn:
+            cursor = conn.execute(QUERIES.get(query, query), params)
+            return cursor.rowcount
+
+    def executemany(self, query, rows):
+        with self.transaction() as conn:
+            cursor = conn.executemany(QUERIES.get(query, query), rows)
+            return cursor.rowcount
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
@@ -1,39 +1,192 @@
 import numpy as np
-from keras.models import load_model
-from PIL import Image
 import json
+import logging
 import os
-import gdown
+
+from utils import image_cache, inference_client, metrics, model_registry
+from utils.artifacts import ARTIFACT_DIR, ensure_artifact
+from utils.image_cache import ImageResultCache
+from utils.inference_batcher import BatchScheduler
+
+logger = logging.getLogger(__name__)
 
 # Paths
-MODEL_PATH = "notebooks/plant_disease_model.h5"
-CLASS_PATH = "notebooks/disease_classes.json"
+MODEL_PATH = os.path.join(ARTIFACT_DIR, "plant_disease_model.h5")
+CLASS_PATH = os.path.join(ARTIFACT_DIR, "disease_classes.json")
+TFLITE_PATH = os.path.join(ARTIFACT_DIR, "plant_disease_model.tflite")
+MODEL_NAME = "disease"
+# "keras" runs the .h5 directly; "tflite" runs the converted model
+# (python scripts/convert_disease_tflite.py) on the TFLite interpreter
+DISEASE_ENGINE = os.environ.get("AGRO_DISEASE_ENGINE", "keras")
+TFLITE_THREADS = int(os.environ.get("AGRO_TFLITE_THREADS", os.cpu_count() or 1))
+IMAGE_SIZE = (224, 224)
+
+# TensorFlow/Keras is imported on first use and artifacts are fetched on
+# first use, so importing this module stays cheap and never touches the network
 
 def download_if_missing():
-    if not os.path.exists(MODEL_PATH):
-        gdown.download("https://drive.google.com/uc?id=1S6f-gU6mMo9htxzJhNZmxwV__2SqxATp", MODEL_PATH, quiet=False)
-    if not os.path.exists(CLASS_PATH):
-        gdown.download("https://drive.google.com/uc?id=1J-onrbrJKyOfzd13wKHhMk92E5gBS80h", CLASS_PATH, quiet=False)
+    ensure_artifact(os.path.basename(MODEL_PATH))
+    ensure_artifact(os.path.basename(CLASS_PATH))
+
+def _stat(path):
+    try:
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+    except OSError:
+        return None
+
+_class_dict = None
+_class_fingerprint = None
+
+def get_class_dict():
+    global _class_dict, _class_fingerprint
+    if inference_client.client is not None:
+        # The served model's labels, not whatever is on local disk
+        return inference_client.client.disease_info()["classes"]
+    if _class_dict is None:
+        # Only the small labels file; the model is fetched when it is loaded
+        ensure_artifact(os.path.basename(CLASS_PATH))
+        # Load class labels
+        with open(CLASS_PATH, "r") as f:
+            _class_dict = json.load(f)
+        _class_fingerprint = _stat(CLASS_PATH)
+    return _class_dict
+
+_loaded_fingerprint = None
+
+def _load():
+    global _loaded_fingerprint
+    if DISEASE_ENGINE == "tflite":
+        from utils.tflite_engine import TFLiteEngine
+        ensure_artifact(os.path.basename(CLASS_PATH))
+        model = TFLiteEngine(TFLITE_PATH, num_threads=TFLITE_THREADS)
+    else:
+        from keras.models import load_model
+        download_if_missing()
+        model = load_model(MODEL_PATH)
+    # Taken after any download, so a freshly fetched file is not a change
+    _loaded_fingerprint = artifact_fingerprint()[0]
+    return model
+
+def _warm_up(model):
+    # First predict builds the inference graph; pay for it before any user does
+    model.predict(np.zeros((1, *IMAGE_SIZE, 3), dtype=np.float32), verbose=0)
+
+model_registry.register(MODEL_NAME, _load, _warm_up)
+
+def load_disease_model():
+    return model_registry.get_model(MODEL_NAME)
 
-download_if_missing()
+def open_image(source):
+    from PIL import Image
+    if isinstance(source, Image.Image):
+        return source
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return Image.open(source)
 
-# Load class labels
-with open(CLASS_PATH, "r") as f:
-    class_dict = json.load(f)
+def preprocess_image(image, out=None):
+    # Writes one float32 image into out (a (224, 224, 3) slot of a batch
+    # buffer); allocates a batch of one when no buffer is given
+    from PIL import Image
 
-def preprocess_image(image):
-    image = image.resize((224, 224))
-    img_array = np.array(image) / 255.0
-    return np.expand_dims(img_array, axis=0)
+    if out is None:
+        batch = np.empty((1, *IMAGE_SIZE, 3), dtype=np.float32)
+        preprocess_image(image, batch[0])
+        return batch
 
+    with metrics.timer("disease.decode"):
+        image = open_image(image)
+        # For a not-yet-decoded JPEG this makes libjpeg decode at 1/2..1/8 scale
+        image.draft("RGB", IMAGE_SIZE)
+        image.load()
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+    with metrics.timer("disease.resize"):
+        image = image.resize(IMAGE_SIZE, Image.BILINEAR, reducing_gap=2.0)
+        np.multiply(np.asarray(image), np.float32(1 / 255), out=out, casting="unsafe")
+    return out
+
+def preprocess_batch(images, out=None):
+    if out is None:
+        out = np.empty((len(images), *IMAGE_SIZE, 3), dtype=np.float32)
+    for i, image in enumerate(images):
+        preprocess_image(image, out[i])
+    return out[:len(images)]
+
+def _decode(predictions):
+    label_index = np.argmax(predictions)
+    label = get_class_dict()[str(label_index)]
+    confidence = float(predictions[label_index]) * 100
+    return label, confidence
+
+def predict_probabilities(batch):
+    # Class probabilities for an already preprocessed float32 batch
+    if inference_client.client is not None:
+        # Sent as uint8 pixels, a quarter of the bytes; x / 255 from
+        # preprocess_image round-trips exactly
+        return inference_client.client.predict_probabilities(np.rint(batch * 255).astype(np.uint8))
+    model = load_disease_model()
+    with metrics.timer("disease.predict"):
+        predictions = model.predict(batch, verbose=0)
+    metrics.increment("disease.batches")
+    metrics.increment("disease.images", len(batch))
+    return predictions
+
+def _predict_batch(batch):
+    return [_decode(p) for p in predict_probabilities(batch)]
+
+# One forward pass per batch, shared by all sessions
+scheduler = BatchScheduler(_predict_batch, max_batch_size=16, max_wait_ms=10, name="disease-batcher")
+
+def configure_batching(max_batch_size, max_wait_ms):
+    scheduler.configure(max_batch_size, max_wait_ms)
+
+def predict_disease_async(image):
+    return scheduler.submit(preprocess_image(image)[0])
+
+def artifact_fingerprint():
+    # Changes whenever the active model or the class labels are replaced on disk
+    return _stat(TFLITE_PATH if DISEASE_ENGINE == "tflite" else MODEL_PATH), _stat(CLASS_PATH)
+
+# Results for uploads seen before, keyed on their bytes and optionally on a
+# perceptual hash so re-encoded or resized copies of a photo also match
+result_cache = ImageResultCache()
+
+def configure_result_cache(max_bytes, hamming_threshold, db=None):
+    result_cache.configure(max_bytes, hamming_threshold, db)
+
+def _check_artifact():
+    global _class_dict
+    client = inference_client.client
+    if client is not None:
+        # Results come from the server's model, whatever is on local disk
+        result_cache.set_version(("inference", client.url, client.model_version("disease")))
+        return
+    fingerprint = artifact_fingerprint()
+    result_cache.set_version(fingerprint)
+    # Labels installed directly (e.g. benchmark stand-ins) have no file to track
+    if _class_fingerprint is not None and fingerprint[1] != _class_fingerprint:
+        logger.info("Disease class labels changed; reloading")
+        _class_dict = None
+    if _loaded_fingerprint is not None and model_registry.is_loaded(MODEL_NAME) and fingerprint[0] != _loaded_fingerprint:
+        logger.info("Disease model artifact changed; reloading")
+        model_registry.unload(MODEL_NAME)
+
+@metrics.timed("disease.total")
 def predict_disease(image):
     try:
-        model = load_model(MODEL_PATH)
-        processed = preprocess_image(image)
-        predictions = model.predict(processed)[0]
-        label_index = np.argmax(predictions)
-        label = class_dict[str(label_index)]
-        confidence = float(predictions[label_index]) * 100
-        return label, confidence
+        _check_artifact()
+        cached, key, phash = image_cache.lookup(result_cache, image)
+        if cached is not None:
+            return cached
+        if inference_client.client is not None:
+            result = tuple(inference_client.client.predict_disease(image))
+        else:
+            result = predict_disease_async(image).result()
+        # Errors raise above, so only real predictions are cached
+        result_cache.set(key, phash, result)
+        return result
     except Exception as e:
+        metrics.increment("disease.errors")
         return "Model Load Error", 0.0
@@ -0,0 +1,128 @@
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from utils import disease_detector, inference_client, metrics
+from utils.prediction_log import version_tag
+
+# Accuracy and speed of the disease model on a labelled image directory:
+# one subfolder per class, named as in disease_classes.json (the layout
+# scripts/train_disease_model.py trains from).
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+BATCH_SIZE = 32
+DECODE_THREADS = 4
+
+
+def list_labelled_images(root, classes):
+    # (paths, class indices, subfolders matching no class). classes maps
+    # the model's output index (as a string) to its class name
+    index = {name: int(i) for i, name in classes.items()}
+    paths, labels, unknown = [], [], []
+    for entry in sorted(os.scandir(root), key=lambda e: e.name):
+        if not entry.is_dir():
+            continue
+        if entry.name not in index:
+            unknown.append(entry.name)
+            continue
+        for dirpath, _, filenames in os.walk(entry.path):
+            for filename in sorted(filenames):
+                if filename.lower().endswith(IMAGE_EXTENSIONS):
+                    paths.append(os.path.join(dirpath, filename))
+                    labels.append(index[entry.name])
+    return paths, labels, unknown
+
+
+def dataset_fingerprint(paths):
+    # Changes when an image is added, removed, moved or rewritten
+    digest = hashlib.blake2b(digest_size=8)
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f"{path}|{stat.st_size}|{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+def model_version():
+    # In client mode, the version of the model the inference server runs
+    if inference_client.client is not None:
+        return inference_client.client.model_version("disease")
+    return version_tag(disease_detector.artifact_fingerprint())
+
+
+def _decode_batch(pool, paths, out):
+    # Decodes paths into out in parallel; returns which slots are readable
+    def decode(i):
+        try:
+            disease_detector.preprocess_image(paths[i], out[i])
+            return True
+        except Exception:
+            return False
+    return np.fromiter(pool.map(decode, range(len(paths))), dtype=bool, count=len(paths))
+
+
+def evaluate(root, batch_size=BATCH_SIZE, progress=None):
+    # Streams the directory through the model batch by batch, decoding the
+    # next batch on a thread pool while the current one is predicted.
+    # Latency is per batch, from the start of predict to its result.
+    classes = disease_detector.get_class_dict()
+    paths, labels, unknown = list_labelled_images(root, classes)
+    if not paths:
+        raise ValueError(f"No labelled images under {root}")
+    labels = np.asarray(labels)
+    n_classes = len(classes)
+    confusion = np.zeros((n_classes, n_classes), dtype=np.int64)
+    unreadable, latencies = 0, []
+    buffers = [np.empty((batch_size, *disease_detector.IMAGE_SIZE, 3), dtype=np.float32) for _ in range(2)]
+    starts = range(0, len(paths), batch_size)
+    version = model_version()
+    # Loading the model is not part of the timings. In client mode batches go
+    # to the inference server and the timings include the round trip.
+    if inference_client.client is None:
+        disease_detector.load_disease_model()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(DECODE_THREADS) as pool, metrics.timer("disease_eval.total"):
+        pending = pool.submit(_decode_batch, pool, paths[:batch_size], buffers[0])
+        for n, start in enumerate(starts):
+            readable = pending.result()
+            batch = buffers[n % 2][:len(readable)]
+            if not readable.all():
+                batch = batch[readable]
+            if start + batch_size < len(paths):
+                pending = pool.submit(_decode_batch, pool, paths[start + batch_size:start + 2 * batch_size],
+                                      buffers[(n + 1) % 2])
+            unreadable += int((~readable).sum())
+            if len(batch):
+                t0 = time.perf_counter()
+                predicted = np.argmax(disease_detector.predict_probabilities(batch), axis=1)
+                latencies.append(time.perf_counter() - t0)
+                np.add.at(confusion, (labels[start:start + len(readable)][readable], predicted), 1)
+            if progress is not None:
+                done = min(start + batch_size, len(paths))
+                progress(done / len(paths), f"{done:,} of {len(paths):,} images")
+    seconds = time.perf_counter() - started
+
+    scored = int(confusion.sum())
+    support = confusion.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        recall = np.diag(confusion) / support
+    return {
+        "classes": [classes[str(i)] for i in range(n_classes)],
+        "confusion": confusion,
+        "support": support,
+        "recall": recall,
+        "accuracy": float(np.trace(confusion) / scored) if scored else None,
+        "images": scored,
+        "unreadable": unreadable,
+        "unknown_folders": unknown,
+        "batch_size": batch_size,
+        "seconds": seconds,
+        "images_per_s": scored / seconds if seconds else None,
+        "latency_ms": {"p50": float(np.percentile(latencies, 50) * 1000),
+                       "p95": float(np.percentile(latencies, 95) * 1000)} if latencies else None,
+        "model_version": version,
+        "served_by": inference_client.client.url if inference_client.client is not None else None,
+    }
@@ -0,0 +1,118 @@
+import math
+
+import numpy as np
+
+from utils import metrics
+from utils.disease_detector import IMAGE_SIZE, get_class_dict, open_image, predict_probabilities
+
+TILE = IMAGE_SIZE[0]
+DEFAULT_OVERLAP = 0.25
+DEFAULT_BATCH_SIZE = 64
+# Overlay is drawn on a copy of the photo at most this wide
+OVERLAY_WIDTH = 1024
+
+
+def _positions(length, tile, overlap):
+    # Evenly spaced tile starts with at least `overlap` shared between
+    # neighbours; the last tile ends within a few pixels of the edge
+    if length <= tile:
+        return 1, 1
+    max_stride = max(1, int(tile * (1 - overlap)))
+    count = math.ceil((length - tile) / max_stride) + 1
+    return count, (length - tile) // (count - 1)
+
+
+def tile_view(image, tile=TILE, overlap=DEFAULT_OVERLAP):
+    # (rows, cols, tile, tile, 3) view of a uint8 HxWx3 array. No pixels are
+    # copied; each tile is a strided window into the original buffer.
+    height, width = image.shape[:2]
+    if height < tile or width < tile:
+        raise ValueError(f"Image is {width}x{height}; field scan needs at least {tile}x{tile}")
+    rows, row_stride = _positions(height, tile, overlap)
+    cols, col_stride = _positions(width, tile, overlap)
+    windows = np.lib.stride_tricks.sliding_window_view(image, (tile, tile, 3))[:, :, 0]
+    return windows[::row_stride, ::col_stride][:rows, :cols], (row_stride, col_stride)
+
+
+def healthy_classes(class_dict):
+    return np.array(["healthy" in class_dict[str(i)].lower() for i in range(len(class_dict))])
+
+
+def scan(source, overlap=DEFAULT_OVERLAP, batch_size=DEFAULT_BATCH_SIZE):
+    # Classifies every tile of a large photo. Returns a dict with per-tile
+    # labels/confidences/infection probabilities (rows x cols grids), the
+    # tile geometry and the share of tiles whose top label is a disease.
+    with metrics.timer("field_scan.decode"):
+        image = open_image(source)
+        image.load()
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        pixels = np.asarray(image)
+
+    tiles, (row_stride, col_stride) = tile_view(pixels, TILE, overlap)
+    rows, cols = tiles.shape[:2]
+    n_tiles = rows * cols
+
+    class_dict = get_class_dict()
+    healthy = healthy_classes(class_dict)
+    probabilities = np.empty((n_tiles, len(class_dict)), dtype=np.float32)
+    # Tiles are read straight from the strided view into one reused float32
+    # batch; reshaping the view to (n, 224, 224, 3) would copy every tile
+    buffer = np.empty((min(batch_size, n_tiles), TILE, TILE, 3), dtype=np.float32)
+    with metrics.timer("field_scan.predict"):
+        for start in range(0, n_tiles, batch_size):
+            batch = buffer[:min(batch_size, n_tiles - start)]
+            for i in range(len(batch)):
+                r, c = divmod(start + i, cols)
+                np.multiply(tiles[r, c], np.float32(1 / 255), out=batch[i], casting="unsafe")
+            probabilities[start:start + len(batch)] = predict_probabilities(batch)
+    metrics.increment("field_scan.tiles", n_tiles)
+
+    labels = probabilities.argmax(axis=1)
+    infected = ~healthy[labels]
+    return {
+        "image": image,
+        "rows": rows,
+        "cols": cols,
+        "stride": (row_stride, col_stride),
+        "labels": labels.reshape(rows, cols),
+        "confidence": probabilities.max(axis=1).reshape(rows, cols),
+        "infection": probabilities[:, ~healthy].sum(axis=1).reshape(rows, cols),
+        "classes": [class_dict[str(i)] for i in range(len(class_dict))],
+        "infected_percent": float(infected.mean() * 100),
+        "tiles": n_tiles,
+    }
+
+
+def label_counts(result):
+    counts = np.bincount(result["labels"].ravel(), minlength=len(result["classes"]))
+    return {result["classes"][i]: int(c) for i, c in enumerate(counts) if c}
+
+
+def overlay(result, alpha=0.45, width=OVERLAY_WIDTH):
+    # The photo with tiles tinted green (healthy) to red (diseased) by their
+    # infection probability; overlapping tiles are averaged
+    from PIL import Image
+
+    image = result["image"]
+    scale = min(1.0, width / image.width)
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    base = np.asarray(image.resize(size, Image.BILINEAR), dtype=np.float32)
+
+    heat = np.zeros(base.shape[:2], dtype=np.float32)
+    hits = np.zeros(base.shape[:2], dtype=np.float32)
+    tile = max(1, round(TILE * scale))
+    row_stride, col_stride = result["stride"]
+    for r in range(result["rows"]):
+        y = round(r * row_stride * scale)
+        for c in range(result["cols"]):
+            x = round(c * col_stride * scale)
+            heat[y:y + tile, x:x + tile] += result["infection"][r, c]
+            hits[y:y + tile, x:x + tile] += 1
+    covered = hits > 0
+    heat[covered] /= hits[covered]
+
+    colour = np.stack([heat * 255, (1 - heat) * 255, np.zeros_like(heat)], axis=-1)
+    blend = np.where(covered[..., None], 1 - alpha, 1.0)
+    out = base * blend + colour * (1 - blend)
+    return Image.fromarray(out.clip(0, 255).astype(np.uint8))
@@ -0,0 +1,183 @@
+import json
+import os
+
+import numpy as np
+
+# Array-backed random forest: every tree's nodes are concatenated into flat
+# arrays so a prediction is a few vectorized gathers instead of sklearn's
+# per-call validation and per-tree dispatch.
+ARRAY_NAMES = ("feature", "threshold", "children", "value", "roots")
+META_FILE = "meta.json"
+# Above this many rows the tree-by-tree traversal beats gathering all trees at once
+SMALL_BATCH_ROWS = 1024
+
+
+def flatten_forest(forest):
+    features, thresholds, children, values, roots = [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        n = tree.node_count
+        left = tree.children_left.astype(np.int32)
+        right = tree.children_right.astype(np.int32)
+        feature = tree.feature.astype(np.int32)
+        threshold = tree.threshold.astype(np.float64)
+
+        # Leaves point at themselves so extra traversal steps are no-ops
+        leaf = left == -1
+        own = np.arange(n, dtype=np.int32)
+        left[leaf] = own[leaf]
+        right[leaf] = own[leaf]
+        feature[leaf] = 0
+
+        features.append(feature)
+        thresholds.append(threshold)
+        # Interleaved (left, right) pairs: child of node i is children[2 * i + went_right]
+        children.append(np.stack([left, right], axis=1).ravel() + offset)
+        values.append(tree.value[:, 0, 0].astype(np.float64))
+        roots.append(offset)
+        offset += n
+        max_depth = max(max_depth, tree.max_depth)
+
+    arrays = {
+        "feature": np.concatenate(features),
+        "threshold": np.concatenate(thresholds),
+        "children": np.concatenate(children),
+        "value": np.concatenate(values),
+        "roots": np.asarray(roots, dtype=np.int32),
+    }
+    meta = {
+        "n_trees": len(roots),
+        "n_nodes": offset,
+        "n_features": int(forest.n_features_in_),
+        "max_depth": int(max_depth),
+    }
+    return arrays, meta
+
+
+def save_forest(arrays, meta, path):
+    # One .npy per array so each can be memory-mapped on load
+    os.makedirs(path, exist_ok=True)
+    for name in ARRAY_NAMES:
+        np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(arrays[name]))
+    with open(os.path.join(path, META_FILE), "w") as f:
+        json.dump(meta, f, indent=2)
+
+
+def artifact_size(path):
+    return sum(os.path.getsize(os.path.join(path, f"{name}.npy")) for name in ARRAY_NAMES)
+
+
+class ForestEngine:
+    def __init__(self, arrays, meta):
+        for name in ARRAY_NAMES:
+            # Plain ndarray views over the mapping skip np.memmap's per-op overhead
+            setattr(self, name, np.asarray(arrays[name]))
+        self.meta = meta
+        self.max_depth = meta["max_depth"]
+        self.n_features = meta["n_features"]
+        self.is_leaf = self.children[::2] == np.arange(len(self.feature))
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        mode = "r" if mmap else None
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode) for name in ARRAY_NAMES}
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+        return cls(arrays, meta)
+
+    @classmethod
+    def from_sklearn(cls, forest):
+        return cls(*flatten_forest(forest))
+
+    def predict(self, X):
+        # sklearn compares float32 inputs against float64 thresholds; match it
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[np.newaxis, :]
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"Expected {self.n_features} features, got {X.shape[1]}")
+
+        if X.shape[0] == 1:
+            return np.array([self._predict_row(X[0])])
+        if X.shape[0] > SMALL_BATCH_ROWS:
+            return self._predict_large(X)
+
+        nodes = np.tile(self.roots, (X.shape[0], 1))
+        rows = np.arange(X.shape[0])[:, np.newaxis]
+        for depth in range(self.max_depth):
+            went_right = X[rows, self.feature[nodes]] > self.threshold[nodes]
+            nodes = self.children[2 * nodes + went_right]
+            # Most trees are far shallower than the deepest one
+            if depth % 4 == 3 and self.is_leaf[nodes].all():
+                break
+        return self.value[nodes].mean(axis=1)
+
+    def _predict_large(self, X):
+        # Tree by tree keeps the working set inside one tree's nodes, and rows
+        # that reached a leaf drop out of the active set
+        n = X.shape[0]
+        XT = np.ascontiguousarray(X.T)
+        total = np.zeros(n)
+        for root in self.roots:
+            nodes = np.full(n, root, dtype=np.int64)
+            active = np.arange(n)
+            while active.size:
+                current = nodes[active]
+                went_right = XT[self.feature[current], active] > self.threshold[current]
+                current = self.children[2 * current + went_right]
+                nodes[active] = current
+                active = active[~self.is_leaf[current]]
+            total += self.value[nodes]
+        return total / len(self.roots)
+
+    def _predict_row(self, x):
+        # 1-D fast path for single predictions
+        nodes = self.roots
+        for depth in range(self.max_depth):
+            nodes = self.children[2 * nodes + (x[self.feature[nodes]] > self.threshold[nodes])]
+            if depth % 4 == 3 and self.is_leaf[nodes].all():
+                break
+        return self.value[nodes].mean()
+
+    def predict_one(self, row):
+        return float(self.predict(row)[0])
+
+    def predict_grid(self, row, x_feature, x_values, y_feature, y_values):
+        # Predictions for row with features x_feature and y_feature swept
+        # over every pair of the given ascending values; returns a
+        # (len(y_values), len(x_values)) array. Each tree is walked once over
+        # index ranges of the two axes, so a split on either feature cuts a
+        # range at its searchsorted position and every reachable leaf adds
+        # its value to one rectangle, instead of routing every grid point.
+        row = np.asarray(row, dtype=np.float32)
+        xs = np.asarray(x_values, dtype=np.float32)
+        ys = np.asarray(y_values, dtype=np.float32)
+        total = np.zeros((len(ys), len(xs)))
+        for root in self.roots:
+            stack = [(int(root), 0, len(xs), 0, len(ys))]
+            while stack:
+                node, x0, x1, y0, y1 = stack.pop()
+                if self.is_leaf[node]:
+                    total[y0:y1, x0:x1] += self.value[node]
+                    continue
+                feature = self.feature[node]
+                threshold = self.threshold[node]
+                left, right = self.children[2 * node], self.children[2 * node + 1]
+                # Same rule as predict(): float32 value <= threshold goes left
+                if feature == x_feature:
+                    cut = min(max(int(np.searchsorted(xs, threshold, side="right")), x0), x1)
+                    if cut > x0:
+                        stack.append((left, x0, cut, y0, y1))
+                    if cut < x1:
+                        stack.append((right, cut, x1, y0, y1))
+                elif feature == y_feature:
+                    cut = min(max(int(np.searchsorted(ys, threshold, side="right")), y0), y1)
+                    if cut > y0:
+                        stack.append((left, x0, x1, y0, cut))
+                    if cut < y1:
+                        stack.append((right, x0, x1, cut, y1))
+                else:
+                    stack.append((right if row[feature] > threshold else left, x0, x1, y0, y1))
+        return total / len(self.roots)
@@ -0,0 +1,220 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Rough per-entry footprint (key, hash, tuple, dict slot); used with the
+# label length to keep the cache under max_bytes
+ENTRY_OVERHEAD_BYTES = 240
+DHASH_SIZE = 8
+
+
+def content_hash(source):
+    # BLAKE2b of the upload's bytes, so it never needs decoding. PIL images
+    # (e.g. generated test images) hash their pixels instead.
+    digest = hashlib.blake2b(digest_size=16)
+    if hasattr(source, "tobytes") and hasattr(source, "mode"):
+        digest.update(f"{source.mode}{source.size}".encode())
+        digest.update(source.tobytes())
+    elif hasattr(source, "getvalue"):
+        digest.update(source.getvalue())
+    elif hasattr(source, "read"):
+        source.seek(0)
+        digest.update(source.read())
+        source.seek(0)
+    else:
+        with open(source, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def dhash(image):
+    # 64-bit difference hash: whether each pixel of a 9x8 grayscale
+    # thumbnail is brighter than its right neighbour. Re-encoding, resizing
+    # and small crops change only a few bits.
+    from PIL import Image
+
+    # Only affects a JPEG that has not been decoded yet
+    image.draft("L", (DHASH_SIZE * 4, DHASH_SIZE * 4))
+    small = np.asarray(image.convert("L").resize((DHASH_SIZE + 1, DHASH_SIZE), Image.BILINEAR), dtype=np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def _to_sqlite(phash):
+    # SQLite integers are signed 64-bit
+    return phash - (1 << 64) if phash is not None and phash >= 1 << 63 else phash
+
+
+def _from_sqlite(value):
+    return value & ((1 << 64) - 1) if value is not None else None
+
+
+class ImageResultCache:
+    # LRU of disease predictions keyed on the upload's content hash, with an
+    # optional near-duplicate match on the perceptual hash. Bounded by an
+    # estimate of its memory use, optionally persisted to the app's SQLite
+    # database, and emptied whenever the model version changes.
+
+    def __init__(self, max_bytes=4 * 1024 * 1024, hamming_threshold=None):
+        self.max_bytes = max_bytes
+        self.hamming_threshold = hamming_threshold
+        self.version = None
+        self.db = None
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def configure(self, max_bytes=None, hamming_threshold=None, db=None):
+        with self._lock:
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            # None turns perceptual matching off
+            self.hamming_threshold = hamming_threshold
+            self._evict()
+        if db is not None and db is not self.db:
+            self.db = db
+            self._load()
+
+    @property
+    def perceptual(self):
+        return self.hamming_threshold is not None
+
+    @staticmethod
+    def _size(value):
+        return ENTRY_OVERHEAD_BYTES + len(value[0])
+
+    def _put(self, key, phash, value):
+        old = self._data.pop(key, None)
+        if old is not None:
+            self._bytes -= self._size(old[1])
+        self._data[key] = (phash, value)
+        self._bytes += self._size(value)
+        self._evict()
+
+    def _evict(self):
+        while self._data and self._bytes > self.max_bytes:
+            _, (_, value) = self._data.popitem(last=False)
+            self._bytes -= self._size(value)
+            self.evictions += 1
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            return None
+
+    def get_near(self, phash):
+        # Closest cached image within the Hamming threshold, if any
+        if not self.perceptual or phash is None:
+            return None
+        with self._lock:
+            best_key, best_distance = None, self.hamming_threshold + 1
+            for key, (other, _) in self._data.items():
+                if other is None:
+                    continue
+                distance = (phash ^ other).bit_count()
+                if distance < best_distance:
+                    best_key, best_distance = key, distance
+            if best_key is None:
+                return None
+            self._data.move_to_end(best_key)
+            self.near_hits += 1
+            return self._data[best_key][1]
+
+    def miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def set(self, key, phash, value):
+        with self._lock:
+            self._put(key, phash, value)
+        if self.db is not None:
+            try:
+                self.db.execute("put_disease_result", (key, _to_sqlite(phash), value[0], value[1], self.version, time.time()))
+            except Exception as e:
+                logger.warning("Could not persist disease result: %s", e)
+
+    def set_version(self, version):
+        version = str(version)
+        if version == self.version:
+            return
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+            self.version = version
+        if self.db is not None:
+            self.db.execute("delete_stale_disease_results", (version,))
+            self._load()
+
+    def _load(self):
+        # Oldest first, so the newest rows are the ones that fit. Rows that
+        # no longer fit are deleted, which keeps the table the cache's size.
+        if self.version is None:
+            return
+        rows = self.db.fetch_all("load_disease_results", (self.version,))
+        with self._lock:
+            for key, phash, label, confidence, _ in rows:
+                self._put(key, _from_sqlite(phash), (label, confidence))
+            kept = len(self._data)
+        if kept < len(rows):
+            self.db.execute("prune_disease_results", (self.version, rows[len(rows) - kept][4]))
+        logger.info("Loaded %d cached disease results", kept)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+        if self.db is not None:
+            self.db.execute("clear_disease_results")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.near_hits + self.misses
+            return {
+                "size": len(self._data),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.near_hits) / lookups if lookups else 0.0,
+            }
+
+
+def lookup(cache, source):
+    # (value, key, phash); value is None on a miss. The perceptual hash is
+    # only computed when the exact lookup misses and matching is enabled.
+    with metrics.timer("disease.cache_lookup"):
+        key = content_hash(source)
+        value = cache.get(key)
+        if value is not None:
+            metrics.increment("disease.cache_hits")
+            return value, key, None
+        phash = None
+        if cache.perceptual:
+            from utils.disease_detector import open_image
+            phash = dhash(open_image(source))
+            value = cache.get_near(phash)
+            if value is not None:
+                metrics.increment("disease.cache_near_hits")
+                cache.set(key, phash, value)
+                return value, key, phash
+        cache.miss()
+        metrics.increment("disease.cache_misses")
+        return None, key, phash
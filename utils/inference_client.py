@@ -0,0 +1,215 @@
+import http.client
+import io
+import json
+import logging
+import os
+import queue
+import socket
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# When set (http://host:port or unix:///path/to.sock), utils.yield_predictor
+# and utils.disease_detector send predictions to the inference server
+# (python -m utils.inference_server) instead of loading the models here
+INFERENCE_URL = os.environ.get("AGRO_INFERENCE_URL")
+POOL_SIZE = int(os.environ.get("AGRO_INFERENCE_POOL_SIZE", "8"))
+# Images per /v1/disease/probabilities request; 128 resized images are
+# about 19 MB, under the server's body limit
+PROBABILITY_BATCH = 128
+TIMEOUT_SECONDS = float(os.environ.get("AGRO_INFERENCE_TIMEOUT", "30"))
+# How long a served model's version is trusted before asking again; result
+# caches are keyed on it, so a model swapped on the server is picked up
+# within this many seconds
+VERSION_TTL = 5.0
+
+
+class InferenceError(Exception):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout):
+        super().__init__("localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+def _image_bytes(source):
+    # The upload's own bytes when there are any, so the server can use
+    # reduced-size JPEG decoding; PIL images are sent as PNG
+    if hasattr(source, "getvalue"):
+        return source.getvalue()
+    if hasattr(source, "read"):
+        source.seek(0)
+        data = source.read()
+        source.seek(0)
+        return data
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            return f.read()
+    buffer = io.BytesIO()
+    source.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class InferenceClient:
+    # Keep-alive connections to the inference server, reused across
+    # sessions. Idle connections are kept LIFO up to pool_size. A request on
+    # a pooled connection the server has since closed is retried once on a
+    # new one; that is only the case when sending fails or the connection
+    # drops before any response, never on a timeout, which may mean the
+    # server is still working on the request.
+
+    def __init__(self, url, pool_size=POOL_SIZE, timeout=TIMEOUT_SECONDS):
+        self.url = url
+        self.pool_size = pool_size
+        self.timeout = timeout
+        parsed = urlparse(url)
+        if parsed.scheme == "unix":
+            self._connect = lambda: _UnixHTTPConnection(parsed.path, timeout)
+        elif parsed.scheme == "http":
+            self._connect = lambda: http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=timeout)
+        else:
+            raise ValueError(f"Unsupported inference URL: {url}")
+        self._idle = queue.LifoQueue()
+        self._versions = {}
+
+    def _acquire(self):
+        # (connection, whether it came from the pool)
+        try:
+            return self._idle.get_nowait(), True
+        except queue.Empty:
+            return self._connect(), False
+
+    def _release(self, conn):
+        if self._idle.qsize() < self.pool_size:
+            self._idle.put(conn)
+        else:
+            conn.close()
+
+    def request(self, method, path, body=None, content_type="application/json"):
+        headers = {"Content-Type": content_type} if body is not None else {}
+        for attempt in range(2):
+            # The retry always opens a new connection
+            conn, reused = self._acquire() if not attempt else (self._connect(), False)
+            stale = False
+            try:
+                try:
+                    conn.request(method, path, body=body, headers=headers)
+                except (BrokenPipeError, ConnectionResetError):
+                    stale = reused
+                    raise
+                try:
+                    response = conn.getresponse()
+                except http.client.RemoteDisconnected:
+                    stale = reused
+                    raise
+                data = response.read()
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                if stale:
+                    continue
+                raise
+            self._release(conn)
+            payload = json.loads(data) if data else {}
+            if response.status != 200:
+                raise InferenceError(payload.get("error", f"HTTP {response.status}"), response.status)
+            return payload
+
+    def post_json(self, path, payload):
+        return self.request("POST", path, json.dumps(payload).encode())
+
+    def health(self):
+        return self.request("GET", "/health")
+
+    def predict_yield(self, crop, season, state, area, rainfall, fertilizer, pesticide):
+        with metrics.timer("inference_client.yield"):
+            rows = [{"Crop": crop, "Season": season, "State": state, "Area": area, "Annual_Rainfall": rainfall,
+                     "Fertilizer": fertilizer, "Pesticide": pesticide}]
+            return self.post_json("/v1/yield", {"rows": rows})["predictions"][0]
+
+    def predict_yield_rows(self, frame):
+        # One yield per row of a DataFrame with FEATURE_COLUMNS; NaN where
+        # the server could not score the row
+        from utils.yield_predictor import FEATURE_COLUMNS
+
+        with metrics.timer("inference_client.yield_batch"):
+            rows = json.loads(frame[FEATURE_COLUMNS].to_json(orient="records"))
+            predictions = self.post_json("/v1/yield", {"rows": rows})["predictions"]
+        return np.array([np.nan if p is None else p for p in predictions], dtype=np.float64)
+
+    def predict_yield_grid(self, crop, season, state, area, rainfall, fertilizer_levels, pesticide_levels):
+        with metrics.timer("inference_client.yield_grid"):
+            payload = {"crop": crop, "season": season, "state": state, "area": area, "rainfall": rainfall,
+                       "fertilizer": [float(v) for v in fertilizer_levels],
+                       "pesticide": [float(v) for v in pesticide_levels]}
+            return np.array(self.post_json("/v1/yield/grid", payload)["yield"], dtype=np.float64)
+
+    def predict_disease(self, image):
+        with metrics.timer("inference_client.disease"):
+            result = self.request("POST", "/v1/disease", _image_bytes(image), "application/octet-stream")
+        return result["label"], result["confidence"]
+
+    def predict_probabilities(self, pixels):
+        # Class probabilities for a uint8 (n, 224, 224, 3) batch of resized
+        # pixels, sent in requests of at most PROBABILITY_BATCH images
+        pixels = np.ascontiguousarray(pixels, dtype=np.uint8)
+        chunks = []
+        with metrics.timer("inference_client.disease_batch"):
+            for start in range(0, len(pixels), PROBABILITY_BATCH):
+                buffer = io.BytesIO()
+                np.save(buffer, pixels[start:start + PROBABILITY_BATCH], allow_pickle=False)
+                result = self.request("POST", "/v1/disease/probabilities", buffer.getvalue(), "application/octet-stream")
+                chunks.append(np.asarray(result["probabilities"], dtype=np.float32))
+        return np.concatenate(chunks)
+
+    def disease_info(self):
+        # {"classes": {index: name}, "version": tag} of the served model
+        info = self.request("GET", "/v1/disease/info")
+        self._versions["disease"] = (info["version"], time.monotonic())
+        return info
+
+    def model_version(self, kind):
+        # Version tag of the served "yield" or "disease" model, at most
+        # VERSION_TTL seconds old. While the server is unreachable the last
+        # known version is kept (None before the first answer).
+        version, checked = self._versions.get(kind, (None, None))
+        now = time.monotonic()
+        if checked is None or now - checked >= VERSION_TTL:
+            try:
+                version = self.request("GET", f"/v1/{kind}/info")["version"]
+            except (InferenceError, http.client.HTTPException, OSError, ValueError) as e:
+                logger.warning("Could not get the %s model version from %s: %s", kind, self.url, e)
+            self._versions[kind] = (version, now)
+        return version
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+client = InferenceClient(INFERENCE_URL) if INFERENCE_URL else None
+
+
+def configure(url):
+    # Switches client mode on (a URL) or off (None) for this process
+    global client
+    if client is not None:
+        client.close()
+    client = InferenceClient(url) if url else None
+    return client
@@ -0,0 +1,350 @@
+# Headless inference server for the yield and disease models, so Streamlit
+# replicas (AGRO_INFERENCE_URL) share a pool of model workers instead of
+# each holding its own copies.
+#
+#   python -m utils.inference_server --workers 4 --port 8600
+#   python -m utils.inference_server --workers 4 --unix /tmp/agro-inference.sock
+#
+# The parent binds the socket and loads the preloaded models, then forks
+# the workers, which all accept on the shared socket. The yield forest is
+# memory-mapped and preloaded, so its pages are shared copy-on-write.
+# TensorFlow is not fork-safe once it has started its thread pools, so the
+# disease model is loaded in each worker after the fork.
+#
+# POST /v1/yield        {"rows": [{"Crop": ..., "Season": ..., ...}]}  -> {"predictions": [...]}
+# POST /v1/yield/grid   {"crop", "season", "state", "area", "rainfall", "fertilizer": [...], "pesticide": [...]}
+# POST /v1/disease      raw image bytes -> {"label", "confidence"}
+# POST /v1/disease/probabilities   .npy uint8 (n, 224, 224, 3) resized pixels -> {"probabilities": [[...]]}
+# GET  /v1/yield/info    -> {"version"}
+# GET  /v1/disease/info  -> {"classes": {index: name}, "version"}
+# GET  /health
+
+import argparse
+import io
+import json
+import logging
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from utils import inference_client, metrics, model_registry  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+# In-flight requests per worker; more get 503 with Retry-After at once
+# rather than queueing behind the model
+DEFAULT_MAX_CONCURRENCY = 8
+MAX_BODY_BYTES = 25 * 1024 * 1024
+PRELOAD_BEFORE_FORK = ("yield",)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive for the client's pooled connections
+
+    def _send(self, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            # The body is left unread, so the connection cannot be reused
+            self.close_connection = True
+            raise _HTTPError(413, f"Body larger than {MAX_BODY_BYTES} bytes")
+        return self.rfile.read(length)
+
+    def do_GET(self):
+        info = INFO_ROUTES.get(self.path)
+        if info is not None:
+            try:
+                return self._send(200, info())
+            except Exception as e:
+                logger.exception("Request to %s failed", self.path)
+                return self._send(500, {"error": f"{type(e).__name__}: {e}"})
+        if self.path != "/health":
+            return self._send(404, {"error": "Not found"})
+        self._send(200, {"status": "ok", "pid": os.getpid(), "models": model_registry.model_status()})
+
+    def do_POST(self):
+        route = ROUTES.get(self.path)
+        if route is None:
+            self.close_connection = True
+            return self._send(404, {"error": "Not found"})
+        if not self.server.slots.acquire(blocking=False):
+            metrics.increment("inference_server.rejected")
+            # The body is still read, so the connection stays usable
+            length = int(self.headers.get("Content-Length") or 0)
+            if length > MAX_BODY_BYTES:
+                self.close_connection = True
+            else:
+                self.rfile.read(length)
+            return self._send(503, {"error": "Server busy"}, {"Retry-After": "1"})
+        try:
+            with metrics.timer(f"inference_server{self.path.replace('/', '.')}"):
+                status, payload = 200, route(self._body())
+        except _HTTPError as e:
+            status, payload = e.status, {"error": str(e)}
+        except Exception as e:
+            logger.exception("Request to %s failed", self.path)
+            status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+        finally:
+            self.server.slots.release()
+        self._send(status, payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class _HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _json(body):
+    try:
+        return json.loads(body)
+    except ValueError:
+        raise _HTTPError(400, "Body is not valid JSON")
+
+
+def _yield(body):
+    import pandas as pd
+    from utils.yield_predictor import FEATURE_COLUMNS, NUMERIC_COLUMNS, predict_yield, predict_yield_batch
+
+    rows = _json(body).get("rows")
+    if not isinstance(rows, list) or not rows:
+        raise _HTTPError(400, "Expected a non-empty list of rows")
+    if len(rows) == 1:
+        # Single predictions take the cached fast path
+        row = rows[0]
+        try:
+            values = [row[c] for c in FEATURE_COLUMNS]
+        except (KeyError, TypeError) as e:
+            raise _HTTPError(400, f"Missing column: {e.args[0]}")
+        # Same rule as the batch path: a row with a blank or non-numeric
+        # amount is not scored and comes back as None
+        if pd.to_numeric(pd.Series([row[c] for c in NUMERIC_COLUMNS], dtype=object), errors="coerce").isna().any():
+            return {"predictions": [None]}
+        prediction = predict_yield(*values)
+        if isinstance(prediction, str):
+            raise _HTTPError(503, prediction)
+        return {"predictions": [prediction]}
+    try:
+        results = predict_yield_batch(pd.DataFrame(rows))
+    except ValueError as e:
+        raise _HTTPError(400, str(e))
+    if isinstance(results, str):
+        raise _HTTPError(503, results)
+    predictions = results["Predicted_Yield"].to_numpy()
+    return {"predictions": [None if p != p else float(p) for p in predictions]}
+
+
+def _yield_grid(body):
+    from utils.yield_predictor import predict_yield_grid
+
+    request = _json(body)
+    try:
+        args = [request[k] for k in ("crop", "season", "state", "area", "rainfall", "fertilizer", "pesticide")]
+    except KeyError as e:
+        raise _HTTPError(400, f"Missing field: {e.args[0]}")
+    surface = predict_yield_grid(*args)
+    if isinstance(surface, str):
+        raise _HTTPError(503, surface)
+    return {"yield": surface.tolist()}
+
+
+def _disease(body):
+    from utils.disease_detector import _check_artifact, predict_disease_async
+
+    _check_artifact()
+    if not body:
+        raise _HTTPError(400, "Expected image bytes")
+    try:
+        future = predict_disease_async(io.BytesIO(body))
+    except (OSError, ValueError) as e:
+        raise _HTTPError(400, f"Unreadable image: {e}")
+    label, confidence = future.result()
+    return {"label": label, "confidence": confidence}
+
+
+def _disease_probabilities(body):
+    from utils.disease_detector import IMAGE_SIZE, _check_artifact, predict_probabilities
+
+    _check_artifact()
+    try:
+        pixels = np.load(io.BytesIO(body), allow_pickle=False)
+    except ValueError as e:
+        raise _HTTPError(400, f"Expected a .npy array: {e}")
+    if pixels.dtype != np.uint8 or pixels.ndim != 4 or pixels.shape[1:] != (*IMAGE_SIZE, 3) or not len(pixels):
+        raise _HTTPError(400, f"Expected uint8 pixels shaped (n, {IMAGE_SIZE[0]}, {IMAGE_SIZE[1]}, 3)")
+    batch = np.multiply(pixels, np.float32(1 / 255), dtype=np.float32)
+    return {"probabilities": predict_probabilities(batch).tolist()}
+
+
+def _yield_info():
+    # The artifact version of the yield model this server runs; clients key
+    # their result caches on it
+    from utils.prediction_log import version_tag
+    from utils.yield_predictor import _check_artifact, artifact_fingerprint
+
+    _check_artifact()
+    return {"version": version_tag(artifact_fingerprint())}
+
+
+def _disease_info():
+    # The labels and artifact version of the model this server runs, so
+    # clients label and version results by it rather than by local files.
+    # A replaced artifact is picked up here, as on the predict routes, so
+    # the version always matches the model that answers.
+    from utils.disease_detector import _check_artifact, artifact_fingerprint, get_class_dict
+    from utils.prediction_log import version_tag
+
+    _check_artifact()
+    return {"classes": get_class_dict(), "version": version_tag(artifact_fingerprint())}
+
+
+ROUTES = {
+    "/v1/yield": _yield,
+    "/v1/yield/grid": _yield_grid,
+    "/v1/disease": _disease,
+    "/v1/disease/probabilities": _disease_probabilities,
+}
+
+INFO_ROUTES = {
+    "/v1/yield/info": _yield_info,
+    "/v1/disease/info": _disease_info,
+}
+
+
+def listen(port=None, host="127.0.0.1", unix_path=None, backlog=128):
+    if unix_path:
+        if os.path.exists(unix_path):
+            os.unlink(unix_path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(unix_path)
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((host, port or 0))
+    sock.listen(backlog)
+    return sock
+
+
+def _preload(names):
+    # Loads (and warms) models in the parent, before any fork
+    from utils import disease_detector, yield_predictor  # noqa: F401 (registers the models)
+
+    for name in names:
+        try:
+            model_registry.get_model(name)
+        except Exception:
+            logger.exception("Could not preload model '%s'; workers will retry", name)
+
+
+def _run_worker(sock, max_concurrency):
+    # Each worker is its own ThreadingHTTPServer on the inherited socket;
+    # the kernel hands every accept to one of them
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    server = ThreadingHTTPServer(sock.getsockname() if sock.family == socket.AF_INET else ("", 0),
+                                 _Handler, bind_and_activate=False)
+    server.socket.close()
+    server.socket = sock
+    server.daemon_threads = True
+    server.slots = threading.BoundedSemaphore(max_concurrency)
+    # Models not preloaded are loaded now rather than on a user's request
+    model_registry.start_background_warmup()
+    server.serve_forever()
+
+
+def serve(sock, workers=DEFAULT_WORKERS, max_concurrency=DEFAULT_MAX_CONCURRENCY, preload=PRELOAD_BEFORE_FORK):
+    # Forks the workers and replaces any that die; blocks until SIGTERM or
+    # SIGINT, then stops the workers and closes the socket
+    inference_client.configure(None)  # the server itself always runs the models
+    _preload(preload)
+    children = set()
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _run_worker(sock, max_concurrency)
+            finally:
+                os._exit(0)
+        children.add(pid)
+
+    stopping = threading.Event()
+
+    def stop(*_):
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        spawn()
+    logger.info("Inference server on %s with %d workers", sock.getsockname(), workers)
+
+    while not stopping.is_set():
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            pid = 0
+        if pid and pid in children:
+            children.discard(pid)
+            logger.warning("Worker %d exited (status %d); restarting", pid, status)
+            spawn()
+        time.sleep(0.2)
+
+    for pid in children:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    for pid in children:
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
+    path = sock.getsockname() if sock.family == socket.AF_UNIX else None
+    sock.close()
+    if path:
+        os.unlink(path)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--unix", help="listen on this Unix socket path instead of TCP")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--max-concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY,
+                        help="in-flight requests per worker before answering 503")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(process)d %(levelname)s %(message)s")
+    sock = listen(args.port, args.host, args.unix)
+    serve(sock, args.workers, args.max_concurrency)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import time
+
+import numpy as np
+
+from utils import metrics
+from utils.yield_predictor import predict_yield_grid
+
+DEFAULT_STEPS = 100
+# The fine grid laid over the winning coarse cell and its neighbours
+REFINE_STEPS = 21
+
+
+def _grid(fertilizer_range, pesticide_range, steps):
+    fertilizer = np.linspace(*fertilizer_range, steps)
+    pesticide = np.linspace(*pesticide_range, steps)
+    # Rows are pesticide levels and columns fertilizer levels, the layout
+    # predict_yield_grid returns and a heatmap with fertilizer on x expects
+    return fertilizer, pesticide, *np.meshgrid(fertilizer, pesticide)
+
+
+def _cheapest(yields, cost, target):
+    # Flat index of the cheapest plan reaching target (ties go to the
+    # higher yield), or None when no plan does
+    feasible = yields >= target
+    if not feasible.any():
+        return None
+    cost = np.where(feasible, cost, np.inf)
+    candidates = np.flatnonzero(cost == cost.min())
+    return candidates[np.argmax(yields.ravel()[candidates])]
+
+
+def _plan(fertilizer, pesticide, yields, cost, index):
+    return {
+        "fertilizer": float(fertilizer.flat[index]),
+        "pesticide": float(pesticide.flat[index]),
+        "yield": float(yields.flat[index]),
+        "cost": float(cost.flat[index]),
+    }
+
+
+def optimize(crop, season, state, area, rainfall, fertilizer_range, pesticide_range,
+             target=None, fertilizer_price=0.0, pesticide_price=0.0, steps=DEFAULT_STEPS, refine=True):
+    # Scores a steps x steps grid of fertilizer x pesticide amounts (kg, as
+    # in the training data) in one batched model call. Returns the yield
+    # surface, the highest-yield plan and, for a target yield, the cheapest
+    # plan that reaches it. With refine, the winning coarse cell's
+    # neighbourhood is searched again on a finer grid. Returns the model's
+    # error string if it is not loaded.
+    started = time.perf_counter()
+    with metrics.timer("optimizer.total"):
+        fertilizer, pesticide, F, P = _grid(fertilizer_range, pesticide_range, steps)
+        yields = predict_yield_grid(crop, season, state, area, rainfall, fertilizer, pesticide)
+        if isinstance(yields, str):
+            return yields
+        cost = fertilizer_price * F + pesticide_price * P
+        evaluated = yields.size
+
+        result = {
+            "fertilizer": fertilizer,
+            "pesticide": pesticide,
+            "yield": yields,
+            "best": _plan(F, P, yields, cost, int(np.argmax(yields))),
+            "plan": None,
+        }
+        if target is not None:
+            index = _cheapest(yields, cost, target)
+            if index is not None:
+                result["plan"] = _plan(F, P, yields, cost, index)
+                if refine and steps > 1:
+                    row, col = np.unravel_index(index, F.shape)
+                    fine_f = (fertilizer[max(col - 1, 0)], fertilizer[min(col + 1, steps - 1)])
+                    fine_p = (pesticide[max(row - 1, 0)], pesticide[min(row + 1, steps - 1)])
+                    fine_fertilizer, fine_pesticide, fF, fP = _grid(fine_f, fine_p, REFINE_STEPS)
+                    fine_yields = predict_yield_grid(crop, season, state, area, rainfall, fine_fertilizer, fine_pesticide)
+                    # On an error string the coarse plan stands
+                    if not isinstance(fine_yields, str):
+                        fine_cost = fertilizer_price * fF + pesticide_price * fP
+                        evaluated += fine_yields.size
+                        fine_index = _cheapest(fine_yields, fine_cost, target)
+                        if fine_index is not None and fine_cost.flat[fine_index] < result["plan"]["cost"]:
+                            result["plan"] = _plan(fF, fP, fine_yields, fine_cost, fine_index)
+
+    metrics.increment("optimizer.plans", evaluated)
+    result["evaluated"] = evaluated
+    result["seconds"] = time.perf_counter() - started
+    return result
@@ -0,0 +1,142 @@
+import io
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils import disease_detector, disease_eval, inference_client, model_registry, prediction_log, yield_predictor
+
+# Work run by utils.jobs in a worker process. Each task is task(job,
+# progress): job has "username", "params" and the raw "payload" bytes,
+# progress(fraction, message) reports back to the UI, and the return
+# value is pickled as the job's result.
+
+YIELD_CHUNK_SIZE = 10000
+DISEASE_BATCH_SIZE = 16
+
+
+def yield_batch(job, progress):
+    # payload: the uploaded CSV
+    data = job["payload"]
+    started = time.perf_counter()
+    if inference_client.client is None and yield_predictor.load_yield_model() is None:
+        raise RuntimeError("Model not loaded.")
+
+    total = max(1, data.count(b"\n") - 1)
+    chunks, done = [], 0
+    chunk_size = job["params"].get("chunk_size", YIELD_CHUNK_SIZE)
+    for chunk in yield_predictor.iter_predict_yield_batch(io.BytesIO(data), chunk_size):
+        chunks.append(chunk)
+        done += len(chunk)
+        progress(done / total, f"{done:,} rows scored")
+    results = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+
+    prediction_log.record(job["username"], "yield_batch", {"file": job["params"].get("file"), "rows": len(results)},
+                          f"{len(results):,} rows", results["Predicted_Yield"].mean() if len(results) else None,
+                          yield_predictor.artifact_fingerprint(), (time.perf_counter() - started) * 1000)
+    return results
+
+
+def disease_screen(job, progress):
+    # payload: pickled list of (file name, image bytes)
+    images = pickle.loads(job["payload"])
+    if inference_client.client is not None:
+        return _disease_screen_remote(job, images, progress)
+    batch_size = job["params"].get("batch_size", DISEASE_BATCH_SIZE)
+    class_dict = disease_detector.get_class_dict()
+    version = disease_detector.artifact_fingerprint()
+    buffer = np.empty((batch_size, *disease_detector.IMAGE_SIZE, 3), dtype=np.float32)
+    rows = []
+    for start in range(0, len(images), batch_size):
+        started = time.perf_counter()
+        chunk = images[start:start + batch_size]
+        readable = []
+        for name, data in chunk:
+            try:
+                disease_detector.preprocess_image(io.BytesIO(data), buffer[len(readable)])
+                readable.append(name)
+            except Exception:
+                rows.append({"File": name, "Label": "Unreadable image", "Confidence": None})
+        if readable:
+            probabilities = disease_detector.predict_probabilities(buffer[:len(readable)])
+            latency_ms = (time.perf_counter() - started) * 1000 / len(readable)
+            for name, p in zip(readable, probabilities):
+                index = int(np.argmax(p))
+                label, confidence = class_dict[str(index)], float(p[index]) * 100
+                rows.append({"File": name, "Label": label, "Confidence": confidence})
+                prediction_log.record(job["username"], "disease", {"file": name}, label, confidence, version, latency_ms)
+        done = min(start + batch_size, len(images))
+        progress(done / len(images), f"{done} of {len(images)} images")
+    return pd.DataFrame(rows, columns=["File", "Label", "Confidence"])
+
+
+def _disease_screen_remote(job, images, progress):
+    # Client mode: one request per image; the server batches across requests
+    rows = []
+    for done, (name, data) in enumerate(images, 1):
+        started = time.perf_counter()
+        try:
+            label, confidence = inference_client.client.predict_disease(io.BytesIO(data))
+        except inference_client.InferenceError as e:
+            if e.status != 400:
+                raise
+            label, confidence = "Unreadable image", None
+        if confidence is not None:
+            prediction_log.record(job["username"], "disease", {"file": name}, label, confidence,
+                                  inference_client.client.url, (time.perf_counter() - started) * 1000)
+        rows.append({"File": name, "Label": label, "Confidence": confidence})
+        progress(done / len(images), f"{done} of {len(images)} images")
+    return pd.DataFrame(rows, columns=["File", "Label", "Confidence"])
+
+
+def disease_evaluation(job, progress):
+    # params: "directory" of class subfolders; the result is the
+    # utils.disease_eval report
+    params = job["params"]
+    return disease_eval.evaluate(params["directory"], params.get("batch_size", disease_eval.BATCH_SIZE), progress)
+
+
+def model_diagnostics(job, progress):
+    # Loads every registered model, then runs the yield model on one input.
+    # The disease model's accuracy is checked by disease_evaluation.
+    rows = []
+    names = list(model_registry.model_status())
+    steps = len(names) + 1
+
+    def check(name, fn):
+        started = time.perf_counter()
+        try:
+            result, ok = fn()
+        except Exception as e:
+            result, ok = f"{type(e).__name__}: {e}", False
+        rows.append({"Check": name, "Result": result, "OK": ok, "Seconds": round(time.perf_counter() - started, 3)})
+        progress(len(rows) / steps, name)
+
+    def load(name):
+        if inference_client.client is not None:
+            # The inference server's copy; nothing is loaded here
+            info = inference_client.client.health()["models"][name]
+            if info["loaded"]:
+                return f"Served by {inference_client.client.url}", True
+            return info["error"] or "Not loaded on the server yet", False
+        return type(model_registry.get_model(name)).__name__, True
+
+    for name in names:
+        check(f"Load {name} model", lambda name=name: load(name))
+
+    def predict():
+        prediction = yield_predictor.predict_yield("Rice", "Kharif", "Punjab", 1.0, 1000, 50.0, 5.0)
+        if isinstance(prediction, str):
+            return prediction, False
+        return f"{prediction:.2f} t/ha", True
+    check("Yield: Rice / Kharif / Punjab", predict)
+    return rows
+
+
+TASKS = {
+    "yield_batch": yield_batch,
+    "disease_screen": disease_screen,
+    "model_diagnostics": model_diagnostics,
+    "disease_evaluation": disease_evaluation,
+}
@@ -0,0 +1,202 @@
+import json
+import logging
+import multiprocessing
+import os
+import pickle
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+STATES = ("queued", "running", "done", "failed", "cancelled")
+JOB_COLUMNS = ("id", "username", "kind", "state", "progress", "message", "error", "created_at", "started_at", "finished_at")
+# Workers write progress at most this often; the UI polls the same row
+PROGRESS_INTERVAL_SECONDS = 0.5
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Progress:
+    # Passed to every task as progress(fraction, message). Writes are
+    # throttled; a write that finds the job no longer running (cancelled
+    # from the UI) raises JobCancelled inside the task.
+
+    def __init__(self, db, job_id, interval=PROGRESS_INTERVAL_SECONDS):
+        self.db = db
+        self.job_id = job_id
+        self.interval = interval
+        self.message = None
+        self._last = 0.0
+
+    def __call__(self, fraction, message=None):
+        if message is not None:
+            self.message = message
+        now = time.monotonic()
+        if now - self._last < self.interval:
+            return
+        self._last = now
+        fraction = min(max(float(fraction), 0.0), 1.0)
+        if not self.db.execute("job_progress", (fraction, self.message, self.job_id)):
+            raise JobCancelled(self.job_id)
+
+
+# Worker processes: one Database per process, opened by the pool initializer
+_worker_db = None
+
+
+def _init_worker(db_path):
+    global _worker_db
+    from utils import prediction_log
+    from utils.db import Database
+
+    _worker_db = Database(db_path, pool_size=2)
+    prediction_log.log.db = _worker_db
+
+
+def _execute(job_id, task):
+    # Runs in a worker process. The claim is a conditional UPDATE, so a job
+    # cancelled (or picked up elsewhere) while queued is skipped.
+    from utils import prediction_log
+
+    db = _worker_db
+    if not db.execute("claim_job", (time.time(), job_id)):
+        return
+    username, kind, params, payload = db.fetch_one("load_job", (job_id,))
+    progress = Progress(db, job_id)
+    job = {"id": job_id, "username": username, "kind": kind, "params": json.loads(params or "{}"), "payload": payload}
+    try:
+        with metrics.timer(f"job.{kind}"):
+            result = task(job, progress)
+        db.execute("finish_job", (progress.message, pickle.dumps(result, pickle.HIGHEST_PROTOCOL), time.time(), job_id))
+    except JobCancelled:
+        logger.info("Job %s cancelled", job_id)
+    except Exception as e:
+        logger.exception("Job %s (%s) failed", job_id, kind)
+        db.execute("fail_job", (f"{type(e).__name__}: {e}", time.time(), job_id))
+    finally:
+        prediction_log.log.flush()
+
+
+def _owner_alive(owner):
+    host, _, pid = (owner or "").rpartition(":")
+    if host != socket.gethostname():
+        # Another host's process; leave its jobs alone
+        return bool(host)
+    try:
+        os.kill(int(pid), 0)
+    except (ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobQueue:
+    # Long-running work (bulk scoring, multi-image screening, diagnostics)
+    # off the Streamlit script thread. Jobs live in the jobs table: params
+    # and input payload go in when queued, progress is updated by the
+    # worker, and the pickled result is stored when it finishes, so a job
+    # outlives the session that started it. Tasks run on a spawn-context
+    # process pool (TensorFlow is not fork-safe); tasks maps a job kind to
+    # a module-level function task(job, progress).
+
+    def __init__(self, db, tasks, workers=None):
+        self.db = db
+        self.tasks = dict(tasks)
+        self.workers = max(1, int(workers or default_workers()))
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(os.path.abspath(self.db.path),),
+                )
+            return self._pool
+
+    def _dispatch(self, job_id, kind):
+        future = self._executor().submit(_execute, job_id, self.tasks[kind])
+        future.add_done_callback(partial(self._done, job_id))
+
+    def _done(self, job_id, future):
+        # Task errors are recorded by the worker; this only sees a worker
+        # process that died (e.g. killed for memory)
+        if future.cancelled() or future.exception() is None:
+            return
+        error = future.exception()
+        logger.error("Worker for job %s died: %s", job_id, error)
+        self.db.execute("fail_job", (f"Worker crashed: {error}", time.time(), job_id))
+        if isinstance(error, BrokenProcessPool):
+            with self._lock:
+                self._pool = None
+
+    def submit(self, username, kind, params=None, payload=None):
+        if kind not in self.tasks:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job_id = uuid.uuid4().hex
+        self.db.execute("insert_job", (job_id, username, kind, json.dumps(params or {}, sort_keys=True), payload, self.owner, time.time()))
+        self._dispatch(job_id, kind)
+        metrics.increment("jobs.submitted")
+        return job_id
+
+    def recover(self):
+        # Re-queues unfinished jobs whose app process is gone, including
+        # ones that were mid-run when it stopped; returns how many
+        adopted = 0
+        for job_id, owner in self.db.fetch_all("unfinished_jobs"):
+            if owner == self.owner or _owner_alive(owner):
+                continue
+            if self.db.execute("adopt_job", (self.owner, job_id, owner)):
+                kind = self.get(job_id)["kind"]
+                if kind in self.tasks:
+                    self._dispatch(job_id, kind)
+                    adopted += 1
+                else:
+                    self.db.execute("fail_job", (f"Unknown job kind: {kind}", time.time(), job_id))
+        if adopted:
+            logger.info("Recovered %d unfinished jobs", adopted)
+        return adopted
+
+    def get(self, job_id):
+        row = self.db.fetch_one("get_job", (job_id,))
+        return dict(zip(JOB_COLUMNS, row)) if row else None
+
+    def jobs(self, username, limit=20):
+        return [dict(zip(JOB_COLUMNS, row)) for row in self.db.fetch_all("user_jobs", (username, limit))]
+
+    def find_done(self, kind, params):
+        # The latest finished job of kind run with exactly these params, by
+        # any user; lets deterministic jobs reuse an earlier result
+        row = self.db.fetch_one("latest_done_job", (kind, json.dumps(params, sort_keys=True)))
+        return self.get(row[0]) if row else None
+
+    def result(self, job_id):
+        row = self.db.fetch_one("job_result", (job_id,))
+        return pickle.loads(row[0]) if row and row[0] is not None else None
+
+    def cancel(self, job_id):
+        return bool(self.db.execute("cancel_job", (time.time(), job_id)))
+
+    def shutdown(self, wait=False):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=wait, cancel_futures=True)
+                self._pool = None
@@ -0,0 +1,115 @@
+import threading
+import time
+import logging
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Process-wide registry: every Streamlit session shares the same loaded models
+_loaders = {}
+_models = {}
+_locks = {}
+_status = {}
+_registry_lock = threading.Lock()
+
+
+def register(name, loader, warmup=None):
+    with _registry_lock:
+        _loaders[name] = (loader, warmup)
+        _locks.setdefault(name, threading.Lock())
+        _status.setdefault(name, {
+            "loaded": False,
+            "loading": False,
+            "warm": False,
+            "load_seconds": None,
+            "warmup_seconds": None,
+            "loaded_at": None,
+            "error": None,
+        })
+
+
+def get_model(name):
+    model = _models.get(name)
+    if model is not None:
+        return model
+
+    loader, warmup = _loaders[name]
+    with _locks[name]:
+        # Another thread may have finished loading while we waited
+        model = _models.get(name)
+        if model is not None:
+            return model
+
+        status = _status[name]
+        status["loading"] = True
+        try:
+            start = time.perf_counter()
+            model = loader()
+            status["load_seconds"] = time.perf_counter() - start
+            metrics.observe(f"model.{name}.load", status["load_seconds"])
+            status["loaded"] = True
+            status["loaded_at"] = time.time()
+            status["error"] = None
+
+            if warmup is not None:
+                start = time.perf_counter()
+                warmup(model)
+                status["warmup_seconds"] = time.perf_counter() - start
+                metrics.observe(f"model.{name}.warmup", status["warmup_seconds"])
+            status["warm"] = True
+        except Exception as e:
+            status["error"] = str(e)
+            logger.exception("Failed to load model '%s'", name)
+            raise
+        finally:
+            status["loading"] = False
+
+        _models[name] = model
+        logger.info("Model '%s' ready in %.2fs", name, status["load_seconds"])
+        return model
+
+
+def set_model(name, model):
+    # Install an already-built model (e.g. a stand-in for offline benchmarks)
+    with _locks[name]:
+        _models[name] = model
+        _status[name].update(loaded=True, warm=True, loaded_at=time.time(), error=None)
+
+
+def is_loaded(name):
+    return name in _models
+
+
+def unload(name):
+    with _locks[name]:
+        _models.pop(name, None)
+        _status[name].update(loaded=False, warm=False)
+
+
+def model_status():
+    return {name: dict(status) for name, status in _status.items()}
+
+
+def start_background_warmup(names=None):
+    # Load models off the script thread so the first page renders immediately
+    names = list(names or _loaders)
+
+    def _warm_all():
+        for name in names:
+            try:
+                get_model(name)
+            except Exception:
+                pass  # already recorded in status
+
+    thread = threading.Thread(target=_warm_all, name="model-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def warmup_state():
+    if any(s["loading"] or not (s["loaded"] or s["error"]) for s in _status.values()):
+        return "warming"
+    if any(s["error"] for s in _status.values()):
+        return "failed"
+    return "ready"
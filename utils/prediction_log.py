@@ -0,0 +1,160 @@
+import atexit
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def version_tag(fingerprint):
+    # Short stable label for a model's artifact fingerprint
+    if fingerprint is None:
+        return None
+    return hashlib.blake2b(repr(fingerprint).encode(), digest_size=6).hexdigest()
+
+
+class PredictionLog:
+    # Every prediction a user makes, written to SQLite in the background.
+    # record() only appends to an in-memory buffer; a flusher thread drains
+    # it into one executemany transaction every flush_interval seconds (or
+    # sooner once batch_size rows are waiting). If the database falls
+    # behind, rows beyond max_buffer are dropped rather than blocking users.
+
+    def __init__(self, flush_interval=1.0, batch_size=500, max_buffer=10000):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_buffer = max_buffer
+        self.db = None
+        self._buffer = deque()
+        self._wake = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.stats = {"recorded": 0, "written": 0, "flushes": 0, "dropped": 0, "failed_flushes": 0}
+
+    def configure(self, db=None, flush_interval=None, batch_size=None, max_buffer=None):
+        if db is not None:
+            self.db = db
+        if flush_interval is not None:
+            self.flush_interval = max(0.01, float(flush_interval))
+        if batch_size is not None:
+            self.batch_size = max(1, int(batch_size))
+        if max_buffer is not None:
+            self.max_buffer = max(1, int(max_buffer))
+        self._ensure_started()
+
+    def record(self, username, kind, inputs, output, value=None, model_version=None, latency_ms=None):
+        # Serialization happens on the flusher thread, not the caller's
+        if len(self._buffer) >= self.max_buffer:
+            self.stats["dropped"] += 1
+            return
+        self._buffer.append((username, kind, inputs, output, value, model_version, latency_ms, time.time()))
+        self.stats["recorded"] += 1
+        if len(self._buffer) >= self.batch_size:
+            self._wake.set()
+
+    def pending(self):
+        return len(self._buffer)
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="prediction-log", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Prediction log flush failed")
+
+    @staticmethod
+    def _row(entry):
+        username, kind, inputs, output, value, model_version, latency_ms, created_at = entry
+        return (
+            username,
+            kind,
+            json.dumps(inputs, default=str),
+            output,
+            None if value is None else float(value),
+            version_tag(model_version),
+            latency_ms,
+            created_at,
+        )
+
+    def flush(self):
+        # Writes everything buffered so far; returns the number of rows
+        if self.db is None or not self._buffer:
+            return 0
+        with self._flush_lock:
+            entries = []
+            while self._buffer:
+                entries.append(self._buffer.popleft())
+            if not entries:
+                return 0
+            try:
+                with metrics.timer("prediction_log.flush"):
+                    self.db.executemany("insert_prediction", [self._row(e) for e in entries])
+            except Exception:
+                self.stats["failed_flushes"] += 1
+                # Put the rows back for the next attempt, as far as they fit
+                room = max(0, self.max_buffer - len(self._buffer))
+                self._buffer.extendleft(reversed(entries[-room:] if room else []))
+                self.stats["dropped"] += len(entries) - min(room, len(entries))
+                raise
+            self.stats["written"] += len(entries)
+            self.stats["flushes"] += 1
+            return len(entries)
+
+    def _flush_for(self, username):
+        # Reads see the user's own latest predictions without waiting for
+        # the next background flush
+        if any(entry[0] == username for entry in list(self._buffer)):
+            self.flush()
+
+    def recent(self, username, limit=10):
+        self._flush_for(username)
+        rows = self.db.fetch_all("recent_predictions", (username, limit))
+        return [
+            {"kind": kind, "output": output, "value": value, "created_at": created_at}
+            for kind, output, value, created_at in rows
+        ]
+
+    def summary(self, username, since=0.0):
+        # {kind: {"count", "avg_value", "last_at"}} for one user
+        self._flush_for(username)
+        rows = self.db.fetch_all("prediction_summary", (username, since))
+        return {
+            kind: {"count": count, "avg_value": avg_value, "last_at": last_at}
+            for kind, count, avg_value, last_at in rows
+        }
+
+
+log = PredictionLog()
+
+
+@atexit.register
+def _flush_at_exit():
+    # The flusher is a daemon thread; write out what is left before exit
+    try:
+        log.flush()
+    except Exception as e:
+        logger.warning("Could not flush prediction log at exit: %s", e)
+
+
+def configure(db=None, flush_interval=None, batch_size=None, max_buffer=None):
+    log.configure(db, flush_interval, batch_size, max_buffer)
+
+
+def record(username, kind, inputs, output, value=None, model_version=None, latency_ms=None):
+    log.record(username, kind, inputs, output, value, model_version, latency_ms)
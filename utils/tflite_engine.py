@@ -0,0 +1,91 @@
+import threading
+
+import numpy as np
+
+# TFLite path for the disease CNN. tflite_runtime is a few MB and enough for
+# inference; full TensorFlow is only needed to convert the .h5.
+
+QUANTIZATIONS = ("float16", "dynamic", "int8")
+
+
+def _interpreter_class():
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        # tensorflow.lite is a lazily loaded module: the attribute works where
+        # "from tensorflow.lite import Interpreter" does not
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+def convert(h5_path, out_path, quantization="float16", representative_batches=None):
+    # representative_batches: iterable of float32 (n, 224, 224, 3) arrays,
+    # required for full int8 calibration
+    import tensorflow as tf
+
+    model = tf.keras.models.load_model(h5_path)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    if quantization == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == "int8":
+        if representative_batches is None:
+            raise ValueError("int8 quantization needs representative images")
+
+        def representative_dataset():
+            for batch in representative_batches:
+                for image in batch:
+                    yield [image[np.newaxis].astype(np.float32)]
+
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.uint8
+        converter.inference_output_type = tf.uint8
+    elif quantization != "dynamic":
+        raise ValueError(f"Unknown quantization {quantization!r}; expected one of {QUANTIZATIONS}")
+
+    with open(out_path, "wb") as f:
+        f.write(converter.convert())
+    return out_path
+
+
+class TFLiteEngine:
+    # Mirrors the bit of the Keras API the detector uses: predict(batch)
+
+    def __init__(self, path, num_threads=None):
+        self.interpreter = _interpreter_class()(model_path=path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self._batch_size = self.input["shape"][0]
+        # The interpreter is not thread-safe
+        self._lock = threading.Lock()
+
+    def _resize(self, batch_size):
+        if batch_size != self._batch_size:
+            shape = [batch_size, *self.input["shape"][1:]]
+            self.interpreter.resize_tensor_input(self.input["index"], shape)
+            self.interpreter.allocate_tensors()
+            self.input = self.interpreter.get_input_details()[0]
+            self.output = self.interpreter.get_output_details()[0]
+            self._batch_size = batch_size
+
+    def predict(self, batch, verbose=0):
+        batch = np.asarray(batch, dtype=np.float32)
+        with self._lock:
+            self._resize(batch.shape[0])
+
+            # Fully quantized models take uint8 and need scale/zero-point
+            scale, zero_point = self.input["quantization"]
+            if self.input["dtype"] != np.float32 and scale:
+                batch = np.clip(np.round(batch / scale + zero_point), 0, 255)
+            self.interpreter.set_tensor(self.input["index"], batch.astype(self.input["dtype"]))
+            self.interpreter.invoke()
+            output = self.interpreter.get_tensor(self.output["index"])
+
+            scale, zero_point = self.output["quantization"]
+            if self.output["dtype"] != np.float32 and scale:
+                output = (output.astype(np.float32) - zero_point) * scale
+            return output.astype(np.float32)
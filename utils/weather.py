@@ -0,0 +1,270 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+API_KEY = os.environ.get("OPENWEATHER_API_KEY")
+PROVIDER = os.environ.get("AGRO_WEATHER_PROVIDER", "openweathermap" if API_KEY else "mock")
+BASE_URL = os.environ.get("AGRO_WEATHER_URL", "https://api.openweathermap.org")
+
+
+class WeatherNotFound(Exception):
+    pass
+
+
+def normalize_location(location):
+    # "  pune ", "Pune" and "PUNE" share one cache entry
+    return " ".join(str(location).split()).casefold()
+
+
+class MockProvider:
+    # Random values in plausible ranges; the default when no API key is set
+
+    name = "mock"
+    needs_session = False
+
+    async def fetch(self, session, location):
+        return {
+            "temp": round(random.uniform(15, 35), 1),
+            "humidity": random.randint(40, 90),
+            "wind_speed": round(random.uniform(1.0, 10.0), 1),
+            "description": random.choice(["Clear Sky", "Partly Cloudy", "Cloudy", "Light Rain"]),
+            "city": location,
+            "country": "IN",
+        }
+
+
+class OpenWeatherMapProvider:
+    # Current conditions from the OpenWeatherMap API (or anything serving the
+    # same format, such as benchmarks/weather_stand_in.py)
+
+    name = "openweathermap"
+    needs_session = True
+
+    def __init__(self, api_key=None, base_url=BASE_URL):
+        self.api_key = api_key or API_KEY
+        self.url = base_url.rstrip("/") + "/data/2.5/weather"
+
+    async def fetch(self, session, location):
+        params = {"q": location, "units": "metric", "appid": self.api_key or ""}
+        async with session.get(self.url, params=params) as response:
+            if response.status == 404:
+                raise WeatherNotFound(location)
+            response.raise_for_status()
+            data = await response.json()
+        return {
+            "temp": round(float(data["main"]["temp"]), 1),
+            "humidity": int(data["main"]["humidity"]),
+            "wind_speed": round(float(data["wind"]["speed"]), 1),
+            "description": data["weather"][0]["description"].title(),
+            "city": data.get("name", location),
+            "country": data.get("sys", {}).get("country", ""),
+        }
+
+
+PROVIDERS = {
+    MockProvider.name: MockProvider,
+    OpenWeatherMapProvider.name: OpenWeatherMapProvider,
+}
+
+
+def register_provider(name, factory):
+    PROVIDERS[name] = factory
+
+
+def create_provider(name=None, **kwargs):
+    name = name or PROVIDER
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown weather provider {name!r}; choose from {', '.join(PROVIDERS)}")
+    return PROVIDERS[name](**kwargs)
+
+
+class WeatherService:
+    # Stale-while-revalidate cache in front of a provider. Lookups never wait
+    # on the network unless asked to: a fresh entry is returned as is, a
+    # stale one is returned while a refresh runs in the background, and a
+    # miss starts a fetch. Fetches run on one asyncio loop in a daemon thread
+    # sharing a pooled aiohttp session, and concurrent requests for the same
+    # location share one fetch.
+
+    def __init__(self, provider, fresh_ttl=600, stale_ttl=6 * 3600, failure_ttl=60,
+                 max_connections=20, timeout=10.0, max_entries=10000):
+        self.provider = provider
+        self.fresh_ttl = fresh_ttl
+        self.stale_ttl = stale_ttl
+        self.failure_ttl = failure_ttl
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._loop = None
+        self._session = None
+        self._start_lock = threading.Lock()
+        self.stats = {"fresh": 0, "stale": 0, "misses": 0, "fetches": 0, "errors": 0}
+
+    def configure(self, provider=None, fresh_ttl=None, stale_ttl=None, max_connections=None, timeout=None):
+        with self._lock:
+            if provider is not None and provider is not self.provider:
+                self.provider = provider
+                self._cache.clear()
+            if fresh_ttl is not None:
+                self.fresh_ttl = fresh_ttl
+            if stale_ttl is not None:
+                self.stale_ttl = stale_ttl
+        if max_connections is not None:
+            self.max_connections = max_connections
+        if timeout is not None:
+            self.timeout = timeout
+
+    def _ensure_started(self):
+        if self._loop is not None:
+            return self._loop
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="weather-client", daemon=True).start()
+                self._loop = loop
+        return self._loop
+
+    async def _get_session(self):
+        # Created on the loop's own thread; aiohttp is only needed for real providers
+        if self._session is None:
+            import aiohttp
+            connector = aiohttp.TCPConnector(limit=self.max_connections, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(connector=connector,
+                                                  timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._session
+
+    async def _fetch(self, key, location):
+        self.stats["fetches"] += 1
+        try:
+            session = await self._get_session() if self.provider.needs_session else None
+            with metrics.timer("weather.fetch"):
+                value = await self.provider.fetch(session, location)
+        except WeatherNotFound:
+            value = None
+        except Exception as e:
+            self.stats["errors"] += 1
+            metrics.increment("weather.errors")
+            logger.warning("Weather fetch for %r failed: %s", location, e)
+            with self._lock:
+                self._inflight.pop(key, None)
+                entry = self._cache.get(key)
+                if entry is None or entry[0] is None:
+                    # Remember the failure briefly so a dead provider is not hammered
+                    self._store(key, None, time.monotonic() - self.fresh_ttl + self.failure_ttl)
+            return None
+        with self._lock:
+            self._inflight.pop(key, None)
+            self._store(key, value, time.monotonic())
+        return value
+
+    def _store(self, key, value, fetched_at):
+        self._cache[key] = (value, fetched_at)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def refresh(self, location):
+        # Starts (or joins) a background fetch; returns a concurrent Future
+        key = normalize_location(location)
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future
+            future = asyncio.run_coroutine_threadsafe(self._fetch(key, str(location).strip()), self._ensure_started())
+            self._inflight[key] = future
+        return future
+
+    def lookup(self, location):
+        # (value, age_seconds) from the cache only; (None, None) on a miss
+        key = normalize_location(location)
+        with self._lock:
+            entry = self._cache.get(key)
+        if entry is None:
+            return None, None
+        return entry[0], time.monotonic() - entry[1]
+
+    def get(self, location, wait=0.0):
+        if not normalize_location(location):
+            return None
+        value, age = self.lookup(location)
+        if age is not None and age < self.fresh_ttl:
+            self.stats["fresh"] += 1
+            return value
+        if age is not None and age < self.stale_ttl:
+            self.stats["stale"] += 1
+            metrics.increment("weather.stale_served")
+            self.refresh(location)
+            return value
+
+        self.stats["misses"] += 1
+        future = self.refresh(location)
+        if wait:
+            try:
+                return future.result(timeout=wait)
+            except Exception:
+                return None
+        return None
+
+    def prefetch(self, locations):
+        # Fetches every distinct location concurrently; returns a Future that
+        # resolves to the number of locations requested
+        keys = {}
+        for location in locations:
+            if location and normalize_location(location):
+                keys.setdefault(normalize_location(location), location)
+        futures = [self.refresh(location) for location in keys.values()]
+        done = Future()
+        if not futures:
+            done.set_result(0)
+            return done
+
+        remaining = [len(futures)]
+        lock = threading.Lock()
+
+        def finished(_):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    done.set_result(len(futures))
+
+        for future in futures:
+            future.add_done_callback(finished)
+        return done
+
+    def close(self):
+        if self._loop is None:
+            return
+        if self._session is not None:
+            asyncio.run_coroutine_threadsafe(self._session.close(), self._loop).result(timeout=5)
+            self._session = None
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop = None
+
+
+service = WeatherService(create_provider())
+
+
+def configure(provider=None, **kwargs):
+    if isinstance(provider, str):
+        provider = create_provider(provider)
+    service.configure(provider=provider, **kwargs)
+
+
+def get_weather(location, wait=0.0):
+    return service.get(location, wait)
+
+
+def prefetch(locations):
+    return service.prefetch(locations)
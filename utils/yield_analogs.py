@@ -0,0 +1,152 @@
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+from utils import metrics
+from utils.crop_history import CSV_PATH, DIMENSIONS, HistoryStore, source_fingerprint
+
+logger = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INDEX_PATH = os.environ.get("AGRO_ANALOG_INDEX", os.path.join(ROOT, "data", "crop_yield_analogs.npz"))
+FORMAT_VERSION = 1
+
+FEATURES = ("Area", "Annual_Rainfall", "Fertilizer", "Pesticide")
+# Area and input totals span several orders of magnitude across districts,
+# so they are compared on a log scale
+LOG_FEATURES = ("Area", "Fertilizer", "Pesticide")
+RESULT_COLUMNS = ("Crop_Year",) + FEATURES + ("Yield",)
+# Buckets larger than this get a KD-tree; smaller ones are scanned, which is
+# faster than walking a tree for a few dozen points
+TREE_MIN_SIZE = 256
+
+
+def _scale_raw(values):
+    # values: (n, len(FEATURES)) in FEATURES order
+    scaled = np.array(values, dtype=np.float64, copy=True)
+    for i, name in enumerate(FEATURES):
+        if name in LOG_FEATURES:
+            scaled[:, i] = np.log1p(np.maximum(scaled[:, i], 0))
+    return scaled
+
+
+def build(store=None, csv_path=CSV_PATH, index_path=INDEX_PATH):
+    # Rows are sorted by (crop, season, state) so every bucket is a
+    # contiguous slice; features are standardized over the whole dataset
+    store = store or HistoryStore.load(csv_path)
+    columns = store.columns
+    with metrics.timer("analogs.build"):
+        codes = np.stack([columns[d].astype(np.int64) for d in DIMENSIONS], axis=1)
+        order = np.lexsort(codes.T[::-1])
+        codes = codes[order]
+
+        raw = _scale_raw(np.stack([columns[f] for f in FEATURES], axis=1)[order])
+        mean, std = raw.mean(axis=0), raw.std(axis=0)
+        std[std == 0] = 1.0
+        points = (raw - mean) / std
+
+        starts = np.flatnonzero(np.r_[True, np.any(codes[1:] != codes[:-1], axis=1)])
+        arrays = {
+            "points": points,
+            "mean": mean,
+            "std": std,
+            "bucket_codes": codes[starts],
+            "bucket_starts": starts,
+            "bucket_ends": np.r_[starts[1:], len(codes)],
+            "__meta__": np.array(json.dumps({"source": source_fingerprint(csv_path), "version": FORMAT_VERSION})),
+        }
+        for column in RESULT_COLUMNS:
+            arrays[f"rows:{column}"] = columns[column][order]
+        for dim in DIMENSIONS:
+            arrays[f"{dim}__labels"] = np.asarray(store.labels[dim], dtype=str)
+
+        tmp = index_path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, index_path)
+    logger.info("Built analog index %s (%d rows, %d buckets)", index_path, len(points), len(starts))
+    return index_path
+
+
+class AnalogIndex:
+    # Exact match on crop/season/state, nearest neighbours on the scaled
+    # numeric inputs within that bucket
+
+    def __init__(self, arrays):
+        self.points = arrays["points"]
+        self.mean = arrays["mean"]
+        self.std = arrays["std"]
+        self.rows = {c: arrays[f"rows:{c}"] for c in RESULT_COLUMNS}
+        labels = {d: [str(v) for v in arrays[f"{d}__labels"]] for d in DIMENSIONS}
+        self._buckets = {}
+        self._trees = {}
+        for key, start, end in zip(arrays["bucket_codes"], arrays["bucket_starts"], arrays["bucket_ends"]):
+            bucket = tuple(labels[d][k] for d, k in zip(DIMENSIONS, key))
+            self._buckets[bucket] = (int(start), int(end))
+            if end - start >= TREE_MIN_SIZE:
+                # sklearn is only needed when the dataset has buckets this large
+                from sklearn.neighbors import KDTree
+                self._trees[bucket] = KDTree(self.points[start:end])
+
+    @classmethod
+    def load(cls, csv_path=CSV_PATH, index_path=INDEX_PATH):
+        if os.path.exists(index_path):
+            with np.load(index_path) as data:
+                meta = json.loads(str(data["__meta__"]))
+                if meta == {"source": source_fingerprint(csv_path), "version": FORMAT_VERSION}:
+                    return cls({k: data[k] for k in data.files})
+        build(csv_path=csv_path, index_path=index_path)
+        with np.load(index_path) as data:
+            return cls({k: data[k] for k in data.files})
+
+    def __len__(self):
+        return len(self.points)
+
+    def query(self, crop, season, state, area, rainfall, fertilizer, pesticide, k=5):
+        # Returns a list of dicts (RESULT_COLUMNS plus "distance"), nearest
+        # first; empty when the bucket has no history
+        with metrics.timer("analogs.query"):
+            bucket = (str(crop).strip(), str(season).strip(), str(state).strip())
+            span = self._buckets.get(bucket)
+            if span is None:
+                return []
+            start, end = span
+            target = (_scale_raw([[area, rainfall, fertilizer, pesticide]])[0] - self.mean) / self.std
+            k = min(k, end - start)
+
+            tree = self._trees.get(bucket)
+            if tree is not None:
+                distances, positions = tree.query(target[None, :], k=k)
+                distances, positions = distances[0], positions[0]
+            else:
+                distances = np.sqrt(((self.points[start:end] - target) ** 2).sum(axis=1))
+                positions = np.argpartition(distances, k - 1)[:k] if k < len(distances) else np.arange(len(distances))
+                positions = positions[np.argsort(distances[positions])]
+                distances = distances[positions]
+
+            results = []
+            for position, distance in zip(positions, distances):
+                row = {c: self.rows[c][start + position].item() for c in RESULT_COLUMNS}
+                row["distance"] = float(distance)
+                results.append(row)
+            return results
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = AnalogIndex.load()
+    return _index
+
+
+def find_analogs(crop, season, state, area, rainfall, fertilizer, pesticide, k=5):
+    return get_index().query(crop, season, state, area, rainfall, fertilizer, pesticide, k)
@@ -1,36 +1,274 @@
 import pandas as pd
-import joblib
+import numpy as np
+import json
+import logging
 import os
-import gdown
 
-MODEL_PATH = os.path.join("notebooks", "yield_model.pkl")
+from utils import inference_client, metrics, model_registry
+from utils.artifacts import ARTIFACT_DIR, ensure_artifact
+from utils.forest_engine import ForestEngine
+from utils.result_cache import ResultCache, MISSING
 
-# Download model if not present
-if not os.path.exists(MODEL_PATH):
-    gdown.download("https://drive.google.com/uc?id=1OTkpN5Yhig9DwHRaX5Luyf1_khkeMGQU", MODEL_PATH, quiet=False)
+logger = logging.getLogger(__name__)
 
-model = joblib.load(MODEL_PATH)
+MODEL_PATH = os.path.join(ARTIFACT_DIR, "yield_model.pkl")
+FOREST_PATH = os.path.join(ARTIFACT_DIR, "yield_forest")
+# Written by scripts/train_yield_model.py next to the model it trained
+ENCODERS_PATH = os.path.join(ARTIFACT_DIR, "yield_encoders.json")
+MODEL_NAME = "yield"
+# "auto" uses the exported array engine when it is present and up to date
+YIELD_ENGINE = os.environ.get("AGRO_YIELD_ENGINE", "auto")
 
-crop_map = {
-    "Arecanut": 0, "Arhar/Tur": 1, "Castor seed": 2,
-    "Coconut": 3, "Cotton(lint)": 4, "Rice": 5, "Wheat": 6, "Maize": 7
-}
-season_map = {"Kharif": 0, "Rabi": 1, "Whole Year": 2}
-state_map = {"Assam": 0, "Punjab": 1, "Tamil Nadu": 2, "Maharashtra": 3}
+def _forest_is_current():
+    meta = os.path.join(FOREST_PATH, "meta.json")
+    if not os.path.exists(meta):
+        return False
+    if os.path.exists(MODEL_PATH) and os.path.getmtime(MODEL_PATH) > os.path.getmtime(meta):
+        logger.warning("Exported yield forest is older than %s; falling back to sklearn", MODEL_PATH)
+        return False
+    return True
+
+def artifact_fingerprint():
+    # Changes whenever either model artifact is replaced on disk
+    fingerprint = []
+    for path in (MODEL_PATH, os.path.join(FOREST_PATH, "meta.json"), ENCODERS_PATH):
+        try:
+            stat = os.stat(path)
+            fingerprint.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            fingerprint.append(None)
+    return tuple(fingerprint)
+
+_loaded_fingerprint = None
+
+def _load():
+    global _loaded_fingerprint, _encoders
+    _encoders = None
+    if YIELD_ENGINE != "sklearn" and _forest_is_current():
+        model = ForestEngine.load(FOREST_PATH)
+    else:
+        # joblib is imported here so importing this module has no side effects
+        import joblib
+        model = joblib.load(ensure_artifact(os.path.basename(MODEL_PATH)))
+    # Taken after any download, so a freshly fetched file is not a change;
+    # the cache moves to it now, before the first result is stored
+    _loaded_fingerprint = artifact_fingerprint()
+    cache.set_version(_loaded_fingerprint)
+    return model
+
+model_registry.register(MODEL_NAME, _load)
+
+def load_yield_model():
+    try:
+        return model_registry.get_model(MODEL_NAME)
+    except Exception:
+        return None
+
+# Shared across sessions; numeric inputs are rounded so near-identical
+# requests hit the same entry
+CACHE_PRECISION = 2
+cache = ResultCache(maxsize=4096, ttl=6 * 3600)
+
+def configure_cache(maxsize, ttl, precision):
+    global CACHE_PRECISION
+    cache.configure(maxsize, ttl)
+    CACHE_PRECISION = precision
+
+def _check_artifact():
+    client = inference_client.client
+    if client is not None:
+        # Results come from the server's model, whatever is on local disk
+        cache.set_version(("inference", client.url, client.model_version("yield")))
+        return
+    fingerprint = artifact_fingerprint()
+    cache.set_version(fingerprint)
+    # Models installed with model_registry.set_model have no artifact to track
+    if _loaded_fingerprint is not None and model_registry.is_loaded(MODEL_NAME) and fingerprint != _loaded_fingerprint:
+        logger.info("Yield model artifact changed; reloading")
+        model_registry.unload(MODEL_NAME)
+
+def _cache_key(crop, season, state, area, rainfall, fertilizer, pesticide):
+    numeric = tuple(round(float(v), CACHE_PRECISION) for v in (area, rainfall, fertilizer, pesticide))
+    return (str(crop).strip(), str(season).strip(), str(state).strip()) + numeric
+
+# The data the notebook model was trained on
+DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "crop_yield.csv")
+CATEGORICAL_COLUMNS = ["Crop", "Season", "State"]
+
+_encoders = None
+
+def _data_encoders(path=DATA_PATH):
+    # The codes the notebook's astype("category") assigned: each column's
+    # distinct stripped values in sorted order
+    df = pd.read_csv(path, usecols=CATEGORICAL_COLUMNS)
+    return {column: {value: code for code, value in enumerate(sorted(df[column].astype(str).str.strip().unique()))}
+            for column in CATEGORICAL_COLUMNS}
+
+def load_encoders():
+    # The category codes the model was trained with. Models from the training
+    # script ship their encoders; the notebook-trained model's are rebuilt
+    # from the training data.
+    global _encoders
+    if _encoders is None:
+        if os.path.exists(ENCODERS_PATH):
+            with open(ENCODERS_PATH) as f:
+                _encoders = json.load(f)["categories"]
+        else:
+            _encoders = _data_encoders()
+    return _encoders
+
+FEATURE_COLUMNS = ["Crop", "Season", "State", "Area", "Annual_Rainfall", "Fertilizer", "Pesticide"]
+NUMERIC_COLUMNS = ["Area", "Annual_Rainfall", "Fertilizer", "Pesticide"]
+BATCH_CHUNK_SIZE = 50000
 
 def predict_yield(crop, season, state, area, rainfall, fertilizer, pesticide):
+    _check_artifact()
+    key = _cache_key(crop, season, state, area, rainfall, fertilizer, pesticide)
+    cached = cache.get(key)
+    if cached is not MISSING:
+        metrics.increment("yield.cache_hits")
+        return cached
+    metrics.increment("yield.cache_misses")
+
+    if inference_client.client is not None:
+        try:
+            prediction = inference_client.client.predict_yield(*key)
+        except Exception as e:
+            logger.error("Inference server yield request failed: %s", e)
+            return f"Inference server error: {e}"
+        cache.set(key, prediction)
+        return prediction
+
+    model = load_yield_model()
     if model is None:
         return "Model not loaded."
 
-    features = pd.DataFrame([[ 
-        crop_map.get(crop, -1),
-        season_map.get(season, -1),
-        state_map.get(state, -1),
+    crop, season, state, area, rainfall, fertilizer, pesticide = key
+    encoders = load_encoders()
+    row = (
+        encoders["Crop"].get(crop, -1),
+        encoders["Season"].get(season, -1),
+        encoders["State"].get(state, -1),
         area,
         rainfall,
         fertilizer,
         pesticide
-    ]], columns=["Crop", "Season", "State", "Area", "Annual_Rainfall", "Fertilizer", "Pesticide"])
+    )
+    with metrics.timer("yield.predict"):
+        if isinstance(model, ForestEngine):
+            prediction = model.predict_one(row)
+        else:
+            features = pd.DataFrame([row], columns=FEATURE_COLUMNS)
+            prediction = float(model.predict(features)[0])
+
+    cache.set(key, prediction)
+    return prediction
+
+def predict_yield_grid(crop, season, state, area, rainfall, fertilizer_levels, pesticide_levels):
+    # Yields for one crop/season/state/area/rainfall at every combination of
+    # the given ascending fertilizer and pesticide amounts, as a
+    # (len(pesticide_levels), len(fertilizer_levels)) array
+    if inference_client.client is not None:
+        try:
+            return inference_client.client.predict_yield_grid(crop, season, state, area, rainfall,
+                                                              fertilizer_levels, pesticide_levels)
+        except Exception as e:
+            logger.error("Inference server grid request failed: %s", e)
+            return f"Inference server error: {e}"
+
+    _check_artifact()
+    model = load_yield_model()
+    if model is None:
+        return "Model not loaded."
+
+    encoders = load_encoders()
+    row = np.array([
+        encoders["Crop"].get(crop, -1),
+        encoders["Season"].get(season, -1),
+        encoders["State"].get(state, -1),
+        area,
+        rainfall,
+        0.0,
+        0.0,
+    ])
+    fertilizer_levels = np.asarray(fertilizer_levels, dtype=np.float64)
+    pesticide_levels = np.asarray(pesticide_levels, dtype=np.float64)
+    fertilizer_col, pesticide_col = FEATURE_COLUMNS.index("Fertilizer"), FEATURE_COLUMNS.index("Pesticide")
+    with metrics.timer("yield.grid_predict"):
+        if isinstance(model, ForestEngine):
+            return model.predict_grid(row, fertilizer_col, fertilizer_levels, pesticide_col, pesticide_levels)
+        F, P = np.meshgrid(fertilizer_levels, pesticide_levels)
+        features = np.tile(row, (F.size, 1))
+        features[:, fertilizer_col] = F.ravel()
+        features[:, pesticide_col] = P.ravel()
+        predictions = model.predict(pd.DataFrame(features, columns=FEATURE_COLUMNS))
+        return np.asarray(predictions, dtype=np.float64).reshape(F.shape)
+
+def encode_features(df):
+    # Vectorized equivalent of the per-row map lookups in predict_yield;
+    # the source CSV pads categories ("Kharif     "), so strip before mapping
+    features = pd.DataFrame(index=df.index)
+    encoders = load_encoders()
+    for column in ("Crop", "Season", "State"):
+        features[column] = df[column].astype(str).str.strip().map(encoders[column]).fillna(-1).astype("int64")
+    for column in NUMERIC_COLUMNS:
+        features[column] = pd.to_numeric(df[column], errors="coerce")
+    return features
+
+def _iter_chunks(data, chunk_size):
+    if isinstance(data, pd.DataFrame):
+        for start in range(0, len(data), chunk_size):
+            yield data.iloc[start:start + chunk_size]
+    else:
+        # Path or file-like CSV stream, read a chunk at a time
+        yield from pd.read_csv(data, chunksize=chunk_size)
+
+def iter_predict_yield_batch(data, chunk_size=BATCH_CHUNK_SIZE):
+    client = inference_client.client
+    model = model_registry.get_model(MODEL_NAME) if client is None else None
+    for chunk in _iter_chunks(data, chunk_size):
+        missing = [c for c in FEATURE_COLUMNS if c not in chunk.columns]
+        if missing:
+            raise ValueError(f"Missing columns: {', '.join(missing)}")
+
+        if client is not None:
+            # The server encodes and validates the rows itself
+            result = chunk.copy()
+            result["Predicted_Yield"] = client.predict_yield_rows(chunk)
+            metrics.increment("yield.batch_rows", len(chunk))
+            yield result
+            continue
+
+        with metrics.timer("yield.batch_encode"):
+            features = encode_features(chunk)
+        valid = features.notna().all(axis=1).to_numpy()
+        predictions = np.full(len(chunk), np.nan)
+        if valid.any():
+            with metrics.timer("yield.batch_predict"):
+                predictions[valid] = model.predict(features[valid].to_numpy() if isinstance(model, ForestEngine) else features[valid])
+        metrics.increment("yield.batch_rows", len(chunk))
+
+        result = chunk.copy()
+        result["Predicted_Yield"] = predictions
+        yield result
+
+def predict_yield_batch(data, chunk_size=BATCH_CHUNK_SIZE, output=None):
+    _check_artifact()
+    if inference_client.client is None and load_yield_model() is None:
+        return "Model not loaded."
+
+    chunks = iter_predict_yield_batch(data, chunk_size)
+    if output is None:
+        return pd.concat(list(chunks), ignore_index=True)
+    if isinstance(output, (str, os.PathLike)):
+        with open(output, "w", newline="") as f:
+            return _write_chunks(chunks, f)
+    return _write_chunks(chunks, output)
 
-    prediction = model.predict(features)[0]
-    return float(prediction)
+def _write_chunks(chunks, stream):
+    # Stream results straight to the output so memory stays at one chunk
+    rows = 0
+    for i, chunk in enumerate(chunks):
+        chunk.to_csv(stream, index=False, header=(i == 0))
+        rows += len(chunk)
+    return rows